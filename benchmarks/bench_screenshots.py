@@ -0,0 +1,149 @@
+"""
+Сравнение производительности обработки скриншотов: прежняя попиксельная реализация
+против векторизованной (NumPy) и реализации только на Pillow.
+
+Запуск из корня проекта:
+    python benchmarks/bench_screenshots.py [--width 1920] [--height 1080] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+from PIL import Image, ImageChops, ImageDraw, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features.core import image_diff  # noqa: E402
+
+
+def legacy_get_image_difference(ref_image, new_image):
+    diff_image = ImageChops.difference(ref_image, new_image)
+    if (ref_image.width != diff_image.width) or (ref_image.height != diff_image.height):
+        new_width = max(ref_image.width, diff_image.width)
+        new_height = max(ref_image.height, diff_image.height)
+        diff_image = diff_image.transform((new_width, new_height), Image.EXTENT, (0, 0, new_width, new_height))
+    diff_image = ImageOps.colorize(diff_image.convert('L'), 'white', 'black', None, 5, 6)
+    return diff_image
+
+
+def legacy_get_black_pixels(image):
+    bbox = image.getbbox()
+    if not bbox:
+        return 0
+    return sum(image.crop(bbox)
+               .point(lambda x: 255 if not x else 0)
+               .convert('L')
+               .point(bool)
+               .getdata())
+
+
+def legacy_increase_image_brightness(image):
+    width, height = image.size
+    pixels = image.load()
+    for x in range(width):
+        for y in range(height):
+            pixel = image.getpixel((x, y))
+            gray = int(255 - 64 + 64 * ((pixel[0] + pixel[1] + pixel[2]) / (255 * 3)))
+            pixels[x, y] = (gray, gray, gray)
+    return image
+
+
+def legacy_pipeline(ref_image, new_image):
+    diff_image = legacy_get_image_difference(ref_image, new_image)
+    diff_pixels = legacy_get_black_pixels(diff_image)
+    ref_image_bright = legacy_increase_image_brightness(ref_image.copy())
+    magenta = Image.new('RGB', ref_image.size, 'magenta')
+    overlay = ImageChops.composite(ref_image_bright, magenta, diff_image.convert('L'))
+    return diff_image, diff_pixels, overlay
+
+
+def current_pipeline(ref_image, new_image):
+    diff_image = image_diff.get_image_difference(ref_image, new_image)
+    diff_pixels = image_diff.get_black_pixels(diff_image)
+    overlay = image_diff.get_overlayed_diff_image(ref_image, diff_image)
+    return diff_image, diff_pixels, overlay
+
+
+def make_image(width, height, seed):
+    """ Синтетический скриншот: фон, блоки и текстоподобный шум """
+
+    rnd = random.Random(seed)
+    image = Image.new('RGB', (width, height), (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+        draw.rectangle((x, y, x + rnd.randrange(1, width // 4), y + rnd.randrange(1, height // 4)), fill=color)
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    return Image.blend(image, noise, 0.1)
+
+
+def make_cases(width, height):
+    ref_image = make_image(width, height, 1)
+
+    changed = ref_image.copy()
+    ImageDraw.Draw(changed).rectangle((width // 3, height // 3, width // 2, height // 2), fill='red')
+
+    return [
+        ('equal', ref_image, ref_image.copy()),
+        ('changed block', ref_image, changed),
+        ('all different', ref_image, make_image(width, height, 2)),
+        ('new is smaller', ref_image, changed.crop((0, 0, width - 37, height - 11))),
+        ('new is larger', ref_image, make_image(width + 25, height + 13, 3)),
+        ('low contrast', ref_image, Image.eval(ref_image, lambda x: min(x + 4, 255))),
+    ]
+
+
+def assert_same(case, expected, actual):
+    for index, (expected_item, actual_item) in enumerate(zip(expected, actual)):
+        if isinstance(expected_item, Image.Image):
+            same = (expected_item.size == actual_item.size and expected_item.mode == actual_item.mode
+                    and ImageChops.difference(expected_item, actual_item).getbbox() is None)
+        else:
+            same = expected_item == actual_item
+        if not same:
+            raise AssertionError(f'{case}: результат {index} отличается от прежней реализации')
+
+
+def measure(function, ref_image, new_image, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(ref_image, new_image)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    numpy = image_diff.numpy
+    implementations = [('pillow', None)]
+    if numpy is not None:
+        implementations.insert(0, ('numpy', numpy))
+
+    print(f'Изображения {args.width}x{args.height}, лучшее из {args.repeat} повторов (сек)')
+    print(f'{"случай":<16}{"legacy":>10}' + ''.join(f'{name:>10}' for name, _ in implementations))
+
+    for case, ref_image, new_image in make_cases(args.width, args.height):
+        legacy_time, expected = measure(legacy_pipeline, ref_image, new_image, 1)
+        row = f'{case:<16}{legacy_time:>10.3f}'
+        for _, module in implementations:
+            image_diff.numpy = module
+            elapsed, actual = measure(current_pipeline, ref_image, new_image, args.repeat)
+            assert_same(case, expected, actual)
+            row += f'{elapsed:>10.3f}'
+        image_diff.numpy = numpy
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,9 @@ import requests
 from features.core import settings
 from features.core.constants import ZAPP_BACKEND_URL, ZAPP_FRONTEND_URL
 
+# Таймаут отправки сегмента лога во время прогона, сек
+LOG_SEGMENT_TIMEOUT = 30
+
 
 class ZappBackend:
     """Класс реализующий взаимодействие с zapp-backend"""
@@ -64,6 +67,26 @@ class ZappBackend:
 
         return self._patch(f'api/v1/sessions/{self.session_id}/add_results', json=kwargs)
 
+    def upload_log_segment(self, index: int, text: str):
+        """
+        Метод отправляет завершённый сегмент лога запущенной сессии
+
+        :param index: порядковый номер сегмента, начиная с 1
+        :param text: текст сегмента
+        :raises:
+            ZappBackendSessionException если сессия уже остановлена
+            RequestException при ошибках запроса к бекенду
+        """
+
+        if not self.session_running:
+            raise ZappBackendSessionException(f'Session {self.session_id} already stopped')
+
+        return self._patch(
+            f'api/v1/sessions/{self.session_id}/add_results',
+            json={'zapp_raw_logs_segment': {'index': index, 'text': text}},
+            timeout=LOG_SEGMENT_TIMEOUT
+        )
+
     def stop_session(self, **kwargs):
         """
         Метод регистрирует завершение локальной сессии в zapp-backend с отправкой результатов
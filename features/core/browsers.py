@@ -1,5 +1,8 @@
 import platform
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
 from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
@@ -8,6 +11,7 @@ from collections import namedtuple
 
 from features.core.install_driver import install_geckodriver, install_chromedriver
 from features.core.constants import BROWSER_AWARE_MESSAGE
+from features.core.js_scripts import CLEAR_STORAGE
 from features.core.settings import (
     VIDEO,
     VIDEO_NAME,
@@ -17,7 +21,8 @@ from features.core.settings import (
     BROWSER_LOGGING,
     BROWSER_VERSION,
     BROWSER_USERAGENT,
-    CHROME_OPTIONS
+    CHROME_OPTIONS,
+    BROWSER_POOL_ACQUIRE_TIMEOUT
 )
 from features.core.utils import log, get_abs_file_path_from_cwd
 
@@ -424,3 +429,132 @@ BROWSERS = {
     'sber': Browser(local=LocalSberBrowser, remote=RemoteSberBrowser)
 }
 SELENOID_UI_BROWSERS = (RemoteChromeBrowser, RemoteFirefoxBrowser, RemoteYandexBrowser, RemoteSberBrowser)
+
+
+class BrowserPool:
+    """
+    Пул заранее запущенных сессий браузера.
+
+    Сессии запускаются в фоне при создании пула и выдаются сценариям через acquire.
+    После release сессия в фоне очищается (cookies, localStorage, sessionStorage, лишние вкладки)
+    и возвращается в пул, поэтому следующий сценарий получает уже готовую сессию.
+    Сессия перезапускается после max_uses сценариев или если её не удалось очистить (например, браузер упал),
+    поэтому количество сессий в пуле не уменьшается.
+    """
+
+    def __init__(self, browser_cls, tempdir, size, max_uses):
+        self._browser_cls = browser_cls
+        self._tempdir = tempdir
+        self._max_uses = max_uses
+        self._uses = {}
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='browser-pool')
+        self.leased = None
+
+        for _ in range(size):
+            self._executor.submit(self._launch)
+
+    def acquire(self, timeout=BROWSER_POOL_ACQUIRE_TIMEOUT):
+        """
+        Возвращает сессию браузера для текущего сценария (AbstractBrowser).
+        Повторный вызов до release возвращает ту же сессию.
+
+        :raises:
+            исключение, с которым не удалось запустить сессию браузера (сессия перезапускается в фоне)
+            TimeoutError если за timeout секунд не освободилась ни одна сессия
+        """
+
+        if self.leased is None:
+            try:
+                browser = self._ready.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f'BROWSER POOL: нет свободной сессии браузера в течение {timeout} сек')
+
+            if isinstance(browser, Exception):
+                self._executor.submit(self._launch)
+                raise browser
+
+            self.leased = browser
+            log.debug(f'BROWSER POOL: сессия {browser.get_driver().session_id} выдана сценарию')
+
+        return self.leased
+
+    def release(self):
+        """Возвращает выданную сессию в пул; очистка или перезапуск выполняются в фоне"""
+
+        browser, self.leased = self.leased, None
+        if browser is None:
+            return
+
+        with self._lock:
+            self._uses[browser] = self._uses.get(browser, 0) + 1
+            exhausted = self._uses[browser] >= self._max_uses
+
+        if exhausted:
+            self._executor.submit(self._recycle, browser)
+        else:
+            self._executor.submit(self._reset, browser)
+
+    def close(self):
+        """Завершает все сессии пула"""
+
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            sessions, self._sessions = self._sessions, set()
+
+        for browser in sessions:
+            self._quit(browser)
+
+    def _launch(self):
+        try:
+            browser = self._browser_cls(self._tempdir)
+        except Exception as ex:
+            log.error('Не удалось запустить сессию браузера для пула', exc_info=ex)
+            self._ready.put(ex)
+            return
+
+        with self._lock:
+            self._sessions.add(browser)
+        self._ready.put(browser)
+
+    def _reset(self, browser):
+        try:
+            driver = browser.get_driver()
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.switch_to.default_content()
+
+            driver.execute_script(CLEAR_STORAGE)
+            driver.delete_all_cookies()
+            # Cookies всех доменов можно удалить только через DevTools (локальный Chrome)
+            if hasattr(driver, 'execute_cdp_cmd'):
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.get('about:blank')
+
+        except Exception as ex:
+            # Упавший драйвер отвечает не WebDriverException, а ошибками соединения urllib3
+            log.warning('Не удалось очистить сессию браузера, сессия будет перезапущена')
+            log.debug(ex, exc_info=ex)
+            self._recycle(browser)
+            return
+
+        self._ready.put(browser)
+
+    def _recycle(self, browser):
+        with self._lock:
+            self._sessions.discard(browser)
+            self._uses.pop(browser, None)
+        self._quit(browser)
+        self._launch()
+
+    @staticmethod
+    def _quit(browser):
+        try:
+            browser.get_driver().quit()
+        except Exception as ex:
+            log.debug(ex, exc_info=ex)
@@ -10,6 +10,7 @@ JIRA_BASE = urljoin(JIRA_HOST, 'rest/api/2/')
 JIRA_ISSUE = urljoin(JIRA_BASE, 'issue/')
 JIRA_ISSUE_VIEW = urljoin(JIRA_HOST, 'browse/')
 JIRA_PROJECT = urljoin(JIRA_BASE, 'project/')
+JIRA_SEARCH = urljoin(JIRA_BASE, 'search')
 JIRA_SEARCH_TEST = urljoin(JIRA_BASE, 'search?jql=issuetype=тест%20and%20labels%20in')
 JIRA_ISSUE_LINK = urljoin(JIRA_BASE, 'issueLink/')
 JIRA_DATE_FORMAT = 'd/MM/yy'
@@ -20,6 +21,7 @@ ZEPHYR_TEST_CYCLE = urljoin(ZEPHYR_BASE, 'cycle/')
 ZEPHYR_EXECUTION = urljoin(ZEPHYR_BASE, 'execution/')
 ZEPHYR_STEP_RESULT = urljoin(ZEPHYR_BASE, 'stepResult/')
 ZEPHYR_ADD_TEST = urljoin(ZEPHYR_EXECUTION, 'addTestsToCycle')
+ZEPHYR_BULK_STATUS = urljoin(ZEPHYR_EXECUTION, 'updateBulkStatus')
 ZEPHYR_ATTACHMENT = urljoin(ZEPHYR_BASE, 'attachment')
 ZEPHYR_RESULTS_URL = urljoin(JIRA_HOST, 'secure/enav/#/')
 
@@ -0,0 +1,304 @@
+"""
+Сравнение скриншотов с эталоном.
+
+Модуль не зависит от настроек и контекста behave, поэтому его функции
+могут выполняться в отдельных процессах (SCREENSHOT_DEFERRED=True).
+"""
+
+import os
+import hashlib
+import threading
+from io import BytesIO
+from collections import namedtuple, OrderedDict
+
+from PIL import Image, ImageChops, ImageMath, ImageOps
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STATUS_NEW = 'new'
+STATUS_EQUAL = 'equal'
+STATUS_DIFFERENT = 'different'
+
+# Размер кэша декодированных эталонов по умолчанию, байт
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Результат сравнения скриншота с эталоном.
+# ref_cache_hit - эталон взят из кэша (True), прочитан с диска (False) или не понадобился (None)
+ComparisonResult = namedtuple('ComparisonResult', 'status diff_pixels ref_hashes ref_cache_hit')
+
+# Порог яркости разницы (в оттенках серого), начиная с которого пиксель считается отличающимся
+DIFF_THRESHOLD = 6
+# Цвет подсветки изменений на изображении разницы
+DIFF_COLOR = 'magenta'
+
+
+# Перевод RGB в оттенки серого с тем же целочисленным округлением, что и Image.convert('L')
+def _luminance(array):
+    red, green, blue = array[..., 0], array[..., 1], array[..., 2]
+    return (red * numpy.uint32(19595) + green * numpy.uint32(38470) + blue * numpy.uint32(7471) + 0x8000) >> 16
+
+
+# Таблица осветления: суммарная интенсивность каналов пикселя (0..765) -> оттенок серого
+def _get_brightness_table():
+    return (191 + numpy.arange(3 * 255 + 1, dtype=numpy.uint16) * 64 // 765).astype(numpy.uint8)
+
+
+def _brighten(image):
+    array = numpy.asarray(image)
+    intensity = array[..., 0].astype(numpy.uint16) + array[..., 1] + array[..., 2]
+    return _get_brightness_table()[intensity]
+
+
+# Создание RGB изображения из массива оттенков серого
+def _gray_to_rgb(array):
+    return Image.fromarray(array, 'L').convert('RGB')
+
+
+def _image_math(function, **images):
+    # ImageMath.eval устарел начиная с Pillow 10.3
+    if hasattr(ImageMath, 'lambda_eval'):
+        return ImageMath.lambda_eval(lambda args: function(**{name: args[name] for name in images}), **images)
+    return ImageMath.eval(f'function({", ".join(images)})', function=function, **images)
+
+
+# Получение изображения, где разница двух исходных отмечается чёрными пикселями
+def get_image_difference(ref_image, new_image):
+    if numpy is None:
+        diff_image = ImageChops.difference(ref_image, new_image)
+        if (ref_image.width != diff_image.width) or (ref_image.height != diff_image.height):
+            new_width = max(ref_image.width, diff_image.width)
+            new_height = max(ref_image.height, diff_image.height)
+            diff_image = diff_image.transform((new_width, new_height), Image.EXTENT, (0, 0, new_width, new_height))
+        return ImageOps.colorize(diff_image.convert('L'), 'white', 'black', None, DIFF_THRESHOLD - 1, DIFF_THRESHOLD)
+
+    height = min(ref_image.height, new_image.height)
+    width = min(ref_image.width, new_image.width)
+    ref_array = numpy.asarray(ref_image)[:height, :width]
+    new_array = numpy.asarray(new_image)[:height, :width]
+
+    # Изображение разницы имеет размер эталона, область вне пересечения считается совпадающей
+    diff_array = numpy.full((ref_image.height, ref_image.width), 255, dtype=numpy.uint8)
+    difference = numpy.maximum(ref_array, new_array) - numpy.minimum(ref_array, new_array)
+    diff_array[:height, :width][_luminance(difference) >= DIFF_THRESHOLD] = 0
+    return _gray_to_rgb(diff_array)
+
+
+# Подсчёт количества чёрных пикселей (на изображении разницы)
+def get_black_pixels(image):
+    bbox = image.getbbox()
+    if not bbox:
+        return 0
+
+    cropped = image.crop(bbox)
+    if numpy is None:
+        # Пиксель считается чёрным, если хотя бы один его канал равен нулю
+        histogram = cropped.point(lambda x: 255 if not x else 0).convert('L').histogram()
+        return cropped.width * cropped.height - histogram[0]
+    zero = numpy.asarray(cropped) == 0
+    return int(numpy.count_nonzero(zero[..., 0] | zero[..., 1] | zero[..., 2]))
+
+
+# Генерация осветлённого изображения для подложки подсветки разницы
+def increase_image_brightness(image):
+    # Создаём серый цвет в диапазоне от 255 - 64 до 255 суммарной интенсивности суммы всех каналов
+    if numpy is None:
+        red, green, blue = image.split()
+        gray = _image_math(lambda r, g, b: 191 + (64 * (r + g + b)) / 765, r=red, g=green, b=blue).convert('L')
+        return Image.merge('RGB', (gray, gray, gray))
+
+    return _gray_to_rgb(_brighten(image))
+
+
+# Генерация изображения с подсветкой изменений на осветлённом эталоне
+def get_overlayed_diff_image(ref_image, diff_image):
+    if numpy is None:
+        ref_image_bright = increase_image_brightness(ref_image)
+        # Создаём фон с цветом подсветки изменений
+        magenta = Image.new('RGB', ref_image.size, DIFF_COLOR)
+        # Накладываем фон на высветленный оригинал используя diff_image как маску
+        return ImageChops.composite(ref_image_bright, magenta, diff_image.convert('L'))
+
+    gray = _brighten(ref_image)
+    mask = numpy.asarray(diff_image.convert('L')) != 0
+    color = Image.new('RGB', (1, 1), DIFF_COLOR).getpixel((0, 0))
+    channels = [Image.fromarray(numpy.where(mask, gray, numpy.uint8(value)), 'L') for value in color]
+    return Image.merge('RGB', channels)
+
+
+class ImageCache:
+    """
+    LRU кэш декодированных изображений, ограниченный суммарным размером изображений в байтах.
+    Ключ должен меняться вместе с содержимым изображения (например, путь и mtime файла)
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_image_size(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, key, load):
+        """
+        Получить изображение из кэша или загрузить его функцией load
+
+        :returns: изображение и признак попадания в кэш
+        """
+
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image, True
+            self.misses += 1
+
+        image = load()
+        self.put(key, image)
+        return image, False
+
+    def put(self, key, image):
+        image_size = self.get_image_size(image)
+        if image_size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.size -= self.get_image_size(previous)
+            self._images[key] = image
+            self.size += image_size
+            self._evict()
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._images:
+            _, image = self._images.popitem(last=False)
+            self.size -= self.get_image_size(image)
+
+
+# Кэш эталонов общий для всех сравнений в процессе (в том числе в процессах пула SCREENSHOT_DEFERRED)
+ref_image_cache = ImageCache(DEFAULT_CACHE_BYTES)
+
+
+def configure_ref_image_cache(max_bytes):
+    ref_image_cache.resize(max_bytes)
+
+
+def get_ref_cache_key(path):
+    return os.path.abspath(path), os.stat(path).st_mtime_ns
+
+
+def load_ref_image(path):
+    """
+    Прочитать эталон с диска через кэш: изображения не изменяются функциями модуля,
+    поэтому один декодированный эталон используется во всех сравнениях
+
+    :returns: изображение и признак попадания в кэш
+    """
+
+    return ref_image_cache.get(get_ref_cache_key(path), lambda: Image.open(path).convert('RGB'))
+
+
+def get_image_path(directory_path, name, kind):
+    """ Путь к изображению эталона (ref), текущего варианта (new) или разницы (diff) """
+
+    return os.path.join(directory_path, f'{name} ({kind}).png')
+
+
+def get_content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_pixels_hash(image):
+    """ Хеш пикселей изображения: не зависит от параметров сжатия PNG """
+
+    return get_content_hash(f'{image.width}x{image.height}:'.encode() + image.tobytes())
+
+
+def get_ref_hashes(ref_image_path, ref_image, png_hash=None):
+    """
+    Запись индекса хешей эталона.
+    mtime и размер файла эталона позволяют проверить актуальность записи без декодирования PNG,
+    png_hash - хеш исходного PNG скриншота, из которого получен эталон
+    """
+
+    stat = os.stat(ref_image_path)
+    return dict(
+        mtime=stat.st_mtime_ns,
+        size=stat.st_size,
+        png_hash=png_hash,
+        pixels_hash=get_pixels_hash(ref_image),
+    )
+
+
+def is_actual_hashes(ref_image_path, ref_hashes):
+    if not ref_hashes:
+        return False
+    stat = os.stat(ref_image_path)
+    return ref_hashes.get('mtime') == stat.st_mtime_ns and ref_hashes.get('size') == stat.st_size
+
+
+def compare_screenshot(directory_path, name, png, ref_hashes=None):
+    """
+    Сравнить скриншот с эталоном и сохранить изображения в папку элемента.
+    Если эталона ещё нет, скриншот сохраняется в качестве эталона.
+    Скриншот передаётся как PNG или как уже декодированное изображение (фрагмент общего скриншота страницы).
+
+    Если скриншот совпадает с эталоном побайтно или попиксельно (по хешам из ref_hashes),
+    эталон не декодируется и полное сравнение не выполняется
+
+    :returns: ComparisonResult
+    """
+
+    os.makedirs(directory_path, exist_ok=True)
+    if isinstance(png, Image.Image):
+        png_hash, new_image = None, png.convert('RGB')
+    else:
+        png_hash, new_image = get_content_hash(png), None
+
+    ref_image_path = get_image_path(directory_path, name, 'ref')
+    if not os.path.isfile(ref_image_path):
+        if new_image is None:
+            new_image = Image.open(BytesIO(png)).convert('RGB')
+        new_image.save(ref_image_path)
+        ref_image_cache.put(get_ref_cache_key(ref_image_path), new_image)
+        return ComparisonResult(STATUS_NEW, -1, get_ref_hashes(ref_image_path, new_image, png_hash), None)
+
+    actual = is_actual_hashes(ref_image_path, ref_hashes)
+    if actual and png_hash and ref_hashes['png_hash'] == png_hash:
+        return ComparisonResult(STATUS_EQUAL, 0, ref_hashes, None)
+
+    if new_image is None:
+        new_image = Image.open(BytesIO(png)).convert('RGB')
+    if actual and ref_hashes['pixels_hash'] == get_pixels_hash(new_image):
+        # Запоминаем PNG, чтобы в следующий раз обойтись без декодирования
+        return ComparisonResult(STATUS_EQUAL, 0, {**ref_hashes, 'png_hash': png_hash or ref_hashes['png_hash']}, None)
+
+    ref_image, ref_cache_hit = load_ref_image(ref_image_path)
+    if not actual:
+        ref_hashes = get_ref_hashes(ref_image_path, ref_image)
+
+    diff_image = get_image_difference(ref_image, new_image)
+    # Получаем количество отличающихся пикселей
+    diff_pixels = get_black_pixels(diff_image)
+
+    if diff_pixels > 0 or ref_image.size != new_image.size:
+        # Высветляем исходное изображение и подсвечиваем на нём изменения
+        get_overlayed_diff_image(ref_image, diff_image).save(get_image_path(directory_path, name, 'diff'))
+        new_image.save(get_image_path(directory_path, name, 'new'))
+        return ComparisonResult(STATUS_DIFFERENT, diff_pixels, ref_hashes, ref_cache_hit)
+
+    return ComparisonResult(STATUS_EQUAL, diff_pixels, ref_hashes, ref_cache_hit)
@@ -72,6 +72,189 @@ if (style.styleSheet) {
 document.getElementsByTagName('head')[0].appendChild(style);
 """
 
+WAIT_FOR_ELEMENT_STATE = """
+var by = arguments[0];
+var selector = arguments[1];
+var state = arguments[2];
+var text = arguments[3];
+var timeout = arguments[4];
+var stability = arguments[5];
+var done = arguments[arguments.length - 1];
+
+// Отсутствие элемента подтверждается, только если оно сохраняется в течение окна стабильности
+var negative = state === 'invisible' || state === 'text_invisible';
+var stableSince = null;
+
+var observer = null;
+var timer = null;
+var recheck = null;
+var frame = null;
+var finished = false;
+
+function find() {
+    if (by === 'xpath') {
+        var snapshot = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var nodes = [];
+        for (var i = 0; i < snapshot.snapshotLength; i++) {
+            nodes.push(snapshot.snapshotItem(i));
+        }
+        return nodes;
+    }
+    return Array.prototype.slice.call(document.querySelectorAll(selector));
+}
+
+function isVisible(element) {
+    for (var node = element; node && node.nodeType === 1; node = node.parentElement) {
+        if (window.getComputedStyle(node).opacity === '0') {
+            return false;
+        }
+    }
+    var style = window.getComputedStyle(element);
+    if (style.visibility === 'hidden' || style.visibility === 'collapse') {
+        return false;
+    }
+    var rects = element.getClientRects();
+    for (var j = 0; j < rects.length; j++) {
+        if (rects[j].width > 0 && rects[j].height > 0) {
+            return true;
+        }
+    }
+    return false;
+}
+
+function normalize(value) {
+    return (value || '').trim().replace(/\\s/g, ' ');
+}
+
+function affects(node) {
+    if (node && node.nodeType !== 1) {
+        node = node.parentElement;
+    }
+    if (!node) {
+        return false;
+    }
+    if (by === 'xpath') {
+        return true;
+    }
+    return node.matches(selector) || !!node.querySelector(selector) || !!node.closest(selector);
+}
+
+function isRelevant(records) {
+    if (records.length > 500) {
+        return true;
+    }
+    for (var k = 0; k < records.length; k++) {
+        var record = records[k];
+        if (affects(record.target)) {
+            return true;
+        }
+        var changed = Array.prototype.slice.call(record.addedNodes).concat(Array.prototype.slice.call(record.removedNodes));
+        for (var n = 0; n < changed.length; n++) {
+            if (affects(changed[n])) {
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+function check() {
+    var nodes = find();
+    var first = nodes[0];
+    switch (state) {
+        case 'present':
+            return first || null;
+        case 'all_present':
+            return nodes.length ? nodes : null;
+        case 'visible':
+            return first && isVisible(first) ? first : null;
+        case 'all_visible':
+            return nodes.length && nodes.every(isVisible) ? nodes : null;
+        case 'any_visible':
+            var visible = nodes.filter(isVisible);
+            return visible.length ? visible : null;
+        case 'clickable':
+            return first && isVisible(first) && !first.disabled ? first : null;
+        case 'invisible':
+            return !first || !isVisible(first) ? true : null;
+        case 'text':
+            return first && (first.innerText || first.value || '').indexOf(text) > -1 ? true : null;
+        case 'text_invisible':
+            var withText = nodes.filter(function (node) {
+                return normalize(node.innerText) === normalize(text) && isVisible(node);
+            });
+            return withText.length ? null : true;
+    }
+    return null;
+}
+
+function finish(value) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearTimeout(timer);
+    clearTimeout(recheck);
+    cancelAnimationFrame(frame);
+    done(value);
+}
+
+function poll() {
+    try {
+        var result = check();
+        if (!negative) {
+            if (result !== null) {
+                finish(result);
+            }
+            return;
+        }
+
+        if (result === null) {
+            stableSince = null;
+            return;
+        }
+        var now = Date.now();
+        if (stableSince === null) {
+            stableSince = now;
+        }
+        if (now - stableSince >= stability) {
+            finish(true);
+        } else {
+            clearTimeout(recheck);
+            recheck = setTimeout(poll, stability - (now - stableSince));
+        }
+    } catch (e) {
+        finish({zappError: String(e.message || e)});
+    }
+}
+
+function tick() {
+    poll();
+    if (!finished) {
+        frame = requestAnimationFrame(tick);
+    }
+}
+
+poll();
+if (!finished) {
+    // DOM изменения ловим сразу, а изменения стилей (анимации, переходы) - на каждом кадре отрисовки
+    observer = new MutationObserver(function (records) {
+        if (negative && isRelevant(records)) {
+            stableSince = null;
+        }
+        poll();
+    });
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    frame = requestAnimationFrame(tick);
+    timer = setTimeout(function () {
+        finish({zappTimeout: true});
+    }, timeout);
+}
+"""
+
 GET_PAGE_SCROLL_Y = """
 return window.pageYOffset
 """
@@ -85,6 +268,13 @@ var element = arguments[0]
 element.scrollIntoView();
 """
 
+CLEAR_STORAGE = """
+try {
+    window.localStorage.clear();
+    window.sessionStorage.clear();
+} catch (e) {}
+"""
+
 CAS_LOGOUT = """
 var xhr = new XMLHttpRequest();
 xhr.open('GET', arguments[0]);
@@ -110,3 +300,22 @@ document.body.appendChild(window.zappAntiHoverOverlay);
 REMOVE_OVERLAY = """
 document.body.removeChild(window.zappAntiHoverOverlay)
 """
+
+GET_ELEMENTS_RECTS = """
+if (arguments[1]) {
+    arguments[1].scrollIntoView({
+        block: "center"
+    });
+}
+var rects = [];
+for (var i = 0; i < arguments[0].length; i++) {
+    var rect = arguments[0][i].getBoundingClientRect();
+    rects.push({x: rect.left, y: rect.top, width: rect.width, height: rect.height});
+}
+return {
+    rects: rects,
+    ratio: window.devicePixelRatio || 1,
+    width: document.documentElement.clientWidth,
+    height: document.documentElement.clientHeight
+};
+"""
@@ -0,0 +1,194 @@
+"""Индекс локаторов из файлов *_locators.py с кэшированием на диске"""
+
+import os
+import ast
+import json
+import hashlib
+import importlib
+from collections.abc import Mapping
+
+from selenium.webdriver.common.by import By
+
+from features.core.utils import log
+
+CACHE_VERSION = 1
+
+
+def get_locator_type(locator):
+    """ Определить тип локатора по его строке: XPATH или CSS_SELECTOR """
+
+    if locator and locator.startswith(('/html/', '/')):
+        return By.XPATH
+    return By.CSS_SELECTOR
+
+
+def get_file_hash(path):
+    with open(path, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()
+
+
+class LocatorIndex(Mapping):
+    """
+    Индекс локаторов: имя -> строка локатора.
+
+    Дополнительно хранит для каждого локатора тип (By) и место объявления (файл, строка).
+    Индекс строится при первом обращении и сохраняется в файл кэша; при следующих запусках
+    файлы локаторов разбираются заново, только если изменились их mtime/размер и содержимое.
+    Пересечения имён локаторов в разных файлах определяются при построении индекса.
+    """
+
+    def __init__(self, path='features/steps', postfix='_locators.py', name='locators',
+                 cache_path='.zapp_locators_cache.json'):
+        self.path = path
+        self.postfix = postfix
+        self.name = name
+        self.cache_path = cache_path
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self._load()
+        return self._index
+
+    def __getitem__(self, key):
+        return self.index[key][1]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def compiled(self, key):
+        """ Возвращает кортеж (By, локатор) для имени локатора """
+
+        by, locator, _, _ = self.index[key]
+        return by, locator
+
+    def source(self, key):
+        """ Возвращает файл и строку, в которых объявлен локатор """
+
+        _, _, file, line = self.index[key]
+        return file, line
+
+    def _find_files(self):
+        files = []
+        for current_dir, _, names in os.walk(self.path):
+            for file in names:
+                if file.endswith(self.postfix):
+                    files.append(os.path.join(current_dir, file))
+        return files
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as cache_file:
+                cache = json.load(cache_file)
+            if cache.get('version') == CACHE_VERSION:
+                return cache
+        except (OSError, ValueError):
+            pass
+        return {'version': CACHE_VERSION, 'files': {}}
+
+    def _write_cache(self, cache):
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(cache, cache_file, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            log.debug(f'Не удалось сохранить кэш локаторов: {e}')
+
+    def _load(self):
+        cache = self._read_cache()
+        files = self._find_files()
+        cached_files = cache['files']
+        changed = set(cached_files) != set(files)
+
+        file_entries = {}
+        for file in files:
+            stat = os.stat(file)
+            cached = cached_files.get(file)
+            if cached and cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                file_entries[file] = cached
+                continue
+
+            changed = True
+            file_hash = get_file_hash(file)
+            if cached and cached['hash'] == file_hash:
+                entries = cached['entries']
+            else:
+                entries = self._parse_file(file)
+            file_entries[file] = dict(mtime=stat.st_mtime_ns, size=stat.st_size, hash=file_hash, entries=entries)
+
+        if changed or 'index' not in cache:
+            index, duplicates = self._build_index(files, file_entries)
+            cache = dict(version=CACHE_VERSION, files=file_entries, index=index, duplicates=duplicates)
+            self._write_cache(cache)
+
+        for file, keys in cache['duplicates']:
+            log.warning('Обнаружены пересечения в словарях локаторов, проверьте поля %s. Один из '
+                        'дубликатов в файле %s', set(keys), file)
+
+        return {key: tuple(value) for key, value in cache['index'].items()}
+
+    @staticmethod
+    def _build_index(files, file_entries):
+        index = {}
+        duplicates = []
+        for file in files:
+            overridden_keys = []
+            for key, locator, line in file_entries[file]['entries']:
+                if key in index:
+                    overridden_keys.append(key)
+                index[key] = (get_locator_type(locator), locator, file, line)
+
+            if overridden_keys:
+                duplicates.append((file, overridden_keys))
+        return index, duplicates
+
+    def _parse_file(self, file):
+        """
+        Разобрать файл локаторов без импорта модуля.
+        Если словарь локаторов содержит вычисляемые значения, модуль импортируется как раньше.
+        """
+
+        with open(file, encoding='utf-8') as source:
+            tree = ast.parse(source.read(), filename=file)
+
+        for node in tree.body:
+            if isinstance(node, ast.Assign):
+                targets, value = node.targets, node.value
+            elif isinstance(node, ast.AnnAssign):
+                targets, value = [node.target], node.value
+            else:
+                continue
+
+            if not any(isinstance(target, ast.Name) and target.id == self.name for target in targets):
+                continue
+
+            if isinstance(value, ast.Dict) and None not in value.keys:
+                try:
+                    return [
+                        (ast.literal_eval(key), ast.literal_eval(locator), key.lineno)
+                        for key, locator in zip(value.keys, value.values)
+                    ]
+                except ValueError:
+                    pass
+
+            lines = {}
+            if isinstance(value, ast.Dict):
+                for key in value.keys:
+                    if isinstance(key, ast.Constant):
+                        lines[key.value] = key.lineno
+            return self._import_file(file, lines)
+
+        return []
+
+    def _import_file(self, file, lines):
+        module_name = os.path.normpath(file)[:-len('.py')].replace(os.sep, '.')
+        module = importlib.import_module(module_name)
+        imported_locators = getattr(module, self.name, None)
+        if not isinstance(imported_locators, Mapping):
+            return []
+        return [(key, locator, lines.get(key)) for key, locator in imported_locators.items()]
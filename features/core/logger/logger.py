@@ -1,8 +1,23 @@
+import os
 import sys
+import glob
+import gzip
+import time
+import queue
+import threading
+from collections import deque
 from io import StringIO
 
 from features.core.logger.singleton import Singleton
 
+# Размер сегмента лога в символах и количество завершённых сегментов, которые хранятся в памяти
+SEGMENT_SIZE = 1024 * 1024
+SEGMENTS = 8
+SEGMENT_NAME = 'raw_log'
+SEGMENT_FILE = '{}_{:05d}.log.gz'
+# Максимальное время ожидания отправки завершённых сегментов в get_log и close, сек
+UPLOAD_WAIT_TIMEOUT = 60
+
 
 class StdoutLogger(metaclass=Singleton):
     """Класс, агрегирующий stdout и stderr логи в единый буфер"""
@@ -12,10 +27,23 @@ class StdoutLogger(metaclass=Singleton):
         self.__stderr = sys.stderr
 
         self.intercepting = False
-        self.stream = StringIO()
+        self.stream = self.SegmentBuffer(self.__stderr)
         self.stdout_interceptor = self.StreamInterceptor(self.stream, self.__stdout)
         self.stderr_interceptor = self.StreamInterceptor(self.stream, self.__stderr)
 
+    def configure(self, directory=None, segment_size=SEGMENT_SIZE, segments=SEGMENTS, upload=None, name=SEGMENT_NAME):
+        """
+        Настраивает буфер лога
+
+        :param directory: папка для сжатых сегментов лога (None - сегменты на диск не сохраняются)
+        :param segment_size: размер сегмента в символах
+        :param segments: количество завершённых сегментов, которые хранятся в памяти
+        :param upload: функция (номер сегмента, текст) для отправки завершённых сегментов во время прогона
+        :param name: префикс файлов сегментов; должен быть своим у каждого процесса, пишущего в directory
+        """
+
+        self.stream.configure(directory, segment_size, segments, upload, name)
+
     def start_intercept(self):
         """Начинает перехват сообщений"""
 
@@ -34,14 +62,165 @@ class StdoutLogger(metaclass=Singleton):
         self.intercepting = False
 
     def get_log(self) -> str:
-        """Возвращает весь лог в виде строки"""
+        """
+        Возвращает лог, который ещё не был отправлен: сегменты в памяти и текущий сегмент.
+        Если ранние сегменты вытеснены из памяти, в начало добавляется пометка о пропуске
+        """
+
+        return self.stream.get_log()
+
+    def close(self):
+        """Сохраняет текущий сегмент на диск и дожидается отправки завершённых сегментов"""
 
-        return self.stream.getvalue()
+        self.stream.close()
 
     def __del__(self):
         self.stop_intercept()
         self.stream.close()
 
+    class SegmentBuffer:
+        """
+        Кольцевой буфер лога из сегментов ограниченного размера.
+
+        Заполненный сегмент завершается: сжимается в отдельный файл на диске (если задана папка),
+        ставится в очередь на отправку (если задана функция upload) и остаётся в памяти, пока его
+        не вытеснят более новые сегменты. Отправка выполняется в фоновом потоке; если в очереди уже
+        segments сегментов, сегмент не отправляется и попадает в итоговый лог. Отправка ожидается
+        не дольше UPLOAD_WAIT_TIMEOUT: неотправленные к этому времени сегменты тоже попадают в итоговый лог
+        """
+
+        def __init__(self, errors):
+            self.errors = errors
+            self.directory = None
+            self.name = SEGMENT_NAME
+            self.segment_size = SEGMENT_SIZE
+            self.segments = deque(maxlen=SEGMENTS)
+            self.index = 0
+            self.current = StringIO()
+            self.current_size = 0
+            self.uploaded = set()
+
+            self._lock = threading.RLock()
+            self._upload = None
+            self._queue = None
+            self._thread = None
+            # Количество сегментов в очереди и в процессе отправки
+            self._pending = 0
+            self._pending_done = threading.Condition()
+
+        def configure(self, directory, segment_size, segments, upload, name):
+            with self._lock:
+                self.segment_size = segment_size
+                if segments != self.segments.maxlen:
+                    self.segments = deque(self.segments, maxlen=segments)
+
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    # Удаляются только сегменты этого процесса от предыдущего запуска
+                    pattern = f'{glob.escape(name)}_{"[0-9]" * 5}.log.gz'
+                    for path in glob.glob(os.path.join(glob.escape(directory), pattern)):
+                        os.remove(path)
+                    self.directory = directory
+                    self.name = name
+                    for index, text in self.segments:
+                        self._spill(index, text)
+
+                if upload and self._thread is None:
+                    self._upload = upload
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._upload_segments, name='log-upload', daemon=True)
+                    self._thread.start()
+
+        def write(self, string_: str):
+            with self._lock:
+                self.current.write(string_)
+                self.current_size += len(string_)
+                if self.current_size >= self.segment_size:
+                    self._rotate()
+
+        def flush(self):
+            pass
+
+        def _rotate(self):
+            text = self.current.getvalue()
+            self.current = StringIO()
+            self.current_size = 0
+            self.index += 1
+            self.segments.append((self.index, text))
+
+            if self.directory:
+                self._spill(self.index, text)
+
+            if self._queue is not None:
+                with self._pending_done:
+                    if self._pending >= self.segments.maxlen:
+                        return
+                    self._pending += 1
+                self._queue.put((self.index, text))
+
+        def _spill(self, index, text):
+            try:
+                path = os.path.join(self.directory, SEGMENT_FILE.format(self.name, index))
+                with gzip.open(path, 'wt', encoding='utf-8') as file:
+                    file.write(text)
+            except OSError as e:
+                self.errors.write(f'Не удалось сохранить сегмент лога {index}: {e}\n')
+
+        def _upload_segments(self):
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+
+                index, text = item
+                try:
+                    self._upload(index, text)
+                    self.uploaded.add(index)
+                except Exception as e:
+                    self.errors.write(f'Не удалось отправить сегмент лога {index}: {e}\n')
+                finally:
+                    with self._pending_done:
+                        self._pending -= 1
+                        self._pending_done.notify_all()
+
+        def _wait_uploads(self, timeout):
+            deadline = time.monotonic() + timeout
+            with self._pending_done:
+                while self._pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.errors.write(f'Не дождались отправки сегментов лога: {self._pending}\n')
+                        return
+                    self._pending_done.wait(remaining)
+
+        def get_log(self) -> str:
+            if self._queue is not None:
+                self._wait_uploads(UPLOAD_WAIT_TIMEOUT)
+
+            with self._lock:
+                parts = [text for index, text in self.segments if index not in self.uploaded]
+                parts.append(self.current.getvalue())
+
+                first_index = self.segments[0][0] if self.segments else self.index + 1
+                skipped = sum(1 for index in range(1, first_index) if index not in self.uploaded)
+                if skipped:
+                    location = f', полный лог: {self.directory}' if self.directory else ''
+                    parts.insert(0, f'[Пропущено начальных сегментов лога: {skipped}{location}]\n')
+
+            return ''.join(parts)
+
+        def close(self):
+            if self._thread is not None:
+                self._wait_uploads(UPLOAD_WAIT_TIMEOUT)
+                self._queue.put(None)
+                self._thread.join(UPLOAD_WAIT_TIMEOUT)
+                self._thread = None
+                self._queue = None
+
+            with self._lock:
+                if self.directory and self.current_size:
+                    self._rotate()
+
     class StreamInterceptor:
         """
         Публикует сообщения во все стримы, переданные в args
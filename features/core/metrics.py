@@ -1,6 +1,11 @@
+import os
 import sys
+import json
+import time
 import requests
 import datetime
+import threading
+from collections import Counter
 
 
 from nested_lookup import nested_lookup
@@ -53,7 +58,7 @@ class Metrics:
             log.debug(f'INFLUX_USE: {settings.INFLUX_USE}')
             return
 
-        Influx(self._tags, self._fields).send(self.record)
+        get_influx_writer().write('zapp_test_run', self._tags, self._fields)
 
         if self.metrics['exceptions']:
             self.send_exceptions()
@@ -61,13 +66,42 @@ class Metrics:
         if self.metrics['deprecated_steps']:
             self.send_deprecated()
 
+        close_influx_writer()
+
+    def dump(self, path):
+        """Сохраняет счётчики прогона в файл вместо отправки (используется воркерами параллельного запуска)"""
+        data = dict(self.metrics, start_date=self.metrics['start_date'].isoformat())
+        with open(path, 'w') as output:
+            json.dump(data, output)
+
+    @classmethod
+    def merge(cls, dumps, start_date):
+        """Объединяет счётчики, сохранённые воркерами, в метрики одного прогона"""
+        deprecated_steps = {}
+        exceptions = []
+        for dump in dumps:
+            deprecated_steps.update(dump['deprecated_steps'])
+            exceptions.extend(dump['exceptions'])
+
+        first = dumps[0] if dumps else {}
+        return cls(
+            all_tests_count=sum(dump['all_tests_count'] for dump in dumps),
+            failed_tests_count=sum(dump['failed_tests_count'] for dump in dumps),
+            start_date=start_date,
+            deprecated_steps=deprecated_steps,
+            exceptions=exceptions,
+            browser_name=first.get('browser_name'),
+            browser_version=first.get('browser_version'),
+            run_seed=first.get('run_seed')
+        )
+
     def send_exceptions(self):
         self.record = 'exception'
         tags = self._tags
         tags['RECORD'] = self.record
         for exception in self.metrics['exceptions']:
             tags['EXCEPTION'] = exception
-            Influx(tags, self._fields).send(self.record)
+            get_influx_writer().write('zapp_test_run', tags, self._fields)
 
     def send_deprecated(self):
         self.record = 'deprecated_step'
@@ -76,26 +110,173 @@ class Metrics:
         func_names = set(nested_lookup('func_name', self.metrics['deprecated_steps']))
         for fn in func_names:
             tags['DEPRECATED_STEP'] = fn
-            Influx(tags, self._fields).send(self.record)
+            get_influx_writer().write('zapp_test_run', tags, self._fields)
+
+
+def build_data_string(tags, fields, measurement='zapp_test_run', timestamp=None):
+    """ Строка точки в формате InfluxDB line protocol """
+
+    tags_string = ''.join(
+        ',{}={}'.format(escape_key(k), escape_key(str(v))) for (k, v) in tags.items() if v
+    )
+    fields_string = ','.join(
+        '{}={}'.format(escape_key(k), format_field_value(v)) for (k, v) in fields.items() if v is not None
+    )
+    timestamp_string = ' ' + timestamp if timestamp else ''
+    return f'{escape_measurement(measurement)}{tags_string} {fields_string}{timestamp_string}'
+
+
+def escape_measurement(value):
+    return value.replace(',', '\\,').replace(' ', '\\ ')
+
+
+def escape_key(value):
+    """ Экранирование ключей и значений тегов, ключей полей line protocol """
+
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    return value.replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def format_field_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{value}"'
+
+
+class InfluxWriter:
+    """
+    Буферизованная отправка точек в InfluxDB (line protocol).
+
+    Точки копятся в памяти и отправляются пакетами из фонового потока: при накоплении batch_size точек
+    или раз в flush_interval секунд. Каждой точке назначается своя метка времени (нс),
+    чтобы точки с одинаковыми тегами из одного пакета не перезаписывали друг друга
+    """
+
+    def __init__(self, url, batch_size, flush_interval):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = Counter()
+        self._session = requests.Session()
+        self._points = []
+        self._last_timestamp = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='influx-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, measurement, tags, fields):
+        with self._condition:
+            if self._closed:
+                return
+
+            self._last_timestamp = max(time.time_ns(), self._last_timestamp + 1)
+            self._points.append(build_data_string(tags, fields, measurement, str(self._last_timestamp)))
+            if len(self._points) >= self.batch_size:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._points) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                points, self._points = self._points, []
+                closed = self._closed
+
+            self._send(points)
+            if closed:
+                return
+
+    def _send(self, points):
+        for start in range(0, len(points), self.batch_size):
+            batch = points[start:start + self.batch_size]
+            try:
+                resp = self._session.post(self.url, data='\n'.join(batch).encode('utf-8'))
+                resp.raise_for_status()
+                self.stats['sent'] += len(batch)
+
+            except requests.exceptions.RequestException as e:
+                self.stats['failed'] += len(batch)
+                log.error(f'METRICS: points={len(batch)}, status=fail({e})')
+
+    def close(self):
+        """ Отправить оставшиеся точки и остановить фоновый поток """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self._session.close()
+        log.debug(f'METRICS: points sent={self.stats["sent"]}, failed={self.stats["failed"]}')
+
+
+influx_writer = None
+
+
+def get_influx_writer():
+    """ Общий для процесса InfluxWriter; None, если метрики отключены """
+
+    global influx_writer
+    if influx_writer is None and settings.INFLUX_USE:
+        influx_writer = InfluxWriter(
+            f'{settings.INFLUX_HOST}:{settings.INFLUX_PORT}/write?db={settings.INFLUX_DB}',
+            settings.INFLUX_BATCH_SIZE,
+            settings.INFLUX_FLUSH_INTERVAL
+        )
+    return influx_writer
+
+
+def close_influx_writer():
+    global influx_writer
+    if influx_writer is not None:
+        influx_writer.close()
+        influx_writer = None
+
+
+# В теги попадают только значения с небольшим числом вариантов: каждое сочетание тегов - отдельная серия InfluxDB.
+# Названия сценариев и шагов (структуры сценариев, параметры шагов) и зерно прогона записываются полями
+def get_point_tags(scenario):
+    return dict(
+        PROJECT_KEY=settings.PROJECT_KEY,
+        ENV=settings.ENV,
+        STAND=settings.STAND,
+        FEATURE=os.path.basename(scenario.filename)
+    )
+
+
+def write_step_point(scenario, step, run_seed):
+    """ Длительность и статус шага - отдельной точкой измерения zapp_step """
+
+    writer = get_influx_writer()
+    if writer is None:
+        return
 
+    tags = get_point_tags(scenario)
+    tags.update(STEP_TYPE=step.step_type, STATUS=step.status.name)
+    writer.write('zapp_step', tags, dict(
+        duration=round(step.duration * 1000, 3),
+        line=step.line,
+        scenario=scenario.name,
+        step=step.name,
+        run_seed=str(run_seed)
+    ))
 
-class Influx:
-    def __init__(self, tags, fields):
-        self.influx_url = f'{settings.INFLUX_HOST}:{settings.INFLUX_PORT}/write?db={settings.INFLUX_DB}'
-        self.data_string = self.build_data_string(tags, fields)
 
-    def send(self, record='main'):
-        try:
-            resp = requests.post(self.influx_url, data=self.data_string.encode('utf-8'))
-            resp.raise_for_status()
-            log.debug(f'METRICS: record={record}, status=sent({resp.status_code})')
+def write_scenario_point(scenario, run_seed):
+    """ Длительность и статус сценария - отдельной точкой измерения zapp_scenario """
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'METRICS: record={record}, status=fail({e})')
+    writer = get_influx_writer()
+    if writer is None:
+        return
 
-    @staticmethod
-    def build_data_string(tags, fields, measurement='zapp_test_run', timestamp=None):
-        tags_string = ','.join('{}={}'.format(k, str(v)) for (k, v) in tags.items() if v)
-        fields_string = ','.join('{}={}'.format(k, v) for (k, v) in fields.items() if v)
-        timestamp_string = ' ' + timestamp if timestamp else ''
-        return f'{measurement},{tags_string} {fields_string}{timestamp_string}'
+    tags = get_point_tags(scenario)
+    tags.update(STATUS=scenario.status.name)
+    writer.write('zapp_scenario', tags, dict(
+        duration=round(scenario.duration * 1000, 3),
+        steps=len(scenario.steps),
+        scenario=scenario.name,
+        run_seed=str(run_seed)
+    ))
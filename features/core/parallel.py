@@ -0,0 +1,318 @@
+"""Параллельный запуск сценариев в нескольких процессах behave"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+from collections import namedtuple, OrderedDict
+
+from behave.parser import parse_file
+from behave.tag_expression import TagExpression
+
+WORKER_DIR_PREFIX = 'worker_'
+WORKER_METRICS_FILE = 'metrics.json'
+WORKER_LOG_FILE = 'behave.log'
+WORKER_DURATIONS_FILE = 'durations.json'
+# Данные для завершения сессии zapp-backend и уведомлений, которые формирует воркер
+WORKER_SESSION_FILE = 'session.json'
+JUNIT_COUNTERS = ('tests', 'errors', 'failures', 'skipped')
+# Вес новой длительности при сглаживании истории
+DURATION_SMOOTHING = 0.5
+# Оценка длительности по размеру feature файла, если истории запусков ещё нет
+DEFAULT_SECONDS_PER_BYTE = 0.01
+
+# Единица шардирования: сценарий (или структура сценария целиком) в feature файле.
+# scenario_names - имена сценариев, которые behave выполнит для единицы (у структуры сценария их несколько),
+# size - доля размера feature файла, приходящаяся на единицу
+ScenarioUnit = namedtuple('ScenarioUnit', 'location filename name scenario_names size')
+Worker = namedtuple('Worker', 'id reports_dir process log_file started')
+
+
+def get_duration_key(filename, scenario_name):
+    """ Ключ сценария в хранилище длительностей """
+
+    return f'{os.path.normpath(filename)}::{scenario_name}'
+
+
+class DurationStore:
+    """Локальное хранилище длительностей сценариев предыдущих запусков"""
+
+    def __init__(self, path):
+        self.path = path
+        self.durations = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as durations_file:
+                return json.load(durations_file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        return self.durations.get(key)
+
+    def update(self, durations):
+        """ Добавить длительности текущего запуска, сглаживая их с историей """
+
+        for key, duration in durations.items():
+            previous = self.durations.get(key)
+            if previous is None:
+                self.durations[key] = duration
+            else:
+                self.durations[key] = round(
+                    DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * previous, 3)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as durations_file:
+            json.dump(self.durations, durations_file, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def get_feature_files(path):
+    """ Получить список feature файлов по пути к файлу или папке """
+
+    if os.path.isfile(path):
+        return [path]
+
+    feature_files = []
+    for current_dir, _, files in os.walk(path):
+        for file in sorted(files):
+            if file.endswith('.feature'):
+                feature_files.append(os.path.join(current_dir, file))
+    return sorted(feature_files)
+
+
+def get_tag_expression(run_params):
+    """ Собрать выражение тегов из параметров запуска behave """
+
+    tags = [param[len('--tags='):] for param in run_params if param.startswith('--tags=')]
+    return TagExpression(tags)
+
+
+def collect_scenarios(path, run_params):
+    """ Получить список сценариев, которые будут выполнены с учётом тегов запуска """
+
+    tag_expression = get_tag_expression(run_params)
+    units = []
+    for filename in get_feature_files(path):
+        feature = parse_file(filename)
+        if feature is None or not feature.scenarios:
+            continue
+
+        size = os.path.getsize(filename) / len(feature.scenarios)
+        for scenario in feature.scenarios:
+            if not scenario.should_run_with_tags(tag_expression):
+                continue
+
+            # У структуры сценария behave выполняет отдельный сценарий на каждую строку примеров
+            if hasattr(scenario, 'scenarios'):
+                scenario_names = tuple(s.name for s in scenario.scenarios if s.should_run_with_tags(tag_expression))
+            else:
+                scenario_names = (scenario.name,)
+
+            units.append(ScenarioUnit(f'{filename}:{scenario.line}', filename, scenario.name, scenario_names, size))
+    return units
+
+
+def estimate_durations(units, store):
+    """
+    Оценить длительность каждой единицы шардирования по истории запусков.
+    Для сценариев без истории оценка строится по размеру feature файла
+
+    :returns: список оценок в секундах и признак наличия истории хотя бы для одного сценария
+    """
+
+    known = {}
+    for unit in units:
+        durations = [store.get(get_duration_key(unit.filename, name)) for name in unit.scenario_names]
+        if durations and None not in durations:
+            known[unit.location] = sum(durations)
+
+    known_size = sum(unit.size for unit in units if unit.location in known)
+    seconds_per_byte = sum(known.values()) / known_size if known_size else DEFAULT_SECONDS_PER_BYTE
+
+    estimates = [known.get(unit.location, unit.size * seconds_per_byte) for unit in units]
+    return estimates, bool(known)
+
+
+def split_by_duration(units, estimates, workers_count):
+    """
+    Распределить сценарии по воркерам по правилу LPT (longest processing time first):
+    самые длинные сценарии назначаются первыми, каждый - воркеру с наименьшей суммарной загрузкой
+
+    :returns: список шардов и список прогнозируемой загрузки каждого шарда в секундах
+    """
+
+    shards = [[] for _ in range(workers_count)]
+    loads = [0.0] * workers_count
+    heap = [(0.0, index) for index in range(workers_count)]
+
+    for estimate, unit in sorted(zip(estimates, units), key=lambda item: item[0], reverse=True):
+        load, index = heapq.heappop(heap)
+        shards[index].append(unit)
+        loads[index] = load + estimate
+        heapq.heappush(heap, (loads[index], index))
+
+    non_empty = [index for index in range(workers_count) if shards[index]]
+    return [shards[index] for index in non_empty], [loads[index] for index in non_empty]
+
+
+def load_worker_durations(workers):
+    """ Загрузить длительности сценариев, сохранённые воркерами в after_all """
+
+    durations = {}
+    for worker in workers:
+        try:
+            with open(os.path.join(worker.reports_dir, WORKER_DURATIONS_FILE)) as durations_file:
+                durations.update(json.load(durations_file))
+        except (OSError, ValueError):
+            continue
+    return durations
+
+
+def get_worker_reports_dir(reports_dir, worker_id):
+    return os.path.join(reports_dir, f'{WORKER_DIR_PREFIX}{worker_id}')
+
+
+def clean_worker_reports(reports_dir):
+    """ Удалить результаты воркеров предыдущего запуска """
+
+    if not os.path.isdir(reports_dir):
+        return
+
+    for name in os.listdir(reports_dir):
+        path = os.path.join(reports_dir, name)
+        if name.startswith(WORKER_DIR_PREFIX) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def start_worker(worker_id, units, run_params, env, reports_dir):
+    """ Запустить отдельный процесс behave для переданных сценариев """
+
+    worker_reports_dir = get_worker_reports_dir(reports_dir, worker_id)
+    os.makedirs(worker_reports_dir, exist_ok=True)
+
+    worker_env = {
+        **{name: str(value) for name, value in env.items()},
+        'WORKER_ID': str(worker_id),
+        'REPORTS_DIR': worker_reports_dir,
+        # Сессией zapp-backend управляет основной процесс
+        'SESSION_ID': '',
+        'BACKEND_LOCAL_SESSION_REGISTER': 'False',
+    }
+    command = [
+        sys.executable, '-m', 'behave',
+        *run_params,
+        f'--junit-directory={worker_reports_dir}',
+        *(unit.location for unit in units)
+    ]
+
+    log_file = open(os.path.join(worker_reports_dir, WORKER_LOG_FILE), 'w', encoding='utf-8')
+    process = subprocess.Popen(command, env=worker_env, stdout=log_file, stderr=subprocess.STDOUT)
+    return Worker(worker_id, worker_reports_dir, process, log_file, time.monotonic())
+
+
+def wait_workers(workers):
+    """
+    Дождаться завершения воркеров и вывести их логи
+
+    :returns: код завершения запуска и фактическое время работы каждого воркера в секундах
+    """
+
+    elapsed = {}
+    while len(elapsed) < len(workers):
+        for worker in workers:
+            if worker.id not in elapsed and worker.process.poll() is not None:
+                elapsed[worker.id] = time.monotonic() - worker.started
+        time.sleep(0.2)
+
+    return_code = 0
+    for worker in workers:
+        worker.log_file.close()
+
+        print(f'\n========== WORKER {worker.id} ==========')
+        with open(os.path.join(worker.reports_dir, WORKER_LOG_FILE), encoding='utf-8') as log_file:
+            for line in log_file:
+                sys.stdout.write(line)
+        sys.stdout.flush()
+
+        return_code = return_code or worker.process.returncode
+    return return_code, [elapsed[worker.id] for worker in workers]
+
+
+def merge_junit_reports(workers, reports_dir):
+    """ Объединить JUnit отчёты воркеров в папку reports: testsuite одной фичи собираются в один файл """
+
+    suites = OrderedDict()
+    for worker in workers:
+        for name in sorted(os.listdir(worker.reports_dir)):
+            if not name.endswith('.xml'):
+                continue
+
+            root = ET.parse(os.path.join(worker.reports_dir, name)).getroot()
+            if name not in suites:
+                suites[name] = root
+                continue
+
+            merged = suites[name]
+            for counter in JUNIT_COUNTERS:
+                merged.set(counter, str(int(merged.get(counter, 0)) + int(root.get(counter, 0))))
+            merged.set('time', str(round(float(merged.get('time', 0)) + float(root.get('time', 0)), 6)))
+            for testcase in root.findall('testcase'):
+                merged.append(testcase)
+
+    os.makedirs(reports_dir, exist_ok=True)
+    for name, root in suites.items():
+        ET.ElementTree(root).write(os.path.join(reports_dir, name), encoding='UTF-8', xml_declaration=True)
+
+    return list(suites)
+
+
+def load_worker_sessions(workers):
+    """
+    Объединить данные сессии, сохранённые воркерами в after_all: платформу (браузер), ссылки на результаты
+    Zephyr, переменные запуска, ссылку на видео и количество успешных и упавших сценариев
+    """
+
+    session = dict(
+        platform='',
+        video_url='',
+        zephyr_sync_results={},
+        export_variables={},
+        scenario_summary=dict(passed=0, failed=0)
+    )
+    for worker in workers:
+        try:
+            with open(os.path.join(worker.reports_dir, WORKER_SESSION_FILE)) as session_file:
+                data = json.load(session_file)
+        except (OSError, ValueError):
+            continue
+
+        session['platform'] = session['platform'] or data.get('platform', '')
+        session['video_url'] = session['video_url'] or data.get('video_url', '')
+        session['zephyr_sync_results'].update(data.get('zephyr_sync_results', {}))
+        session['export_variables'].update(data.get('export_variables', {}))
+        for status in ('passed', 'failed'):
+            session['scenario_summary'][status] += data.get('scenario_summary', {}).get(status, 0)
+    return session
+
+
+def load_worker_metrics(workers):
+    """ Загрузить метрики, сохранённые воркерами в after_all """
+
+    metrics = []
+    for worker in workers:
+        path = os.path.join(worker.reports_dir, WORKER_METRICS_FILE)
+        try:
+            with open(path) as metrics_file:
+                metrics.append(json.load(metrics_file))
+        except (OSError, ValueError):
+            continue
+    return metrics
@@ -0,0 +1,101 @@
+"""Профилирование сценариев: cProfile и, по желанию, снимки tracemalloc"""
+
+import io
+import os
+import re
+import pstats
+import cProfile
+import tracemalloc
+
+from features.core.utils import log
+
+RUN_PROFILE_FILE = 'run.pstats'
+RUN_REPORT_FILE = 'run.txt'
+# Количество строк в текстовых отчётах и в сводке в конце прогона
+REPORT_SIZE = 30
+SUMMARY_SIZE = 10
+TRACEMALLOC_FRAMES = 10
+
+
+def get_profile_name(index, scenario_name):
+    """ Имя файлов профиля сценария: порядковый номер и название без спецсимволов """
+
+    slug = re.sub(r'[^\w-]+', '_', scenario_name).strip('_')[:60]
+    return f'{index:03d}_{slug}'
+
+
+class ScenarioProfiler:
+    """
+    Профилирование каждого сценария (от before_scenario до конца after_scenario) в cProfile.
+
+    Профиль сценария сохраняется в <directory>/<номер>_<сценарий>.pstats, в конце прогона профили
+    объединяются в run.pstats и текстовый отчёт run.txt. При memory=True в начале и в конце сценария
+    снимается снимок tracemalloc, и в <номер>_<сценарий>.memory.txt записываются места с наибольшим
+    приростом выделенной памяти
+    """
+
+    def __init__(self, directory, memory=False):
+        self.directory = directory
+        self.memory = memory
+        self._paths = []
+        self._profile = None
+        self._snapshot = None
+        os.makedirs(directory, exist_ok=True)
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def start(self):
+        if self.memory:
+            self._snapshot = tracemalloc.take_snapshot()
+
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self, scenario_name):
+        if self._profile is None:
+            return
+
+        self._profile.disable()
+        name = get_profile_name(len(self._paths) + 1, scenario_name)
+        path = os.path.join(self.directory, f'{name}.pstats')
+        self._profile.dump_stats(path)
+        self._paths.append(path)
+        self._profile = None
+
+        if self.memory and self._snapshot is not None:
+            self._save_memory_report(os.path.join(self.directory, f'{name}.memory.txt'), scenario_name)
+
+    def _save_memory_report(self, path, scenario_name):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        differences = snapshot.compare_to(self._snapshot, 'lineno')
+        self._snapshot = None
+
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(f'Сценарий: {scenario_name}\n')
+            output.write(f'Прирост памяти по местам выделения (top {REPORT_SIZE}):\n')
+            for difference in differences[:REPORT_SIZE]:
+                output.write(f'{difference}\n')
+
+    def finish(self):
+        """ Объединить профили сценариев в профиль всего прогона и вывести самые затратные функции """
+
+        if not self._paths:
+            return
+
+        stats = pstats.Stats(*self._paths)
+        stats.dump_stats(os.path.join(self.directory, RUN_PROFILE_FILE))
+
+        with open(os.path.join(self.directory, RUN_REPORT_FILE), 'w', encoding='utf-8') as output:
+            pstats.Stats(*self._paths, stream=output).sort_stats('cumulative').print_stats(REPORT_SIZE)
+
+        summary = io.StringIO()
+        pstats.Stats(*self._paths, stream=summary).sort_stats('tottime').print_stats(SUMMARY_SIZE)
+        log.info(f'Профили сценариев сохранены в {self.directory}, профиль прогона: {RUN_PROFILE_FILE}')
+        log.debug(f'Функции с наибольшим собственным временем:\n{summary.getvalue()}')
+
+        if self.memory:
+            tracemalloc.stop()
@@ -1,11 +1,27 @@
 import os
+import math
 import requests
 import binascii
 import json
 import datetime
-from collections import defaultdict
-from PIL import Image, ImageChops, ImageOps
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from collections import defaultdict, Counter
+from PIL import Image
 from io import BytesIO
+from features.core.image_diff import (
+    STATUS_DIFFERENT,
+    STATUS_EQUAL,
+    STATUS_NEW,
+    compare_screenshot,
+    configure_ref_image_cache,
+    get_image_path,
+)
+from features.core.js_scripts import GET_ELEMENTS_RECTS
+from features.core.tracing import tracer
 from features.core.utils import log, get_units_case
 from features.core.constants import (
     SCREENSHOT_RESULTS_URL,
@@ -13,13 +29,19 @@ from features.core.constants import (
 from features.core.settings import (
     PROJECT_KEY,
     SCREENSHOT_DIR,
+    SCREENSHOT_DEFERRED,
+    SCREENSHOT_WORKERS,
+    SCREENSHOT_HASH_INDEX,
+    SCREENSHOT_CACHE_BYTES,
+    SCREENSHOT_REMOTE_UPLOAD,
+    SCREENSHOT_UPLOAD_WORKERS,
     REMOTE_STORAGE_URL,
 )
 
 
 # Генерация имени скриншота
-def get_screenshot_name(name, context):
-    window_size = context.browser.get_window_size()
+def get_screenshot_name(name, context, window_size=None):
+    window_size = window_size or context.browser.get_window_size()
     window_width = window_size['width']
     window_height = window_size['height']
     return f'{name} -- {context.browser.name} -- {window_width}x{window_height}'
@@ -33,114 +55,297 @@ def get_run_id():
     return f'{run_date_str}_{run_hash}'
 
 
-# Получение скриншота элемента страницы
-def get_element_screenshot(context, element):
-    # Снимаем скриншот текущего viewport страницы
-    png = element.screenshot_as_png
-    image = Image.open(BytesIO(png)).convert('RGB')
-
-    return image
-
-
-# Получение изображения, где разница двух исходных отмечается чёрными пикселями
-def get_image_difference(ref_image, new_image):
-    diff_image = ImageChops.difference(ref_image, new_image)
-    if (ref_image.width != diff_image.width) or (ref_image.height != diff_image.height):
-        new_width = max(ref_image.width, diff_image.width)
-        new_height = max(ref_image.height, diff_image.height)
-        diff_image = diff_image.transform((new_width, new_height), Image.EXTENT, (0, 0, new_width, new_height))
-    diff_image = ImageOps.colorize(diff_image.convert('L'), 'white', 'black', None, 5, 6)
-    return diff_image
-
-
-# Подсчёт количества чёрных пикселей (на изображении разницы)
-def get_black_pixels(image):
-    bbox = image.getbbox()
-    if not bbox:
-        return 0
-    return sum(image.crop(bbox)
-               .point(lambda x: 255 if not x else 0)
-               .convert('L')
-               .point(bool)
-               .getdata())
-
-
-# Генерация осветлённого изображения для подложки подсветки разницы
-def increase_image_brightness(image):
-    width, height = image.size
-    pixels = image.load()
-    for x in range(width):
-        for y in range(height):
-            pixel = image.getpixel((x, y))
-            # Создаём серый цвет в диапазоне от 255 - 64 до 255 суммарной интенсивности суммы всех каналов
-            gray = int(255 - 64 + 64 * ((pixel[0] + pixel[1] + pixel[2]) / (255 * 3)))
-            pixels[x, y] = (gray, gray, gray)
-    return image
-
-
-# Класс для сохранения и загрузки скриншотов локально
-class LocalImageIO:
-    def __init__(self, name, run_info):
-        self.name = name
-        self.run_info = run_info
-        self.directory_path = os.path.abspath(os.path.join(SCREENSHOT_DIR, name))
-        os.makedirs(self.directory_path, exist_ok=True)
-
-    def get_ref_image(self):
-        ref_image_path = os.path.join(self.directory_path, self.name + ' (ref).png')
-        if os.path.isfile(ref_image_path):
-            ref_image = Image.open(ref_image_path).convert('RGB')
-            return ref_image
+# Индекс хешей эталонов в папке SCREENSHOT_DIR: позволяет признать скриншот совпадающим без декодирования эталона
+class ScreenshotHashIndex:
+    def __init__(self, path):
+        self.path = path
+        self._hashes = None
+        self._changed = set()
+
+    @property
+    def hashes(self):
+        if self._hashes is None:
+            self._hashes = self._load()
+        return self._hashes
+
+    def _load(self):
+        try:
+            with open(self.path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, name):
+        return self.hashes.get(name)
+
+    def update(self, name, ref_hashes):
+        if ref_hashes and self.hashes.get(name) != ref_hashes:
+            self.hashes[name] = ref_hashes
+            self._changed.add(name)
+
+    def save(self):
+        """ Сохранить изменённые записи, не затирая записи других процессов (параллельный запуск) """
+
+        if not self._changed:
+            return
+
+        hashes = self._load()
+        hashes.update({name: self.hashes[name] for name in self._changed})
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as index_file:
+            json.dump(hashes, index_file, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._changed.clear()
+
+
+hash_index = ScreenshotHashIndex(os.path.join(SCREENSHOT_DIR, SCREENSHOT_HASH_INDEX))
+
+# При отложенном сравнении эталоны декодируются только в процессах пула, и объём кэша делится между ними
+configure_ref_image_cache(0 if SCREENSHOT_DEFERRED else SCREENSHOT_CACHE_BYTES)
+# Попадания и промахи кэша эталонов за весь прогон, включая сравнения в процессах пула
+ref_cache_stats = Counter()
+
+
+# Изображения элемента, которые выгружаются в удалённое хранилище в зависимости от результата сравнения
+RESULT_IMAGES = {
+    STATUS_NEW: ('ref',),
+    STATUS_EQUAL: ('ref',),
+    STATUS_DIFFERENT: ('ref', 'new', 'diff'),
+}
+
+
+class RemoteImageStore:
+    """
+    Выгрузка скриншотов и данных прогона в удалённое хранилище (REMOTE_STORAGE_URL) в фоновых потоках.
+
+    Изображения именуются по хешу содержимого, поэтому одинаковые изображения (например, неизменные эталоны)
+    выгружаются один раз: перед выгрузкой наличие объекта проверяется запросом HEAD.
+    URL изображения известен сразу, выгрузка завершается в flush
+    """
+
+    def __init__(self, base_url, workers):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+        self._futures = []
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def upload_image(self, path):
+        """ Поставить изображение в очередь на выгрузку и вернуть его URL в хранилище """
+
+        with open(path, 'rb') as image_file:
+            data = image_file.read()
+        url = f'{self.base_url}images/{hashlib.sha256(data).hexdigest()}.png'
+
+        with self._lock:
+            if url not in self._urls:
+                self._urls[url] = True
+                self._futures.append(self._executor.submit(self._upload_image, url, data))
+        return url
+
+    def upload_json(self, url, data):
+        with self._lock:
+            self._futures.append(self._executor.submit(self._put, url, json.dumps(data), 'application/json'))
+
+    def _upload_image(self, url, data):
+        response = self.session.head(url)
+        if response.status_code == 200:
+            return 'exists', 0
+        return self._put(url, data, 'image/png')
+
+    def _put(self, url, data, content_type):
+        response = self.session.put(url, data=data, headers={'Content-Type': content_type})
+        response.raise_for_status()
+        return 'uploaded', len(data)
+
+    def flush(self):
+        """ Дождаться завершения всех выгрузок и вывести итог """
+
+        with self._lock:
+            futures, self._futures = self._futures, []
+        if not futures:
+            return
+
+        log.info(f'Выгрузка результатов скриншот-тестирования в хранилище: {len(futures)} объектов')
+        stats = Counter()
+        step = max(len(futures) // 10, 1)
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                status, size = future.result()
+                stats[status] += 1
+                stats['bytes'] += size
+            except Exception as e:
+                stats['failed'] += 1
+                log.debug(f'Не удалось выгрузить объект в хранилище: {e}')
+            if done % step == 0 or done == len(futures):
+                log.debug(f'Выгружено {done} из {len(futures)}')
+
+        log.info(f'Выгружено объектов: {stats["uploaded"]} ({stats["bytes"] // 1024} КБ), '
+                 f'уже были в хранилище: {stats["exists"]}, ошибок: {stats["failed"]}')
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+_remote_image_store = None
+
+
+def get_remote_image_store():
+    """ Хранилище для выгрузки результатов; None, если выгрузка выключена (SCREENSHOT_REMOTE_UPLOAD) """
+
+    global _remote_image_store
+    if _remote_image_store is None and SCREENSHOT_REMOTE_UPLOAD:
+        _remote_image_store = RemoteImageStore(f'{REMOTE_STORAGE_URL}{PROJECT_KEY}/', SCREENSHOT_UPLOAD_WORKERS)
+    return _remote_image_store
+
+
+def close_remote_image_store():
+    global _remote_image_store
+    if _remote_image_store is not None:
+        _remote_image_store.close()
+        _remote_image_store = None
+
+
+# Пул процессов для отложенного сравнения скриншотов (SCREENSHOT_DEFERRED=True)
+_comparison_pool = None
+
+
+def get_comparison_pool():
+    global _comparison_pool
+    if _comparison_pool is None:
+        # spawn: дочерние процессы не наследуют потоки и соединения с браузером основного процесса
+        _comparison_pool = ProcessPoolExecutor(max_workers=SCREENSHOT_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=configure_ref_image_cache,
+                                               initargs=(SCREENSHOT_CACHE_BYTES // SCREENSHOT_WORKERS,))
+    return _comparison_pool
+
+
+def shutdown_comparison_pool():
+    global _comparison_pool
+    if _comparison_pool is not None:
+        _comparison_pool.shutdown(wait=True)
+        _comparison_pool = None
+
+
+def log_ref_cache_stats():
+    if not ref_cache_stats:
+        return
+    log.info(f'Кэш эталонов скриншотов: попаданий {ref_cache_stats["hits"]}, промахов {ref_cache_stats["misses"]}')
+
+
+# Получение скриншотов нескольких элементов из одного скриншота viewport
+def get_elements_screenshots(context, elements):
+    """
+    Снять скриншоты элементов, вырезая их из общих скриншотов viewport.
+
+    Первый ещё не снятый элемент проматывается до середины экрана (как в шаге сравнения одного элемента),
+    координаты оставшихся элементов получаются тем же вызовом execute_script, и из одного скриншота
+    вырезаются все элементы, которые целиком попали в viewport. Остальные снимаются на следующих итерациях.
+    Элемент больше viewport снимается отдельно через element.screenshot_as_png
+
+    :returns: список изображений (фрагментов скриншота) или PNG для каждого элемента
+    """
+
+    screenshots = [None] * len(elements)
+    pending = list(range(len(elements)))
+    while pending:
+        first = pending[0]
+        geometry = context.browser.execute_script(
+            GET_ELEMENTS_RECTS, [elements[index] for index in pending], elements[first]
+        )
+        viewport = Image.open(BytesIO(context.browser.get_screenshot_as_png()))
+        ratio = geometry['ratio']
+        # Полосы прокрутки не входят в clientWidth/clientHeight
+        max_right = min(viewport.width, round(geometry['width'] * ratio))
+        max_bottom = min(viewport.height, round(geometry['height'] * ratio))
+
+        remaining = []
+        for index, rect in zip(pending, geometry['rects']):
+            box = get_element_box(rect, ratio)
+            if box[0] >= 0 and box[1] >= 0 and box[2] <= max_right and box[3] <= max_bottom and box[0] < box[2] \
+                    and box[1] < box[3]:
+                screenshots[index] = viewport.crop(box)
+            elif index == first:
+                screenshots[index] = elements[index].screenshot_as_png
+            else:
+                remaining.append(index)
+        pending = remaining
+
+    return screenshots
+
+
+def get_element_box(rect, ratio):
+    """
+    Область элемента на скриншоте в пикселях устройства: дробные координаты getBoundingClientRect
+    расширяются до целых пикселей (левая и верхняя граница - вниз, правая и нижняя - вверх),
+    как драйвер обрезает скриншот элемента в element.screenshot_as_png
+    """
+
+    # Округление до тысячных убирает погрешность умножения на devicePixelRatio (10.000000001 -> 10)
+    left = math.floor(round(rect['x'] * ratio, 3))
+    top = math.floor(round(rect['y'] * ratio, 3))
+    right = math.ceil(round((rect['x'] + rect['width']) * ratio, 3))
+    bottom = math.ceil(round((rect['y'] + rect['height']) * ratio, 3))
+    return left, top, right, bottom
+
+
+@tracer.traced('compare_screenshot', 'screenshot')
+def compare_screenshot_with_ref(context, screenshot, name):
+    """
+    Сравнить снятый скриншот (PNG или изображение) с эталоном.
+    При SCREENSHOT_DEFERRED=True сравнение выполняется в пуле процессов;
+    результат станет известен в RunInfo.print_results
+
+    :returns: количество отличающихся пикселей, -1 для нового эталона, None при отложенном сравнении
+    """
+
+    directory_path = os.path.abspath(os.path.join(SCREENSHOT_DIR, name))
+    ref_hashes = hash_index.get(name)
+
+    if SCREENSHOT_DEFERRED:
+        future = get_comparison_pool().submit(compare_screenshot, directory_path, name, screenshot, ref_hashes)
+        context.run_info.add_pending(name, future)
         return None
 
-    def save_ref_image(self, image):
-        ref_image_path = os.path.join(self.directory_path, self.name + ' (ref).png')
-        image.save(ref_image_path)
+    result = compare_screenshot(directory_path, name, screenshot, ref_hashes)
+    context.run_info.add_result(name, result)
+    return result.diff_pixels
 
-    def save_new_image(self, image):
-        new_image_path = os.path.join(self.directory_path, self.name + ' (new).png')
-        image.save(new_image_path)
 
-    def save_diff_image(self, image):
-        diff_image_path = os.path.join(self.directory_path, self.name + ' (diff).png')
-        image.save(diff_image_path)
-        self.run_info.diff_count += 1
+def compare_element_screenshots(context, element, name):
+    """ Сравнить скриншот элемента с эталоном (см. compare_screenshot_with_ref) """
 
+    return compare_screenshot_with_ref(context, element.screenshot_as_png, name)
 
-def compare_element_screenshots(context, element, name):
-    image_io = LocalImageIO(name, context.run_info)
-
-    ref_image = image_io.get_ref_image()
-    new_image = get_element_screenshot(context, element)
-
-    # Если уже есть эталон, сравниваем с ним
-    if ref_image:
-        diff_image = get_image_difference(ref_image, new_image)
-        # Получаем количество отличающихся пикселей
-        diff_pixels = get_black_pixels(diff_image)
-
-        if diff_pixels > 0 or (ref_image.width != new_image.width) or (ref_image.height != new_image.height):
-            # Высветляем исходное изображение для лучшей подсветки изменений
-            ref_image_bright = increase_image_brightness(ref_image)
-            # Создаём фон с цветом подсветки изменений
-            magenta = Image.new('RGB', ref_image.size, 'magenta')
-            # Накладываем фон на высветленный оригинал используя diff_image как маску
-            overlayed_diff_image = ImageChops.composite(ref_image_bright, magenta, diff_image.convert('L'))
-            # Сохраняем изображение с подсветкой изменений
-            image_io.save_diff_image(overlayed_diff_image)
-            # Сохраняем новый скриншот
-            image_io.save_new_image(new_image)
-
-            context.run_info.add_status(name, 'different')
-        else:
-            context.run_info.add_status(name, 'equal')
-
-        return diff_pixels
-    # Иначе сохраняем в качестве эталона новый скриншот
-    else:
-        image_io.save_ref_image(new_image)
-        context.run_info.add_status(name, 'new')
-        return -1
+
+def compare_elements_screenshots(context, elements_by_name):
+    """
+    Сравнить скриншоты нескольких элементов с эталонами, сняв один общий скриншот viewport
+
+    :param elements_by_name: список пар (имя скриншота, элемент)
+    :returns: список результатов compare_screenshot_with_ref в том же порядке
+    """
+
+    names = [name for name, _ in elements_by_name]
+    screenshots = get_elements_screenshots(context, [element for _, element in elements_by_name])
+    return [compare_screenshot_with_ref(context, screenshot, name) for name, screenshot in zip(names, screenshots)]
+
+
+# Вывод результата сравнения скриншота элемента
+def log_comparison_result(name, diff_pixels):
+    if diff_pixels == -1:
+        log.info(f'Скриншот элемента "{name}" сохранён в качестве эталона')
+    elif diff_pixels > 0:
+        diff_count_string = get_units_case(diff_pixels, ('пиксель', 'пикселя', 'пикселей'))
+        log.error(f'Скриншот элемента "{name}" отличается на {diff_pixels} {diff_count_string}')
 
 
 # Класс для хранения результатов прогона
@@ -150,6 +355,8 @@ class RunInfo:
         run_id = get_run_id()
         self.run_id = run_id
         self.diff_count = 0
+        # Отложенные сравнения: пары (имя элемента, future с результатом compare_screenshot)
+        self.pending = []
         # Создаём словарь для хранения данных об элементах, участвующих в прогоне
         self.elements = defaultdict(lambda: dict(images=dict()))
         # URL для доступа к JSON прогона на сервере
@@ -174,12 +381,59 @@ class RunInfo:
     def add_status(self, name, status):
         self.elements[name]['status'] = status
 
+    # Учёт результата сравнения скриншота элемента
+    def add_result(self, name, result):
+        self.add_status(name, result.status)
+        hash_index.update(name, result.ref_hashes)
+        if result.ref_cache_hit is not None:
+            ref_cache_stats['hits' if result.ref_cache_hit else 'misses'] += 1
+        if result.status == STATUS_DIFFERENT:
+            self.diff_count += 1
+
+        remote_image_store = get_remote_image_store()
+        if remote_image_store:
+            directory_path = os.path.abspath(os.path.join(SCREENSHOT_DIR, name))
+            for kind in RESULT_IMAGES[result.status]:
+                url = remote_image_store.upload_image(get_image_path(directory_path, name, kind))
+                self.elements[name]['images'][kind] = url
+
+    # Добавление отложенного сравнения скриншота элемента
+    def add_pending(self, name, future):
+        self.pending.append((name, future))
+
+    # Ожидание отложенных сравнений и учёт их результатов
+    @tracer.traced('RunInfo.join', 'screenshot')
+    def join(self):
+        pending, self.pending = self.pending, []
+        errors = []
+        for name, future in pending:
+            try:
+                result = future.result()
+            except Exception as e:
+                log.error(f'Не удалось сравнить скриншот элемента "{name}": {e}')
+                errors.append(name)
+                continue
+
+            self.add_result(name, result)
+            log_comparison_result(name, result.diff_pixels)
+
+        if errors:
+            raise RuntimeError(f'Не удалось сравнить скриншоты элементов: {", ".join(errors)}')
+
     # Сохранение данных прогона в JSON на сервере
     def save_run(self):
+        remote_image_store = get_remote_image_store()
+        if remote_image_store:
+            remote_image_store.upload_json(self.json_url, self.elements)
+            return
         json_str = json.dumps(self.elements)
         requests.put(self.json_url, data=json_str)
 
     def print_results(self):
+        self.join()
+        if self.elements and get_remote_image_store():
+            self.save_run()
+            log.info(f'Результаты скриншот-тестирования будут доступны по ссылке: {self.run_url}')
         if self.diff_count > 0:
             diff_count_string = get_units_case(
                 self.diff_count,
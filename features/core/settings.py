@@ -1,5 +1,6 @@
 import validators
 import re
+import os
 from envparse import env
 import datetime
 
@@ -37,6 +38,36 @@ ZEPHYR_CONDITION = not (ENV.lower() == 'qa' and not DEPLOY)
 ZEPHYR_TOGGLE = env.bool('USE_ZEPHYR', default=False)
 ZEPHYR_USE = ZEPHYR_CONDITION and ZEPHYR_TOGGLE
 ZEPHYR_LITE = env.bool('ZEPHYR_LITE', default=True)
+# Максимальное время ожидания отправки результатов из очереди в Zephyr в конце прогона (полный режим), сек
+ZEPHYR_FLUSH_TIMEOUT = env.int('ZEPHYR_FLUSH_TIMEOUT', default=300)
+# Локальный кэш синхронизации с Jira/Zephyr между прогонами
+ZEPHYR_CACHE_FILE = env.str('ZEPHYR_CACHE_FILE', default='.zapp_zephyr_cache.json')
+# Время жизни кэша проекта, тестов и шагов Jira/Zephyr, сек (0 - данные перепроверяются при каждом запуске)
+ZEPHYR_CACHE_TTL = env.int('ZEPHYR_CACHE_TTL', default=3600)
+if ZEPHYR_CACHE_TTL < 0:
+    raise Exception('Параметр ZEPHYR_CACHE_TTL не может быть отрицательным')
+# Записи кэша, которые не использовались дольше этого срока, удаляются при сохранении, дней (0 - не удалять)
+ZEPHYR_CACHE_RETENTION_DAYS = env.int('ZEPHYR_CACHE_RETENTION_DAYS', default=30)
+if ZEPHYR_CACHE_RETENTION_DAYS < 0:
+    raise Exception('Параметр ZEPHYR_CACHE_RETENTION_DAYS не может быть отрицательным')
+# Количество параллельных запросов и попыток каждого запроса при отправке результатов в Zephyr (lite режим)
+ZEPHYR_SEND_WORKERS = env.int('ZEPHYR_SEND_WORKERS', default=8)
+if ZEPHYR_SEND_WORKERS < 1:
+    raise Exception('Параметр ZEPHYR_SEND_WORKERS должен быть больше 0')
+ZEPHYR_SEND_ATTEMPTS = env.int('ZEPHYR_SEND_ATTEMPTS', default=3)
+if ZEPHYR_SEND_ATTEMPTS < 1:
+    raise Exception('Параметр ZEPHYR_SEND_ATTEMPTS должен быть больше 0')
+# Максимальное время ожидания добавления тестов в тестовый цикл Zephyr (lite режим), сек
+ZEPHYR_JOB_TIMEOUT = env.int('ZEPHYR_JOB_TIMEOUT', default=120)
+# Существующий тестовый цикл Zephyr, в который записываются результаты вместо создания нового.
+# При параллельном запуске основной процесс создаёт один цикл и передаёт его воркерам
+ZEPHYR_TEST_CYCLE_ID = env.str('ZEPHYR_TEST_CYCLE_ID', default='')
+# Запись результатов сценариев в журнал REPORTS_DIR/zephyr_journal.jsonl (lite режим).
+# В режиме ZEPHYR_OFFLINE к Jira во время прогона не обращаемся, журнал отправляется командой
+# python -m features.core.zephyr_journal
+ZEPHYR_JOURNAL = env.bool('ZEPHYR_JOURNAL', default=False)
+ZEPHYR_OFFLINE = env.bool('ZEPHYR_OFFLINE', default=False)
+ZEPHYR_REPLAY_STATE_FILE = env.str('ZEPHYR_REPLAY_STATE_FILE', default='.zapp_zephyr_replay.json')
 
 BROWSER = env.str('BROWSER', default='chrome')
 BROWSER_VERSION = env.str('BROWSER_VERSION', default='')
@@ -45,6 +76,19 @@ BROWSER_LOGGING = env.bool('BROWSER_LOGGING', default=True)
 
 CHROME_OPTIONS = env.str('CHROME_OPTIONS', default='')
 
+# Пул заранее запущенных сессий браузера (0 - пул не используется)
+BROWSER_POOL_SIZE = env.int('BROWSER_POOL_SIZE', default=0)
+BROWSER_POOL_MAX_USES = env.int('BROWSER_POOL_MAX_USES', default=20)
+# Максимальное время ожидания свободной сессии пула, сек
+BROWSER_POOL_ACQUIRE_TIMEOUT = env.int('BROWSER_POOL_ACQUIRE_TIMEOUT', default=300)
+if BROWSER_POOL_ACQUIRE_TIMEOUT < 1:
+    raise Exception('Параметр BROWSER_POOL_ACQUIRE_TIMEOUT должен быть больше 0')
+
+# Замер команд WebDriver по шагам и локаторам: сводка в конце прогона и REPORTS_DIR/webdriver_profile.json
+WEBDRIVER_PROFILE = env.bool('WEBDRIVER_PROFILE', default=False)
+# Временная шкала прогона в формате Chrome trace event: REPORTS_DIR/trace.json
+TRACE = env.bool('TRACE', default=False)
+
 CANARY_COOKIE = env.str('CANARY_COOKIE', default='')
 
 default_path = ''
@@ -88,6 +132,11 @@ VIDEO_DIR = env.str('VIDEO_DIR', default='video')
 
 RETRY_DELAY = ON_SRE_DELAY = env.int('RETRY_DELAY', default=100000)
 SMARTWAIT_DELAY = env.float('SMARTWAIT_DELAY', default=7)
+SMARTWAIT_ENGINE = env.str('SMARTWAIT_ENGINE', default='webdriver').lower()
+if SMARTWAIT_ENGINE not in ('webdriver', 'observer'):
+    raise Exception('Параметр SMARTWAIT_ENGINE может принимать значения webdriver или observer')
+# Время (сек), в течение которого элемент должен непрерывно отсутствовать, чтобы проверка невидимости прошла
+SMARTWAIT_STABILITY_WINDOW = env.float('SMARTWAIT_STABILITY_WINDOW', default=0.15)
 FORCE_DELAY = env.float('FORCE_DELAY', default=0)
 if FORCE_DELAY > 2:
     raise Exception('Параметр FORCE_DELAY должен иметь значение не более 2 секунд')
@@ -100,7 +149,21 @@ if not validators.url(ZAPP_SITE_URL):
     raise Exception('Параметр ZAPP_SITE_URL должен содержать валидный URL')
 
 SCREENSHOT_DIR = env.str('SCREENSHOT_DIR', default='_screenshots')
+# Имя файла индекса хешей эталонов внутри SCREENSHOT_DIR
+SCREENSHOT_HASH_INDEX = env.str('SCREENSHOT_HASH_INDEX', default='hashes.json')
+# Максимальный суммарный размер декодированных эталонов в памяти, байт (0 - не кэшировать)
+SCREENSHOT_CACHE_BYTES = env.int('SCREENSHOT_CACHE_BYTES', default=256 * 1024 * 1024)
+# Выгрузка скриншотов и данных прогона в REMOTE_STORAGE_URL в фоновых потоках
+SCREENSHOT_REMOTE_UPLOAD = env.bool('SCREENSHOT_REMOTE_UPLOAD', default=False)
+SCREENSHOT_UPLOAD_WORKERS = env.int('SCREENSHOT_UPLOAD_WORKERS', default=8)
+if SCREENSHOT_UPLOAD_WORKERS < 1:
+    raise Exception('Параметр SCREENSHOT_UPLOAD_WORKERS должен быть положительным числом')
 LOCAL_SCREENSHOTS = env.bool('LOCAL_SCREENSHOTS', default=False) and RUN_TYPE in ('npm', 'local')
+# Отложенное сравнение скриншотов в пуле процессов: шаг только снимает скриншот
+SCREENSHOT_DEFERRED = env.bool('SCREENSHOT_DEFERRED', default=False)
+SCREENSHOT_WORKERS = env.int('SCREENSHOT_WORKERS', default=os.cpu_count() or 1)
+if SCREENSHOT_WORKERS < 1:
+    raise Exception('Параметр SCREENSHOT_WORKERS должен быть положительным числом')
 
 REMOTE_STORAGE_URL = env.str('REMOTE_STORAGE_URL', default='http://kube.example.com/tools/service-s3-proxy-zapp/')
 
@@ -120,6 +183,14 @@ INFLUX_USE = env.bool('INFLUX_USE', default=False)
 INFLUX_HOST = env.str('INFLUX_HOST', default='http://influx.example.com')
 INFLUX_PORT = env.str('INFLUX_PORT', default='8086')
 INFLUX_DB = env.str('INFLUX_DB', default='zapp_metrics')
+# Метрики отправляются пакетами из фонового потока: по накоплении INFLUX_BATCH_SIZE точек или раз в
+# INFLUX_FLUSH_INTERVAL секунд
+INFLUX_BATCH_SIZE = env.int('INFLUX_BATCH_SIZE', default=500)
+if INFLUX_BATCH_SIZE < 1:
+    raise Exception('Параметр INFLUX_BATCH_SIZE должен быть больше 0')
+INFLUX_FLUSH_INTERVAL = env.float('INFLUX_FLUSH_INTERVAL', default=10.0)
+if INFLUX_FLUSH_INTERVAL <= 0:
+    raise Exception('Параметр INFLUX_FLUSH_INTERVAL должен быть больше 0')
 
 MOBILE_NO_RESET = env.bool('MOBILE_NO_RESET', default=False)
 MOBILE_FULL_RESET = env.bool('MOBILE_FULL_RESET', default=not MOBILE_NO_RESET)
@@ -145,3 +216,24 @@ TG_NOTIFICATION_MODE = env.str('TG_NOTIFICATION_MODE', default='disable')
 
 RETRY_AFTER_FAIL = env.bool('RETRY_AFTER_FAIL', default=False)
 MAX_ATTEMPTS = env.int('MAX_ATTEMPTS', default=2)
+
+# Параметры процесса-воркера при параллельном запуске (run.py --workers N), задаются основным процессом
+WORKER_ID = env.str('WORKER_ID', default='')
+REPORTS_DIR = env.str('REPORTS_DIR', default='reports')
+# Профилирование сценариев в cProfile (PROFILE_MEMORY - дополнительно снимки tracemalloc)
+PROFILE = env.bool('PROFILE', default=False)
+PROFILE_MEMORY = env.bool('PROFILE_MEMORY', default=False)
+PROFILE_DIR = env.str('PROFILE_DIR', default=os.path.join(REPORTS_DIR, 'profiles'))
+# Лог stdout/stderr для zapp-backend: кольцевой буфер из сегментов RAW_LOG_SEGMENT_SIZE символов,
+# в памяти хранятся последние RAW_LOG_SEGMENTS сегментов, завершённые сегменты сжимаются в RAW_LOG_DIR
+RAW_LOG_SEGMENT_SIZE = env.int('RAW_LOG_SEGMENT_SIZE', default=1024 * 1024)
+if RAW_LOG_SEGMENT_SIZE < 1:
+    raise Exception('Параметр RAW_LOG_SEGMENT_SIZE должен быть больше 0')
+RAW_LOG_SEGMENTS = env.int('RAW_LOG_SEGMENTS', default=8)
+if RAW_LOG_SEGMENTS < 1:
+    raise Exception('Параметр RAW_LOG_SEGMENTS должен быть больше 0')
+RAW_LOG_DIR = env.str('RAW_LOG_DIR', default=os.path.join(REPORTS_DIR, 'raw_logs'))
+RAW_LOG_STREAM = env.bool('RAW_LOG_STREAM', default=False)
+# Хранилище длительностей сценариев для распределения сценариев между воркерами
+DURATIONS_FILE = env.str('DURATIONS_FILE', default='.zapp_durations.json')
+LOCATORS_CACHE_FILE = env.str('LOCATORS_CACHE_FILE', default='.zapp_locators_cache.json')
@@ -4,7 +4,13 @@ from retrying import retry
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import (
+    TimeoutException,
+    WebDriverException,
+    InvalidSelectorException,
+    NoSuchElementException,
+    StaleElementReferenceException
+)
 
 from features.core.constants import (
     EM_ELEMENT_NOT_FOUND,
@@ -12,13 +18,31 @@ from features.core.constants import (
     EM_WAITING_TIMEOUT,
     IM_ELEMENT_NOT_VISIBLE
 )
-from features.core.utils import log, import_locators, escaping_exceptions
+from features.core.js_scripts import WAIT_FOR_ELEMENT_STATE
+from features.core.locator_index import LocatorIndex, get_locator_type
+from features.core.settings import SMARTWAIT_ENGINE, SMARTWAIT_STABILITY_WINDOW, LOCATORS_CACHE_FILE
+from features.core.tracing import tracer
+from features.core.utils import log, escaping_exceptions, get_element_text
 
-LOCATORS = import_locators()
+LOCATORS = LocatorIndex(cache_path=LOCATORS_CACHE_FILE)
 INVISIBILITY = (EC.invisibility_of_element_located,)
 VISIBILITY = (EC.visibility_of_element_located, EC.visibility_of_all_elements_located,
               EC.visibility_of_any_elements_located, EC.visibility_of)
 
+# Состояния элемента, которых умеет дожидаться скрипт WAIT_FOR_ELEMENT_STATE (SMARTWAIT_ENGINE=observer)
+OBSERVER_STATES = {
+    EC.presence_of_element_located: 'present',
+    EC.presence_of_all_elements_located: 'all_present',
+    EC.visibility_of_element_located: 'visible',
+    EC.visibility_of_all_elements_located: 'all_visible',
+    EC.visibility_of_any_elements_located: 'any_visible',
+    EC.element_to_be_clickable: 'clickable',
+    EC.invisibility_of_element_located: 'invisible',
+    EC.text_to_be_present_in_element: 'text',
+}
+OBSERVER_LOCATOR_TYPES = {By.CSS_SELECTOR: 'css', By.XPATH: 'xpath'}
+STABILITY_POLL_FREQUENCY = 0.05
+
 
 class SmartWait:
     def __init__(self, context):
@@ -29,6 +53,12 @@ class SmartWait:
         """
         self.__webdriver_wait = WebDriverWait(context.browser, context.smartwait_delay)
         self.__wait_method = self.__webdriver_wait.until
+        self.__context = context
+        self.__driver = context.browser
+        self.__timeout = context.smartwait_delay
+        # В нативном мобильном приложении JavaScript недоступен
+        self.__use_observer = SMARTWAIT_ENGINE == 'observer' and not (
+            getattr(context, 'is_mobile', False) and not getattr(context, 'is_webview', False))
         self.expected = None
         self.force_delay = context.force_delay
 
@@ -36,24 +66,109 @@ class SmartWait:
     def _search_locator(target):
         if target:
             try:
-                return LOCATORS[target]
+                return LOCATORS.compiled(target)
 
             except KeyError:
                 log.error(EM_LOCATOR_NOT_FOUND.format(target))
                 raise
+        return None, None
 
     @staticmethod
     def _get_locator_type(locator):
-        if locator and locator.startswith(('/html/', '/')):
-            return By.XPATH
-        return By.CSS_SELECTOR
+        return get_locator_type(locator)
+
+    def _resolve_locator(self, kwargs):
+        """ Локатор и его тип: переданные явно или из индекса локаторов по имени target """
+
+        locator, by = kwargs.get('locator'), kwargs.get('by')
+        if not locator:
+            compiled_by, locator = self._search_locator(kwargs.get('target', ''))
+            by = by or compiled_by
+        return locator, by or self._get_locator_type(locator)
 
     @staticmethod
-    def _prepare_method(locator, by, expected):
+    def _prepare_method(locator, by, expected, text=None):
         if getattr(expected, '__module__') == EC.__name__ and locator:
-            expected = expected((by, locator))
+            expected = expected((by, locator)) if text is None else expected((by, locator), text)
         return expected
 
+    def _get_observer_state(self, locator, by):
+        """Returns a state for the observer engine or None if the wait has to be done by WebDriverWait"""
+        if not self.__use_observer or not locator or by not in OBSERVER_LOCATOR_TYPES:
+            return None
+
+        if getattr(self.__wait_method, '__name__') == 'until_not':
+            return 'invisible' if self.expected in VISIBILITY and self.expected is not EC.visibility_of else None
+
+        return OBSERVER_STATES.get(self.expected)
+
+    def _set_script_timeout(self, timeout):
+        # Таймаут скрипта хранится в сессии браузера, поэтому выставляем его только при изменении
+        if getattr(self.__driver, '_zapp_script_timeout', None) != timeout:
+            self.__driver.set_script_timeout(timeout)
+            self.__driver._zapp_script_timeout = timeout
+
+    def _observe(self, locator, by, state, text=None):
+        """Waits for the element state inside the browser with a single async script call"""
+        self._set_script_timeout(self.__timeout + 5)
+        result = self.__driver.execute_async_script(
+            WAIT_FOR_ELEMENT_STATE, OBSERVER_LOCATOR_TYPES[by], locator, state, text,
+            int(self.__timeout * 1000), int(SMARTWAIT_STABILITY_WINDOW * 1000)
+        )
+
+        if isinstance(result, dict) and result.get('zappTimeout'):
+            raise TimeoutException(EM_WAITING_TIMEOUT)
+
+        if isinstance(result, dict) and 'zappError' in result:
+            raise InvalidSelectorException(result['zappError'])
+
+        return result
+
+    def _wait_stable(self, condition):
+        """Waits until the condition holds continuously for SMARTWAIT_STABILITY_WINDOW seconds
+
+        Args:
+            condition: Callable without arguments returning a truthy value while the expected state holds.
+
+        Returns:
+            The last value returned by condition.
+        """
+        end_time = time.monotonic() + self.__timeout
+        stable_since = None
+        while True:
+            try:
+                value = condition()
+            except StaleElementReferenceException:
+                value = None
+
+            now = time.monotonic()
+            if not value:
+                stable_since = None
+            elif stable_since is None:
+                stable_since = now
+
+            if stable_since is not None and now - stable_since >= SMARTWAIT_STABILITY_WINDOW:
+                return value
+
+            if now > end_time:
+                raise TimeoutException(EM_WAITING_TIMEOUT)
+
+            time.sleep(STABILITY_POLL_FREQUENCY)
+
+    def _invisibility_condition(self, locator, by, text=None):
+        method = self._prepare_method(locator, by, self.expected, text)
+
+        def condition():
+            if getattr(self.__wait_method, '__name__') != 'until_not':
+                return method(self.__driver)
+
+            try:
+                return not method(self.__driver)
+            except (NoSuchElementException, StaleElementReferenceException):
+                return True
+
+        return condition
+
     @property
     def _invisibility(self):
         invisible = self.expected in INVISIBILITY
@@ -61,23 +176,39 @@ class SmartWait:
         return invisible or not_visible
 
     @retry(retry_on_exception=escaping_exceptions, stop_max_delay=100000)
+    @tracer.traced('SmartWait.wait', 'wait')
     def __wait(self, **kwargs):
         target = kwargs.get('target', '')
-        locator = kwargs.get('locator') or self._search_locator(target)
-        by = kwargs.get('by') or self._get_locator_type(locator)
+        locator, by = self._resolve_locator(kwargs)
+
+        text = kwargs.get('text')
 
         self.expected = kwargs.get('expected')
         if kwargs.get('wait_method') == 'until_not':
             self.__wait_method = self.__webdriver_wait.until_not
 
         try:
-            if self._invisibility and self.force_delay < 0.5:
-                time.sleep(0.5)  # prevents from false positive invisibility check
+            tracer.sleep(self.force_delay)
 
-            else:
-                time.sleep(self.force_delay)
+            state = self._get_observer_state(locator, by)
+            if state:
+                try:
+                    result = self._observe(locator, by, state, text)
+
+                except TimeoutException:
+                    raise
+
+                except WebDriverException as e:
+                    # Например, страница перезагрузилась во время ожидания: продолжаем ожидание через WebDriverWait
+                    log.debug(f'Observer wait failed, falling back to WebDriverWait: {e}')
+                    state = None
 
-            result = self.__wait_method(method=self._prepare_method(locator, by, self.expected))
+            if not state and self._invisibility:
+                # Элемент считается невидимым, только если остаётся таким в течение окна стабильности
+                result = self._wait_stable(self._invisibility_condition(locator, by, text))
+
+            elif not state:
+                result = self.__wait_method(method=self._prepare_method(locator, by, self.expected, text))
 
             if self._invisibility and result is True:
                     log.debug(IM_ELEMENT_NOT_VISIBLE.format(target, locator))
@@ -143,9 +274,53 @@ class SmartWait:
             locator (str): Only if you want to directly pass a locator, not its name.
             by (object): Type of locator. Will be determined (CSS_SELECTOR or XPATH) if not passed.
             expected (object): A method from expected_conditions module (EC) or custom object returning boolean value;
+            text (str): Text for EC.text_to_be_present_in_element.
             wait_method (str): Type of waiting; has value 'until' by default.
 
         Returns:
             None; Just waits for some condition to happen.
         """
         self.__wait(**kwargs)
+
+    @tracer.traced('SmartWait.wait_for_absence', 'wait')
+    def wait_for_absence(self, **kwargs):
+        """
+        Keyword Args:
+            target (str): Locator name.
+            locator (str): Only if you want to directly pass a locator, not its name.
+            by (object): Type of locator. Will be determined (CSS_SELECTOR or XPATH) if not passed.
+            text (str): If passed, only elements with exactly this text are taken into account.
+
+        Returns:
+            True if no visible element is found continuously during SMARTWAIT_STABILITY_WINDOW;
+            False if the element is still visible after the timeout.
+        """
+        target = kwargs.get('target', '')
+        locator, by = self._resolve_locator(kwargs)
+        text = kwargs.get('text')
+
+        tracer.sleep(self.force_delay)
+
+        if self.__use_observer and by in OBSERVER_LOCATOR_TYPES:
+            try:
+                return self._observe(locator, by, 'text_invisible' if text is not None else 'invisible', text)
+
+            except TimeoutException:
+                return False
+
+            except WebDriverException as e:
+                log.debug(f'Observer wait failed, falling back to polling: {e}')
+
+        def condition():
+            elements = self.__driver.find_elements(by, locator)
+            if text is None:
+                return not elements or not elements[0].is_displayed()
+
+            found = get_element_text(self.__context, elements, text) if elements else None
+            return not found or not found.is_displayed()
+
+        try:
+            return self._wait_stable(condition)
+
+        except TimeoutException:
+            return False
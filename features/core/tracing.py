@@ -0,0 +1,147 @@
+"""Запись временной шкалы прогона в формате Chrome trace event (chrome://tracing, ui.perfetto.dev)"""
+
+import os
+import json
+import time
+import functools
+import threading
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+import requests
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+TRACE_FILE = 'trace.json'
+NULL_SPAN = nullcontext()
+
+
+def get_timestamp():
+    """ Время в микросекундах - единица формата trace event """
+
+    return time.perf_counter_ns() // 1000
+
+
+class Span:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = get_timestamp()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add_event(
+            self.name, self.category, 'X', self.args, ts=self.start, dur=get_timestamp() - self.start
+        )
+
+
+class Tracer:
+    """
+    Сбор интервалов прогона: прогон -> фича -> сценарий -> шаг -> команды WebDriver, HTTP запросы
+    (zapp-backend, Jira/Zephyr, InfluxDB, Vault, API шаги), ожидания и паузы SmartWait, сравнение скриншотов.
+
+    Пока трассировка не включена (TRACE), span возвращает общий пустой контекстный менеджер,
+    а драйвер и requests не изменяются. При включении подменяются RemoteConnection.execute и
+    requests.Session.send, поэтому учитываются запросы из любых потоков
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._threads = {}
+        self._pid = os.getpid()
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self._patch_requests()
+        self._patch_webdriver()
+
+    def add_event(self, name, category, phase, args=None, ts=None, dur=None):
+        thread = threading.current_thread()
+        event = dict(name=name, cat=category, ph=phase, ts=ts or get_timestamp(), pid=self._pid, tid=thread.ident)
+        if dur is not None:
+            event['dur'] = dur
+        if args:
+            event['args'] = args
+
+        self._threads.setdefault(thread.ident, thread.name)
+        self._events.append(event)
+
+    def begin(self, name, category, **args):
+        """ Начало интервала, который заканчивается в другом хуке behave (end) """
+
+        if self.enabled:
+            self.add_event(name, category, 'B', args)
+
+    def end(self, name, category):
+        if self.enabled:
+            self.add_event(name, category, 'E')
+
+    def span(self, name, category, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def traced(self, name, category):
+        """ Декоратор: вызов функции записывается интервалом, если трассировка включена """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, name, category, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def sleep(self, seconds):
+        with self.span('sleep', 'sleep', seconds=seconds):
+            time.sleep(seconds)
+
+    def _patch_requests(self):
+        send = requests.Session.send
+        tracer = self
+
+        @functools.wraps(send)
+        def traced_send(session, request, **kwargs):
+            url = urlsplit(request.url)
+            with tracer.span(f'{request.method} {url.netloc}{url.path}', 'http', url=request.url) as span:
+                response = send(session, request, **kwargs)
+                span.args['status'] = response.status_code
+                return response
+
+        requests.Session.send = traced_send
+
+    def _patch_webdriver(self):
+        execute = RemoteConnection.execute
+        tracer = self
+
+        @functools.wraps(execute)
+        def traced_execute(connection, command, params):
+            args = {}
+            if isinstance(params, dict) and 'using' in params:
+                args = dict(using=params['using'], value=params.get('value'))
+            with tracer.span(command, 'webdriver', **args):
+                return execute(connection, command, params)
+
+        RemoteConnection.execute = traced_execute
+
+    def save(self, path):
+        metadata = [
+            dict(name='thread_name', ph='M', pid=self._pid, tid=tid, args=dict(name=name))
+            for tid, name in self._threads.items()
+        ]
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(dict(traceEvents=metadata + self._events, displayTimeUnit='ms'), output, ensure_ascii=False)
+        return len(self._events)
+
+
+tracer = Tracer()
@@ -5,7 +5,6 @@ from functools import wraps
 from pathlib import Path
 
 import colorlog
-import importlib
 import random
 import validators
 import hmac
@@ -46,28 +45,6 @@ log.setLevel(logging.DEBUG) if settings.DEBUG else log.setLevel(logging.INFO)
 log.addHandler(handler)
 
 
-def import_locators(path: str = 'features/steps',
-                    postfix: str = '_locators.py',
-                    name: str = 'locators'):
-    locators = {}
-    for current_dir, _, files in os.walk(path):
-        for file in files:
-            if file.endswith(postfix):
-                module_name = f'{current_dir}.{file.rstrip(".py")}'.replace('/', '.')
-                module = importlib.import_module(module_name)
-                imported_locators = getattr(module, name, None)
-
-                if imported_locators and isinstance(imported_locators, Mapping):
-                    overridden_keys = locators.keys() & imported_locators.keys()
-                    locators.update(imported_locators)
-
-                    if overridden_keys:
-                        log.warning('Обнаружены пересечения в словарях локаторов, проверьте поля %s. Один из '
-                                    'дубликатов в файле %s', overridden_keys, file)
-
-    return locators
-
-
 def telegram_bot_sendnotify(notify_name, bot_message):
     send_url = f'https://api.telegram.org/bot{settings.TG_BOT_TOKEN}/sendMessage'
     response = requests.get(send_url, json={'chat_id': settings.TG_CHAT_ID,
@@ -460,10 +437,10 @@ def generate_valid_snils() -> str:
     return snils_number + snils_code
 
 
-def clean_xml_reports(features_path=Path('./')):
+def clean_xml_reports(reports_dir='reports'):
     """Удаление всех локальных xml report"""
     try:
-        path = Path(features_path, 'reports').glob('*.xml')
+        path = Path(reports_dir).glob('*.xml')
         for file in (f for f in path if f.is_file()):
             file.unlink(missing_ok=True)
 
@@ -471,10 +448,10 @@ def clean_xml_reports(features_path=Path('./')):
         pass
 
 
-def get_output_as_json(features_path=Path('./')) -> dict:
+def get_output_as_json(reports_dir='reports') -> dict:
     output = {}
     try:
-        p = Path(features_path, 'reports').glob('*.xml')
+        p = Path(reports_dir).glob('*.xml')
         files = [f for f in p if f.is_file()]
         for file in files:
             with open(Path(file)) as xml_file:
@@ -505,14 +482,19 @@ def get_run_status(context):
     """
     summary_reporter = get_reporter(context, SummaryReporter)
     if summary_reporter:
-        if summary_reporter.scenario_summary['failed'] == 0 and \
-                summary_reporter.scenario_summary['passed'] > 0:
-            return True
-        if summary_reporter.scenario_summary['failed'] > 0:
-            return False
-        if summary_reporter.scenario_summary['failed'] == 0 and \
-                summary_reporter.scenario_summary['passed'] == 0:
-            return None
+        return get_summary_status(summary_reporter.scenario_summary)
+
+
+def get_summary_status(scenario_summary):
+    """
+        Возвращает признак успешно завершенного прогона по количеству успешных и упавших сценариев
+        или None, если не выполнено ни одного сценария
+    """
+    if scenario_summary['failed'] == 0 and scenario_summary['passed'] > 0:
+        return True
+    if scenario_summary['failed'] > 0:
+        return False
+    return None
 
 
 def send_by_mode(context, mode):
@@ -530,19 +512,31 @@ def send_by_mode(context, mode):
             always - отправка уведомлений в случае любых результатов
         """
     log.debug(f'get_run_status={get_run_status(context)}')
-    run_status = get_run_status(context)
+    send_run_status(get_run_status(context), context.backend, mode)
+
+
+def send_run_status(run_status, backend, mode):
+    """
+        Отправляет уведомление в telegram о результате прогона, см. send_by_mode.
+        Используется также основным процессом при параллельном запуске
+
+        Args:
+            run_status - результат get_run_status или get_summary_status
+            backend - ZappBackend с запущенной сессией
+            mode - режим отправки уведомлений
+        """
 
     if run_status and mode.lower() in ("on_success", "always"):
         telegram_bot_sendnotify(settings.TG_NICKNAME_FOR_NOTIFICATION,
-                                f'Тесты прошли успешно, ссылка на результаты: {context.backend.session_url}')
+                                f'Тесты прошли успешно, ссылка на результаты: {backend.session_url}')
 
     if run_status is False and mode.lower() in ("on_errors", "always"):
         telegram_bot_sendnotify(settings.TG_NICKNAME_FOR_NOTIFICATION,
-                                f'Тесты прошли неуспешно, ссылка на результаты: {context.backend.session_url}')
+                                f'Тесты прошли неуспешно, ссылка на результаты: {backend.session_url}')
 
     if run_status is None and mode.lower() in ("on_errors", "always"):
         telegram_bot_sendnotify(settings.TG_NICKNAME_FOR_NOTIFICATION,
-                                f'В процессе запуска что-то пошло не так, ссылка на результаты: {context.backend.session_url}')
+                                f'В процессе запуска что-то пошло не так, ссылка на результаты: {backend.session_url}')
 
 
 def slugify(input_str: str) -> str:
@@ -0,0 +1,139 @@
+"""Замер длительности команд WebDriver с разбивкой по шагам сценариев и локаторам"""
+
+import json
+import math
+import time
+from collections import OrderedDict, defaultdict
+
+from features.core.utils import log
+
+PROFILE_FILE = 'webdriver_profile.json'
+# Команды, для которых время учитывается по локаторам
+FIND_COMMANDS = ('findElement', 'findElements', 'findChildElement', 'findChildElements')
+# Время команд вне шагов (хуки before_*/after_*)
+HOOKS_STEP = '<hooks>'
+SUMMARY_SIZE = 10
+
+
+def get_percentile(durations, percent):
+    """ Перцентиль по методу ближайшего ранга """
+
+    ordered = sorted(durations)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def get_stats(durations):
+    """ Сводка по длительностям в миллисекундах """
+
+    return dict(
+        count=len(durations),
+        total_ms=round(sum(durations) * 1000, 3),
+        p50_ms=round(get_percentile(durations, 50) * 1000, 3),
+        p95_ms=round(get_percentile(durations, 95) * 1000, 3)
+    )
+
+
+class WebDriverProfiler:
+    """
+    Замер каждой команды WebDriver (поиск элементов, клики, execute_script, скриншоты и т.д.).
+
+    Метод execute драйвера подменяется обёрткой, которая замеряет команду и относит её к текущему шагу
+    (context.current_step, передаётся в start_step). Шаги агрегируются по месту объявления в feature файле,
+    поэтому шаги предыстории и структур сценариев суммируются по всем выполнениям.
+    Профилировщик подключается только при WEBDRIVER_PROFILE, иначе драйвер не изменяется
+    """
+
+    def __init__(self):
+        self.steps = OrderedDict()
+        self.commands = defaultdict(list)
+        self.locators = defaultdict(list)
+        self._active_steps = []
+
+    def attach(self, driver):
+        """ Подключить профилировщик к драйверу; повторное подключение к тому же драйверу ничего не делает """
+
+        if getattr(driver, '_webdriver_profiler', None) is self:
+            return
+
+        execute = driver.execute
+
+        def profiled_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.record(driver_command, params, time.perf_counter() - start)
+
+        driver.execute = profiled_execute
+        driver._webdriver_profiler = self
+
+    def _get_step(self, key, name):
+        if key not in self.steps:
+            self.steps[key] = dict(name=name, location=key, runs=0, durations=[], commands=defaultdict(list))
+        return self.steps[key]
+
+    def start_step(self, current_step):
+        key = f'{current_step["filename"]}:{current_step["line"]}'
+        step = self._get_step(key, current_step['name'])
+        step['runs'] += 1
+        self._active_steps.append(step)
+
+    def end_step(self, duration):
+        if self._active_steps:
+            self._active_steps.pop()['durations'].append(duration)
+
+    def record(self, command, params, duration):
+        step = self._active_steps[-1] if self._active_steps else self._get_step(HOOKS_STEP, HOOKS_STEP)
+        step['commands'][command].append(duration)
+        self.commands[command].append(duration)
+
+        if command in FIND_COMMANDS and params:
+            self.locators[f'{params.get("using")}={params.get("value")}'].append(duration)
+
+    def get_report(self):
+        steps = []
+        for step in self.steps.values():
+            command_durations = [duration for durations in step['commands'].values() for duration in durations]
+            if not command_durations:
+                continue
+
+            steps.append(dict(
+                name=step['name'],
+                location=step['location'],
+                runs=step['runs'],
+                step_total_ms=round(sum(step['durations']) * 1000, 3),
+                webdriver=get_stats(command_durations),
+                commands={command: get_stats(durations) for command, durations in step['commands'].items()}
+            ))
+
+        return dict(
+            steps=sorted(steps, key=lambda item: item['webdriver']['total_ms'], reverse=True),
+            commands={command: get_stats(durations) for command, durations in self.commands.items()},
+            locators=OrderedDict(sorted(
+                ((locator, get_stats(durations)) for locator, durations in self.locators.items()),
+                key=lambda item: item[1]['total_ms'], reverse=True
+            ))
+        )
+
+    def save(self, path):
+        report = self.get_report()
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=1)
+        return report
+
+    @staticmethod
+    def log_summary(report):
+        if not report['steps']:
+            return
+
+        log.info('Шаги с наибольшим временем команд WebDriver:')
+        for step in report['steps'][:SUMMARY_SIZE]:
+            stats = step['webdriver']
+            log.info(f'\t{stats["total_ms"]:.0f} мс, команд: {stats["count"]}, p50/p95: '
+                     f'{stats["p50_ms"]:.1f}/{stats["p95_ms"]:.1f} мс - "{step["name"]}" ({step["location"]})')
+
+        if report['locators']:
+            log.info('Локаторы с наибольшим временем поиска:')
+            for locator, stats in list(report['locators'].items())[:SUMMARY_SIZE]:
+                log.info(f'\t{stats["total_ms"]:.0f} мс, поисков: {stats["count"]}, p95: {stats["p95_ms"]:.1f} мс - '
+                         f'{locator}')
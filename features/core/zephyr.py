@@ -1,17 +1,32 @@
+import queue
 import requests
+import threading
 import traceback
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime
 from babel.dates import format_datetime
 from urllib.parse import urljoin
 
-from features.core.settings import ENV, DEPLOY, PROJECT_KEY, VERSION_NAME
+from features.core.settings import (
+    ENV,
+    DEPLOY,
+    PROJECT_KEY,
+    VERSION_NAME,
+    ZEPHYR_FLUSH_TIMEOUT,
+    ZEPHYR_CACHE_FILE,
+    ZEPHYR_CACHE_TTL,
+    ZEPHYR_CACHE_RETENTION_DAYS,
+    ZEPHYR_TEST_CYCLE_ID
+)
 from features.core.constants import (
     JIRA_DATE_FORMAT,
     JIRA_PROJECT,
     JIRA_ISSUE,
     JIRA_ISSUE_VIEW,
     JIRA_ISSUE_LINK,
+    JIRA_SEARCH,
     JIRA_SEARCH_TEST,
     ZEPHYR_TEST_STEP,
     ZEPHYR_TEST_CYCLE,
@@ -23,6 +38,12 @@ from features.core.constants import (
     STATUSES,
 )
 from features.core.utils import log
+from features.core.zephyr_cache import ZephyrCache, get_content_hash
+
+# Количество параллельных запросов при обновлении и удалении шагов теста
+STEP_SYNC_WORKERS = 8
+
+zephyr_cache = ZephyrCache(ZEPHYR_CACHE_FILE, ttl=ZEPHYR_CACHE_TTL, retention=ZEPHYR_CACHE_RETENTION_DAYS * 24 * 3600)
 
 
 def get_ids(data):
@@ -38,6 +59,17 @@ def get_ids(data):
         return ids
 
 
+def compact_issue(issue):
+    """ Данные теста Jira, которые нужны для синхронизации и хранятся в кэше """
+
+    fields = issue.get('fields', {})
+    return dict(
+        id=issue.get('id'),
+        key=issue.get('key'),
+        fields={name: fields.get(name) for name in ('summary', 'description', 'labels') if name in fields}
+    )
+
+
 def format_bdd(steps, results):
     while len(steps) > len(results):
         results.append('')
@@ -84,6 +116,21 @@ def parse_tags(tags):
     return zephyr_label, story_key
 
 
+def collect_zephyr_labels(features, tag_expression):
+    """ Метки ZephyrLabel всех сценариев, которые будут выполнены с учётом тегов запуска """
+
+    labels = []
+    for feature in features:
+        for scenario in feature.walk_scenarios():
+            if not scenario.should_run_with_tags(tag_expression):
+                continue
+
+            zephyr_label, _ = parse_tags(scenario.effective_tags)
+            if zephyr_label and zephyr_label not in labels:
+                labels.append(zephyr_label)
+    return labels
+
+
 def parse_scenario(scenario_steps):
     steps = []
     results = []
@@ -124,12 +171,92 @@ def interrupt_sync(context):
     log.warning('Синхронизация с Zephyr прервана')
 
 
+class ZephyrQueue:
+    """
+    Очередь запросов к Zephyr, выполняемых по порядку в фоновом потоке со своей сессией.
+    Данные для запросов фиксируются при постановке в очередь, поэтому поток не обращается к context behave.
+    При ошибке запроса синхронизация прерывается, а оставшиеся запросы пропускаются
+    """
+
+    def __init__(self, auth):
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.interrupted = False
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='zephyr-sync', daemon=True)
+        self._thread.start()
+
+    def put(self, code, execution_id, function, *args):
+        """
+        Поставить запрос в очередь
+
+        :param code: код запроса для сообщения об ошибке
+        :param execution_id: исполнение теста, которое будет заблокировано при ошибке запроса
+        :param function: функция, выполняющая запрос, первым аргументом получает сессию
+        """
+
+        if not self.interrupted:
+            self._queue.put((code, execution_id, function, args))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+
+                code, execution_id, function, args = item
+                if self.interrupted:
+                    continue
+
+                try:
+                    function(self.session, *args)
+                except requests.exceptions.RequestException as e:
+                    log.error(f'Ошибка при выполнении запроса к Zephyr. [{code}] {e}')
+                    self._interrupt(execution_id)
+            finally:
+                self._queue.task_done()
+
+    def _interrupt(self, execution_id):
+        self.interrupted = True
+        if execution_id:
+            try:
+                Execution.put(self.session, execution_id, {'status': STATUSES.get('blocked')})
+            except requests.exceptions.RequestException:
+                pass
+        log.warning('Синхронизация с Zephyr прервана')
+
+    def flush(self, timeout=ZEPHYR_FLUSH_TIMEOUT):
+        """ Дождаться выполнения запросов из очереди, но не дольше timeout секунд """
+
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.warning(f'Не все результаты отправлены в Zephyr за {timeout} сек., '
+                        f'осталось запросов: {self._queue.qsize()}')
+            self.interrupted = True
+            return False
+        return True
+
+
+class StepResultRef:
+    """ Идентификатор результата шага, который станет известен после выполнения запроса в очереди """
+
+    def __init__(self):
+        self.id = None
+
+
 class TestCycle:
     @classmethod
     def create(cls, context):
         if not context.sync:
             return
 
+        # Цикл, созданный заранее (например, основным процессом параллельного запуска для всех воркеров)
+        if ZEPHYR_TEST_CYCLE_ID:
+            log.debug(f'TEST CYCLE: {ZEPHYR_TEST_CYCLE_ID}')
+            return ZEPHYR_TEST_CYCLE_ID
+
         payload = {
             'description': 'Тестовый цикл был создан автоматически с помощью ZAPP',
             'environment': ENV,
@@ -229,18 +356,27 @@ class Execution:
 
     @classmethod
     def update(cls, context, payload):
-        if not context.sync:
+        if not context.sync or not context.last_execution_id:
+            return
+
+        execution_id = context.last_execution_id
+        zephyr_queue = getattr(context, 'zephyr_queue', None)
+        if zephyr_queue:
+            zephyr_queue.put('EX-U3', execution_id, Execution.put, execution_id, payload)
             return
 
         try:
-            resp = context.session.put(
-                f'{urljoin(ZEPHYR_EXECUTION, str(context.last_execution_id))}/execute', json=payload)
-            resp.raise_for_status()
+            Execution.put(context.session, execution_id, payload)
 
         except requests.exceptions.RequestException as e:
             log.error(f'Ошибка при выполнении запроса к Zephyr. [EX-U3] {e}')
             interrupt_sync(context)
 
+    @staticmethod
+    def put(session, execution_id, payload):
+        resp = session.put(f'{urljoin(ZEPHYR_EXECUTION, str(execution_id))}/execute', json=payload)
+        resp.raise_for_status()
+
     @staticmethod
     def update_execution_status(context, status):
         Execution.update(context, payload={'status': STATUSES.get(status), 'comment': context.background_steps})
@@ -260,9 +396,9 @@ class TestStep:
             return
 
         try:
-            resp = context.session.get(urljoin(ZEPHYR_TEST_STEP, context.issue_id))
-            resp.raise_for_status()
-            ids_json = resp.json()
+            ids_json = zephyr_cache.request_json(
+                context.session, urljoin(ZEPHYR_TEST_STEP, context.issue_id), 'steps', context.issue_id
+            )
             ids_list = ids_json.get(next(iter(ids_json)), [])
             ids = get_ids(ids_list)
             return ids
@@ -274,20 +410,71 @@ class TestStep:
     @staticmethod
     def create(context, payload):
         try:
-            context.session.post(urljoin(ZEPHYR_TEST_STEP, context.issue_id), json=payload)
+            resp = context.session.post(urljoin(ZEPHYR_TEST_STEP, context.issue_id), json=payload)
+            resp.raise_for_status()
+            return True
 
         except requests.exceptions.RequestException as e:
             log.error(f'Ошибка при выполнении запроса к Zephyr. [TS-C1] {e}')
             interrupt_sync(context)
+            return False
 
+    # update и delete выполняются в потоках пула, поэтому не обращаются к context и пробрасывают ошибки
     @staticmethod
-    def delete(context, step_id):
-        try:
-            context.session.delete(f'{urljoin(ZEPHYR_TEST_STEP, context.issue_id)}/{step_id}')
+    def update(session, issue_id, step_id, payload):
+        resp = session.put(f'{urljoin(ZEPHYR_TEST_STEP, issue_id)}/{step_id}', json=payload)
+        resp.raise_for_status()
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'Ошибка при выполнении запроса к Zephyr. [TS-D4] {e}')
+    @staticmethod
+    def delete(session, issue_id, step_id):
+        resp = session.delete(f'{urljoin(ZEPHYR_TEST_STEP, issue_id)}/{step_id}')
+        resp.raise_for_status()
+
+    @staticmethod
+    def sync(context, zephyr_steps, bdd_data):
+        """
+        Привести шаги теста в Zephyr к шагам сценария с минимальным числом запросов.
+        Шаги сравниваются по позициям: изменённые шаги обновляются, лишние удаляются (параллельно),
+        недостающие добавляются в конец по порядку
+
+        :returns: True, если все запросы выполнены успешно
+        """
+
+        bdd_steps = [bdd_data[str(i)] for i in range(len(bdd_data))]
+        updates = [
+            (str(zephyr_step['id']), bdd_step)
+            for zephyr_step, bdd_step in zip(zephyr_steps, bdd_steps)
+            if {'step': zephyr_step.get('step'), 'result': zephyr_step.get('result')} != bdd_step
+        ]
+        deletes = [str(zephyr_step['id']) for zephyr_step in zephyr_steps[len(bdd_steps):]]
+        creates = bdd_steps[len(zephyr_steps):]
+        log.debug(f'TEST STEPS: update={len(updates)}, delete={len(deletes)}, create={len(creates)}')
+
+        session, issue_id = context.session, context.issue_id
+        with ThreadPoolExecutor(max_workers=STEP_SYNC_WORKERS) as executor:
+            futures = [
+                ('TS-U3', executor.submit(TestStep.update, session, issue_id, step_id, payload))
+                for step_id, payload in updates
+            ]
+            futures += [('TS-D4', executor.submit(TestStep.delete, session, issue_id, step_id)) for step_id in deletes]
+
+        # Ошибки обрабатываются в вызывающем потоке: interrupt_sync изменяет context
+        success = True
+        for code, future in futures:
+            try:
+                future.result()
+            except requests.exceptions.RequestException as e:
+                log.error(f'Ошибка при выполнении запроса к Zephyr. [{code}] {e}')
+                success = False
+
+        if not success:
             interrupt_sync(context)
+            return False
+
+        for payload in creates:
+            if not TestStep.create(context, payload):
+                return False
+        return True
 
 
 class StepResult:
@@ -296,57 +483,70 @@ class StepResult:
         if not context.sync or not context.test_step_ids:
             return
 
-        try:
-            payload = {
-                'stepId': str(context.test_step_ids.pop(0)),
-                'issueId': context.issue_id,
-                'executionId': str(context.last_execution_id),
-                'status': STATUSES.get('in_progress')
-            }
-
-            resp = context.session.post(ZEPHYR_STEP_RESULT, json=payload)
-            resp.raise_for_status()
-            return resp.json().get('id')
+        step_result = StepResultRef()
+        execution_id = context.last_execution_id
+        payload = {
+            'stepId': str(context.test_step_ids.pop(0)),
+            'issueId': context.issue_id,
+            'executionId': str(execution_id),
+            'status': STATUSES.get('in_progress')
+        }
+        context.zephyr_queue.put('SR-C1', execution_id, StepResult.post, step_result, payload)
+        return step_result
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'Ошибка при выполнении запроса к Zephyr. [SR-C1] {e}')
-            log.debug('Do not enter the execution of cycle manually  until tests complete!')
-            interrupt_sync(context)
+    @staticmethod
+    def post(session, step_result, payload):
+        resp = session.post(ZEPHYR_STEP_RESULT, json=payload)
+        resp.raise_for_status()
+        step_result.id = resp.json().get('id')
 
     @classmethod
     def update_status(cls, context, step):
-        try:
-            payload = {
-                'status': STATUSES.get(step.status.name),
-                'comment': str(step.exception) if step.exception else None
-            }
+        if not context.last_step_result_id:
+            return
 
-            resp = context.session.put(urljoin(ZEPHYR_STEP_RESULT, str(context.last_step_result_id)), json=payload)
-            resp.raise_for_status()
+        payload = {
+            'status': STATUSES.get(step.status.name),
+            'comment': str(step.exception) if step.exception else None
+        }
+        context.zephyr_queue.put(
+            'SR-U3', context.last_execution_id, StepResult.put, context.last_step_result_id, payload)
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'Ошибка при выполнении запроса к Zephyr. [SR-U3] {e}')
-            interrupt_sync(context)
+    @staticmethod
+    def put(session, step_result, payload):
+        if step_result.id is None:
+            return
+
+        resp = session.put(urljoin(ZEPHYR_STEP_RESULT, str(step_result.id)), json=payload)
+        resp.raise_for_status()
 
     @classmethod
     def upload_attachments(cls, context, step):
+        if not context.last_step_result_id:
+            return
+
         try:
             StepResult.prepare_traceback(step.exc_traceback)
-
-            params = {'entityType': 'TESTSTEPRESULT', 'entityId': str(context.last_step_result_id)}
-            files = [('file', ('screenshot.png', context.browser.get_screenshot_as_png(), 'multipart/form-data')),
-                     ('file', ('traceback.txt', open('traceback.txt', 'rb'), 'multipart/form-data'))]
-
-            resp = context.session.post(ZEPHYR_ATTACHMENT, params=params, files=files)
-            log.debug(f'ATTACHMENT: {resp.text}')
-            resp.raise_for_status()
+            with open('traceback.txt', 'rb') as tb:
+                files = [('file', ('screenshot.png', context.browser.get_screenshot_as_png(), 'multipart/form-data')),
+                         ('file', ('traceback.txt', tb.read(), 'multipart/form-data'))]
 
         except traceback.TracebackException as e:
             log.error(f'Ошибка при записи лога в файл. {e}')
+            return
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'Ошибка при выполнении запроса к Zephyr. [SR-A1] {e}')
-            interrupt_sync(context)
+        context.zephyr_queue.put(
+            'SR-A1', context.last_execution_id, StepResult.post_attachments, context.last_step_result_id, files)
+
+    @staticmethod
+    def post_attachments(session, step_result, files):
+        if step_result.id is None:
+            return
+
+        params = {'entityType': 'TESTSTEPRESULT', 'entityId': str(step_result.id)}
+        resp = session.post(ZEPHYR_ATTACHMENT, params=params, files=files)
+        log.debug(f'ATTACHMENT: {resp.text}')
+        resp.raise_for_status()
 
     @staticmethod
     def prepare_traceback(tb):
@@ -354,6 +554,87 @@ class StepResult:
             traceback.print_tb(tb, file=output)
 
 
+def get_label_key(label):
+    """ Ключ метки в индексе и кэше: JQL "labels in (...)" сравнивает метки без учёта регистра """
+
+    return label.lower()
+
+
+class JiraIssueIndex:
+    """
+    Тесты Jira по меткам ZephyrLabel всех сценариев прогона.
+    Метки ищутся несколькими запросами "labels in (...)" в начале прогона вместо отдельного поиска на каждый сценарий
+    """
+
+    LABELS_PER_QUERY = 100
+    PAGE_SIZE = 100
+
+    def __init__(self):
+        self.issues = {}
+
+    @classmethod
+    def load(cls, session, labels):
+        index = cls()
+        labels = [label for label in labels if not index._load_cached(label)]
+        try:
+            for start in range(0, len(labels), cls.LABELS_PER_QUERY):
+                index._load_chunk(session, labels[start:start + cls.LABELS_PER_QUERY])
+
+        except requests.exceptions.RequestException as e:
+            log.warning(f'Не удалось найти тесты в Jira по меткам одним запросом, '
+                        f'поиск будет выполняться для каждого сценария. [JI-L2] {e}')
+            return cls()
+
+        log.debug(f'Найдены тесты в Jira по {len(index.issues)} меткам, из них запрошено в Jira: {len(labels)}')
+        return index
+
+    def _load_cached(self, label):
+        issue = zephyr_cache.get('issues', get_label_key(label), ttl=zephyr_cache.ttl)
+        if issue is None:
+            return False
+
+        self.issues[get_label_key(label)] = [issue]
+        return True
+
+    def _load_chunk(self, session, labels):
+        chunk_issues = {get_label_key(label): [] for label in labels}
+        labels_jql = ', '.join('"{}"'.format(label.replace('"', '\\"')) for label in labels)
+        payload = {
+            'jql': f'issuetype=тест and labels in ({labels_jql})',
+            'fields': ['summary', 'description', 'labels'],
+            'maxResults': self.PAGE_SIZE,
+            'startAt': 0
+        }
+
+        while True:
+            resp = session.post(JIRA_SEARCH, json=payload)
+            resp.raise_for_status()
+            jira_data = resp.json()
+            issues = jira_data.get('issues', [])
+
+            for issue in issues:
+                for label in {get_label_key(issue_label) for issue_label in issue.get('fields', {}).get('labels', [])}:
+                    if label in chunk_issues:
+                        chunk_issues[label].append(issue)
+
+            payload['startAt'] += len(issues)
+            if not issues or payload['startAt'] >= jira_data.get('total', 0):
+                break
+
+        self.issues.update(chunk_issues)
+        for label, issues in chunk_issues.items():
+            if len(issues) == 1:
+                zephyr_cache.set('issues', label, compact_issue(issues[0]))
+
+    def get(self, label):
+        """ Тесты с меткой или None, если метка не искалась """
+
+        return self.issues.get(get_label_key(label))
+
+    def add(self, label, issue):
+        self.issues.setdefault(get_label_key(label), []).append(issue)
+
+
 class JiraIssue:
     def __init__(self, context):
         self.issue = self.search(context)
@@ -362,31 +643,42 @@ class JiraIssue:
         if not context.sync:
             return
 
-        try:
-            resp = context.session.get(f'{JIRA_SEARCH_TEST}("{context.zephyr_label}")')
-            resp.raise_for_status()
+        issue_index = getattr(context, 'issue_index', None)
+        issues = issue_index.get(context.zephyr_label) if issue_index else None
 
-            jira_data = resp.json()
-            issues_found = jira_data.get('total')
+        if issues is None:
+            try:
+                resp = context.session.get(f'{JIRA_SEARCH_TEST}("{context.zephyr_label}")')
+                resp.raise_for_status()
+                issues = resp.json().get('issues')
+
+            except requests.exceptions.RequestException as e:
+                log.error(f'Ошибка при выполнении запроса к Jira. [JI-S5] {e}')
+                interrupt_sync(context)
+                return
 
-            if issues_found == 1:
-                issue = jira_data.get('issues')[0]
-                return issue
+            if len(issues) == 1:
+                zephyr_cache.set('issues', get_label_key(context.zephyr_label), compact_issue(issues[0]))
 
-            elif issues_found == 0:
-                log.warning(f'Не найден тест в Jira с меткой {context.zephyr_label}')
-                return self.create(context)
+        if len(issues) == 1:
+            return issues[0]
 
-            else:
-                log.error(f'Метка "{context.zephyr_label}" должна быть уникальной для каждого теста. Найдена в:')
-                for issue in jira_data.get('issues'):
-                    log.error(f'{JIRA_ISSUE_VIEW}{issue["key"]}')
-                interrupt_sync(context)
-                return {}
+        elif not issues:
+            log.warning(f'Не найден тест в Jira с меткой {context.zephyr_label}')
+            issue = self.create(context)
+            if issue:
+                zephyr_cache.set('issues', get_label_key(context.zephyr_label), compact_issue(issue))
+            if issue and issue_index:
+                issue_index.add(context.zephyr_label, issue)
+            return issue
 
-        except requests.exceptions.RequestException as e:
-            log.error(f'Ошибка при выполнении запроса к Jira. [JI-S5] {e}')
+        else:
+            zephyr_cache.delete('issues', get_label_key(context.zephyr_label))
+            log.error(f'Метка "{context.zephyr_label}" должна быть уникальной для каждого теста. Найдена в:')
+            for issue in issues:
+                log.error(f'{JIRA_ISSUE_VIEW}{issue["key"]}')
             interrupt_sync(context)
+            return {}
 
     @staticmethod
     def create(context):
@@ -430,14 +722,27 @@ class JiraIssue:
             resp.raise_for_status()
             log.info(f'Тест {JIRA_ISSUE_VIEW}{context.issue_key} успешно обновлен')
 
+            issue, _ = zephyr_cache.get_stale('issues', get_label_key(context.zephyr_label))
+            if issue:
+                issue.setdefault('fields', {}).update(
+                    summary=context.scenario.name, description=context.background_steps or ''
+                )
+                zephyr_cache.set('issues', get_label_key(context.zephyr_label), issue)
+
         except requests.exceptions.RequestException as e:
             log.error(f'Ошибка при выполнении запроса к Jira. [JI-U3] {e}')
             interrupt_sync(context)
 
     def sync(self, context):
-        if not context.sync:
+        if not context.sync or not self.id_:
             return
 
+        bdd_data = format_bdd(context.bdd_steps, context.bdd_results)
+        content_hash = get_content_hash(context.scenario.name, context.background_steps or '', bdd_data)
+        if zephyr_cache.get('content', self.id_) == content_hash:
+            log.info('Сценарий не изменился с последней синхронизации с Jira')
+            return self.key, self.id_
+
         issue_description = self.issue.get('fields', {}).get('description')
         issue_summary = self.issue.get('fields', {}).get('summary')
 
@@ -449,12 +754,12 @@ class JiraIssue:
             self.update(context)
 
         try:
-            resp = context.session.get(urljoin(ZEPHYR_TEST_STEP, self.id_))
-            resp.raise_for_status()
-            zephyr_data_json = resp.json()
+            # Содержимое теста изменилось - шаги перепроверяются в Zephyr независимо от времени жизни кэша
+            zephyr_data_json = zephyr_cache.request_json(
+                context.session, urljoin(ZEPHYR_TEST_STEP, self.id_), 'steps', self.id_, ttl=0
+            )
             zephyr_data_list = zephyr_data_json.get(next(iter(zephyr_data_json)), [])
             zephyr_data = format_zephyr(zephyr_data_list)
-            bdd_data = format_bdd(context.bdd_steps, context.bdd_results)
 
         except requests.exceptions.RequestException as e:
             log.error(f'Ошибка при выполнении запроса к Zephyr. [JI-S2] {e}')
@@ -467,17 +772,15 @@ class JiraIssue:
 
         except AssertionError:
             log.warning('Шаги сценария не совпадают с указанными в Jira')
-            ids = get_ids(zephyr_data_list)
-
-            for step_id in ids:
-                TestStep.delete(context, str(step_id))
-
-            for i in bdd_data:
-                payload = {'step': bdd_data[i]['step'], 'result': bdd_data[i]['result']}
-                TestStep.create(context, payload)
+            synced = TestStep.sync(context, zephyr_data_list, bdd_data)
+            zephyr_cache.delete('steps', self.id_)
+            if not synced:
+                return self.key, self.id_
 
             log.info(f'Шаги сценария успешно добавлены/обновлены в Jira: {JIRA_ISSUE_VIEW}{context.issue_key}')
 
+        if context.sync:
+            zephyr_cache.set('content', self.id_, content_hash)
         return self.key, self.id_
 
     @staticmethod
@@ -506,9 +809,9 @@ class JiraIssue:
 class JiraProject:
     def __init__(self, context):
         try:
-            resp = context.session.get(urljoin(JIRA_PROJECT, PROJECT_KEY))
-            resp.raise_for_status()
-            self.project = resp.json()
+            self.project = zephyr_cache.request_json(
+                context.session, urljoin(JIRA_PROJECT, PROJECT_KEY), 'project', PROJECT_KEY
+            )
 
         except requests.exceptions.RequestException as e:
             log.error(f'Ошибка при выполнении запроса к JIRA. [JP-S2] {e}')
@@ -556,12 +859,30 @@ class JiraProject:
         return version_id, version_name
 
 
+def create_shared_test_cycle(auth):
+    """
+    Создать тестовый цикл, общий для всех воркеров параллельного запуска
+
+    :returns: id тестового цикла или None, если создать цикл не удалось
+    """
+
+    context = SimpleNamespace(sync=True, last_execution_id=None, session=requests.Session())
+    context.session.auth = auth
+
+    project = JiraProject(context)
+    context.project_id = project.id_
+    context.project_version_id, context.project_version_name = project.version
+    return TestCycle.create(context)
+
+
 class ZephyrSync:
     @staticmethod
-    def before_all(context, auth):
+    def before_all(context, auth, labels=()):
         context.zephyr_run_results = {}
         context.session = requests.Session()
         context.session.auth = auth
+        context.zephyr_queue = ZephyrQueue(auth)
+        context.issue_index = JiraIssueIndex.load(context.session, labels)
 
         project = JiraProject(context)
         context.project_id = project.id_
@@ -576,6 +897,11 @@ class ZephyrSync:
     @staticmethod
     def before_scenario(context, scenario):
         context.last_execution_id = None
+        context.last_step_result_id = None
+        if context.zephyr_queue.interrupted:
+            context.sync = False
+            return context.sync
+
         context.bdd_steps, context.bdd_results = parse_scenario(scenario.steps)
 
         if context.feature.background:
@@ -638,6 +964,7 @@ class ZephyrSync:
 
     @staticmethod
     def after_all(context):
+        context.zephyr_queue.flush()
         TestCycle.update(context)
         log.info('Результаты тестового прогона сценариев:')
         for scenario_name, zephyr_result_link in context.zephyr_run_results.items():
@@ -0,0 +1,161 @@
+"""Локальный кэш данных синхронизации с Jira/Zephyr между прогонами"""
+
+import os
+import json
+import time
+import hashlib
+
+from features.core.utils import log
+
+CACHE_VERSION = 1
+
+
+def get_content_hash(*parts):
+    """ Хеш содержимого теста: название, предусловия и шаги """
+
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+
+class ZephyrCache:
+    """
+    Кэш в JSON файле, разделённый на секции (content - хеши синхронизированного содержимого тестов,
+    project - данные проекта Jira, issues - тесты по меткам ZephyrLabel, steps - шаги тестов).
+    Каждая запись хранит значение, время сохранения, время последнего использования и ETag ответа сервера.
+
+    Изменения накапливаются в памяти и записываются одним вызовом save в конце прогона: только изменённые
+    записи поверх актуального содержимого файла, чтобы параллельные процессы не затирали записи друг друга.
+    При сохранении удаляются записи, которые не использовались дольше retention секунд
+    """
+
+    def __init__(self, path, ttl=None, retention=None):
+        self.path = path
+        self.ttl = ttl
+        self.retention = retention
+        self._data = self._load()
+        self._changed = set()
+        self._deleted = set()
+        self._used = set()
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+            if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'version': CACHE_VERSION}
+
+    def _entry(self, section, key):
+        entry = self._data.get(section, {}).get(str(key))
+        if not isinstance(entry, dict) or 'value' not in entry:
+            return None
+
+        self._used.add((section, str(key)))
+        return entry
+
+    def get(self, section, key, ttl=None):
+        """
+        Значение записи или None, если записи нет или она устарела
+
+        :param ttl: время жизни записи в секундах; по умолчанию - без ограничения
+        """
+
+        entry = self._entry(section, key)
+        if entry is None or ttl is not None and time.time() - entry.get('time', 0) > ttl:
+            return None
+        return entry['value']
+
+    def get_stale(self, section, key):
+        """ Значение и ETag записи без учёта времени жизни - для условного запроса к серверу """
+
+        entry = self._entry(section, key)
+        if entry is None:
+            return None, None
+        return entry['value'], entry.get('etag')
+
+    def set(self, section, key, value, etag=None):
+        now = time.time()
+        self._data.setdefault(section, {})[str(key)] = {'value': value, 'time': now, 'used': now, 'etag': etag}
+        self._changed.add((section, str(key)))
+        self._deleted.discard((section, str(key)))
+
+    def touch(self, section, key):
+        """ Продлить время жизни записи, например после ответа 304 Not Modified """
+
+        entry = self._entry(section, key)
+        if entry is not None:
+            self.set(section, key, entry['value'], etag=entry.get('etag'))
+
+    def delete(self, section, key):
+        if self._data.get(section, {}).pop(str(key), None) is not None:
+            self._deleted.add((section, str(key)))
+            self._changed.discard((section, str(key)))
+
+    def save(self):
+        """ Записать изменения и отметки использования записей в файл, удалив неиспользуемые записи """
+
+        if not self._changed and not self._deleted and not self._used:
+            return
+
+        now = time.time()
+        data = self._load()
+        for section, key in self._changed:
+            data.setdefault(section, {})[key] = self._data[section][key]
+        for section, key in self._deleted:
+            data.get(section, {}).pop(key, None)
+        for section, key in self._used - self._changed:
+            entry = data.get(section, {}).get(key)
+            if isinstance(entry, dict):
+                entry['used'] = now
+        if self.retention:
+            self._prune(data, now - self.retention)
+
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(data, cache_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.debug(f'Не удалось сохранить кэш синхронизации с Zephyr: {e}')
+            return
+
+        self._data = data
+        self._changed.clear()
+        self._deleted.clear()
+        self._used.clear()
+
+    @staticmethod
+    def _prune(data, deadline):
+        for section in data.values():
+            if not isinstance(section, dict):
+                continue
+            for key in [key for key, entry in section.items()
+                        if not isinstance(entry, dict) or entry.get('used', entry.get('time', 0)) < deadline]:
+                del section[key]
+
+    def request_json(self, session, url, section, key, ttl=None):
+        """
+        GET запрос с кэшированием ответа.
+        Свежая запись возвращается без запроса, устаревшая перепроверяется условным запросом
+        с If-None-Match, если сервер вернул ETag. Ошибки запроса пробрасываются вызывающему коду
+
+        :param ttl: время жизни записи в секундах; по умолчанию - время жизни кэша
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        value = self.get(section, key, ttl=ttl)
+        if value is not None:
+            return value
+
+        cached_value, etag = self.get_stale(section, key)
+        headers = {'If-None-Match': etag} if etag and cached_value is not None else {}
+        resp = session.get(url, headers=headers)
+        if resp.status_code == 304:
+            self.touch(section, key)
+            return cached_value
+
+        resp.raise_for_status()
+        value = resp.json()
+        self.set(section, key, value, etag=resp.headers.get('ETag'))
+        return value
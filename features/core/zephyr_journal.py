@@ -0,0 +1,115 @@
+"""
+Журнал результатов сценариев для Zephyr и его отправка отдельной командой:
+
+    python -m features.core.zephyr_journal reports/zephyr_journal.jsonl [reports/worker_1/zephyr_journal.jsonl ...]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from features.core.settings import JIRA_USER, JIRA_PASSWORD, ZEPHYR_REPLAY_STATE_FILE
+from features.core.utils import log
+from features.core.zephyr import zephyr_cache
+from features.core.zephyr_lite import ZephyrSyncLite
+
+JOURNAL_FILE = 'zephyr_journal.jsonl'
+
+
+class ZephyrJournal:
+    """
+    Журнал результатов сценариев (JSON Lines, только дозапись).
+    Каждая запись содержит всё, что нужно для синхронизации теста и отправки результата в Zephyr:
+    метку, шаги, статусы сценария и шагов, текст ошибки, трейсбек и путь к скриншоту,
+    а также record_id - ключ идемпотентности для повторной отправки
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @staticmethod
+    def read(path):
+        records = []
+        with open(path, encoding='utf-8') as journal_file:
+            for number, line in enumerate(journal_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    log.warning(f'Пропущена повреждённая запись журнала {path}:{number}')
+        return records
+
+
+def load_synced_ids(path):
+    try:
+        with open(path) as state_file:
+            return set(json.load(state_file))
+    except (OSError, ValueError):
+        return set()
+
+
+def save_synced_ids(path, record_ids):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as state_file:
+        json.dump(sorted(record_ids), state_file)
+    os.replace(tmp_path, path)
+
+
+def replay(paths, state_path, auth):
+    """
+    Отправить в Zephyr результаты из журналов одним тестовым циклом.
+    Записи, уже отправленные ранее (record_id есть в файле состояния), пропускаются
+
+    :returns: ссылки на результаты выполнения сценариев
+    """
+
+    synced_ids = load_synced_ids(state_path)
+    records = {}
+    for path in paths:
+        for record in ZephyrJournal.read(path):
+            if record['record_id'] not in synced_ids:
+                records[record['record_id']] = record
+
+    if not records:
+        log.info('В журналах нет неотправленных результатов')
+        return {}
+
+    log.info(f'Отправка в Zephyr результатов из журналов: {len(records)}')
+    zephyr = ZephyrSyncLite(auth, {record['label'] for record in records.values()})
+    for record in records.values():
+        zephyr.add_record(record)
+
+    results = zephyr.synchronize()
+    zephyr_cache.save()
+    synced_ids.update(issue['record_id'] for issue in zephyr.issues if issue.get('synced'))
+    save_synced_ids(state_path, synced_ids)
+    log.info(f'Отправлено результатов: {sum(bool(issue.get("synced")) for issue in zephyr.issues)} '
+             f'из {len(records)}')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Отправка журналов результатов прогонов в Zephyr')
+    parser.add_argument('journals', nargs='+', help='файлы журналов zephyr_journal.jsonl')
+    parser.add_argument('--state', default=ZEPHYR_REPLAY_STATE_FILE,
+                        help='файл с ключами уже отправленных записей')
+    args = parser.parse_args(argv)
+
+    replay(args.journals, args.state, (JIRA_USER, JIRA_PASSWORD))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,34 @@
+import os
+import uuid
 import requests
 import itertools
-import concurrent.futures
 import traceback
+from types import SimpleNamespace
 from collections import OrderedDict
 from urllib.parse import urljoin
 
 from features.core.constants import (
     STATUSES,
     ZEPHYR_ADD_TEST,
+    ZEPHYR_BULK_STATUS,
     ZEPHYR_EXECUTION,
     ZEPHYR_STEP_RESULT,
     ZEPHYR_RESULTS_URL,
     ZEPHYR_ATTACHMENT
 )
-from features.core.settings import PROJECT_KEY, REMOTE_EXECUTOR, VIDEO, VIDEO_NAME, SELENOID_UI_URL
+from features.core.settings import (
+    PROJECT_KEY,
+    REMOTE_EXECUTOR,
+    VIDEO,
+    VIDEO_NAME,
+    SELENOID_UI_URL,
+    ZEPHYR_SEND_WORKERS,
+    ZEPHYR_SEND_ATTEMPTS,
+    ZEPHYR_JOB_TIMEOUT
+)
 from features.core.utils import log
-from features.core.zephyr import JiraProject, JiraIssue, TestStep, TestCycle, parse_tags
+from features.core.zephyr import JiraProject, JiraIssue, JiraIssueIndex, TestStep, TestCycle, parse_tags
+from features.core.zephyr_sender import ZephyrSender
 
 
 def parse_background_and_scenario(data: list):
@@ -63,89 +76,259 @@ class ZephyrSyncLite:
     step_count = 0
     step_ids = {}
     step_statuses = {}
+    project_id = None
     project_version_id = None
     project_version_name = None
     test_cycle_id = None
+    send_report = None
+
+    # Количество выполнений на странице выполнений тестового цикла и в одном массовом обновлении статусов
+    EXECUTIONS_PAGE_SIZE = 500
+
+    def __init__(self, auth, labels=(), journal=None, offline=False):
+        """
+        :param journal: ZephyrJournal, в который записываются результаты сценариев
+        :param offline: не обращаться к Jira во время прогона, только записывать результаты в журнал
+        """
 
-    def __init__(self, auth):
         self.session = requests.Session()
         self.session.auth = auth
+        self.journal = journal
+        self.offline = offline
+        if offline:
+            return
+
+        self.issue_index = JiraIssueIndex.load(self.session, labels)
         project = JiraProject(self)
         self.project_id = project.id_
         self.project_version_id, self.project_version_name = project.version
 
-    def _add_tests_to_cycle(self):
-        resp = self._send_to_zephyr([{
-            'req': self.session.post,
-            'url': ZEPHYR_ADD_TEST,
-            'json': dict(
+    def _add_tests_to_cycle(self, sender):
+        try:
+            resp = sender.request('POST', ZEPHYR_ADD_TEST, json=dict(
                 method='1',
                 cycleId=self.test_cycle_id,
                 issues=[issue['key'] for issue in self.issues],
                 projectId=self.project_id,
                 versionId=self.project_version_id
-            )
-        }])
+            ))
+
+        except requests.exceptions.RequestException as e:
+            log.error(f'Ошибка при добавлении тестов в тестовый цикл Zephyr [SL-A1]: {e}')
+            return
 
         job_token = resp.json()['jobProgressToken']
-        progress = 0.0
-        while progress < 1.0:
-            resp = self.session.get(f'{ZEPHYR_EXECUTION}jobProgress/{job_token}?type=add_tests_to_cycle_job_progress')
-            progress = resp.json()['progress']
-
-    def _create_execution(self, issue_id):
-        resp = self._send_to_zephyr([
-            {
-                'req': self.session.post,
-                'url': ZEPHYR_EXECUTION,
-                'json': dict(
-                    cycleId=self.test_cycle_id,
-                    issueId=issue_id,
-                    projectId=self.project_id,
-                    versionId=self.project_version_id
+        return sender.wait_job(
+            f'{ZEPHYR_EXECUTION}jobProgress/{job_token}?type=add_tests_to_cycle_job_progress', ZEPHYR_JOB_TIMEOUT
+        )
+
+    @staticmethod
+    def _wait_tests_added(job):
+        if job is None:
+            return
+
+        try:
+            if not job.result():
+                log.warning(f'Тесты не добавлены в тестовый цикл Zephyr за {ZEPHYR_JOB_TIMEOUT} сек, '
+                            f'результаты будут отправлены без ожидания')
+        except requests.exceptions.RequestException as e:
+            log.error(f'Ошибка при получении прогресса добавления тестов в тестовый цикл Zephyr [SL-A2]: {e}')
+
+    def _prepare_results(self, issue):
+        """ Подготовить данные результатов теста, которые не зависят от id выполнения """
+
+        cmt = f'Запись прохождения: {SELENOID_UI_URL}video/{VIDEO_NAME}\n' if REMOTE_EXECUTOR and VIDEO else ''
+        cmt += f"Время ошибки на видео: ~{issue['exception']['ts']}" if cmt and issue['status'] == 'failed' else ''
+        issue['comment'] = cmt
+
+        issue['step_results'] = []
+        for step_id, step_status in itertools.zip_longest(
+            issue['step_ids'] or [],
+            issue['step_statuses'],
+            fillvalue=STATUSES['untested']
+        ):
+            step_status = str(max(step_status))
+            comment = issue['exception']['msg'] if step_status == '2' else ''
+            issue['step_results'].append((step_id, step_status, comment))
+
+        issue['attachments'] = self._read_attachments(issue) if issue['status'] == 'failed' else None
+
+    def _prepare_execution(self, issue):
+        return dict(
+            method='POST',
+            url=ZEPHYR_EXECUTION,
+            json=dict(
+                cycleId=self.test_cycle_id,
+                issueId=issue['id'],
+                projectId=self.project_id,
+                versionId=self.project_version_id
+            )
+        )
+
+    @staticmethod
+    def _prepare_status(issue):
+        return dict(
+            method='PUT',
+            url=f"{urljoin(ZEPHYR_EXECUTION, str(issue['execution_id']))}/execute",
+            json=dict(
+                status=STATUSES.get(issue['status']),
+                comment=issue['comment']
+            )
+        )
+
+    @staticmethod
+    def _prepare_bulk_status(status, step_status, issues):
+        """ Массовое обновление статуса выполнений; статус шагов выставляется, если он у всех шагов одинаковый """
+
+        payload = dict(
+            executions=[str(issue['execution_id']) for issue in issues],
+            status=status,
+            testStepStatusChangeFlag=step_status is not None,
+            clearDefectMappingFlag=False
+        )
+        if step_status is not None:
+            payload['stepStatus'] = step_status
+        return dict(method='PUT', url=ZEPHYR_BULK_STATUS, json=payload)
+
+    @staticmethod
+    def _get_bulk_step_status(issue):
+        """ Общий статус шагов теста, если их результаты можно отправить массовым обновлением, иначе None """
+
+        if issue['comment'] or any(comment for _, _, comment in issue['step_results']):
+            return None
+
+        statuses = {status for _, status, _ in issue['step_results']}
+        return statuses.pop() if len(statuses) == 1 else None
+
+    @staticmethod
+    def _prepare_step_results(issue):
+        return [
+            dict(
+                method='POST',
+                url=ZEPHYR_STEP_RESULT,
+                json=dict(
+                    stepId=step_id,
+                    issueId=issue['id'],
+                    executionId=issue['execution_id'],
+                    status=step_status,
+                    comment=comment
                 )
-            }
-        ])
-        return next(iter(resp.json()))
+            )
+            for step_id, step_status, comment in issue['step_results']
+        ]
 
-    def _prepare_attachments(self, issue):
+    @staticmethod
+    def _prepare_attachments(issue):
+        return dict(
+            method='POST',
+            url=ZEPHYR_ATTACHMENT,
+            params={'entityType': 'SCHEDULE', 'entityId': str(issue['execution_id'])},
+            files=issue['attachments']
+        )
+
+    @staticmethod
+    def _read_attachments(issue):
         files = []
         try:
-            if path := issue['screenshot_path']:
-                files.append(('file', ('screenshot.png', open(path, 'rb'), 'multipart/form-data')))
+            if (path := issue['screenshot_path']) and os.path.exists(path):
+                with open(path, 'rb') as screenshot:
+                    files.append(('file', ('screenshot.png', screenshot.read(), 'multipart/form-data')))
 
             files.append(('file', (
                 'traceback.txt',
-                ''.join(traceback.format_tb(issue['exception']['tb'])).encode(),
+                issue['exception']['traceback'].encode(),
                 'multipart/form-data')
             ))
-
-            return dict(
-                req=self.session.post,
-                url=ZEPHYR_ATTACHMENT,
-                params={'entityType': 'SCHEDULE', 'entityId': str(self.last_execution_id)},
-                files=files
-            )
+            return files
 
         except Exception as e:
             log.error(f'Произошла ошибка при записи лога в файл. {e}')
 
-    @staticmethod
-    def _send_to_zephyr(data: list):
-        def send(req, url, **kwargs):
-            resp = req(url, **kwargs)
-            resp.raise_for_status()
-            return resp
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
-            for future in concurrent.futures.as_completed(
-                (executor.submit(send, **values_dict) for values_dict in data),
-                timeout=2
-            ):
-                try:
-                    return future.result()
-                except Exception as e:
-                    log.error(f'Ошибка при отправке результатов в Zephyr [SL-S1]: {e}')
+    def _load_cycle_executions(self, sender):
+        """ Выполнения, созданные Zephyr при добавлении тестов в цикл: id теста -> список id выполнений """
+
+        executions = {}
+        params = dict(
+            cycleId=self.test_cycle_id,
+            projectId=self.project_id,
+            versionId=self.project_version_id,
+            offset=0,
+            maxRecords=self.EXECUTIONS_PAGE_SIZE
+        )
+
+        try:
+            while True:
+                data = sender.request('GET', ZEPHYR_EXECUTION, params=params).json()
+                page = data.get('executions', [])
+                for execution in page:
+                    executions.setdefault(str(execution['issueId']), []).append(execution['id'])
+
+                params['offset'] += len(page)
+                if not page or params['offset'] >= data.get('recordsCount', 0):
+                    break
+
+        except requests.exceptions.RequestException as e:
+            log.warning(f'Не удалось получить выполнения тестового цикла, они будут созданы по одному [SL-E1]: {e}')
+        return executions
+
+    def _send_results(self, sender):
+        """
+        Отправить результаты по фазам: выполнения -> статусы -> результаты шагов -> вложения.
+
+        Выполнения, созданные Zephyr при добавлении тестов в цикл, получаются постранично; создаются по одному
+        только недостающие. Статусы без комментария отправляются массовыми обновлениями, сгруппированными
+        по статусу выполнения и шагов; результаты шагов отправляются по одному только для тестов,
+        у которых шаги завершились с разными статусами или с комментарием.
+        Для тестов, выполнение которых не удалось получить или создать, остальные запросы не отправляются
+        """
+
+        cycle_executions = self._load_cycle_executions(sender)
+        missing = []
+        for issue in self.issues:
+            execution_ids = cycle_executions.get(str(issue['id']))
+            issue['execution_id'] = execution_ids.pop(0) if execution_ids else None
+            if issue['execution_id'] is None:
+                missing.append(issue)
+
+        executions = sender.send('выполнения', [self._prepare_execution(issue) for issue in missing])
+        for issue, resp in zip(missing, executions):
+            if resp is None:
+                sender.skip('статусы')
+                sender.skip('результаты шагов', len(issue['step_results']))
+                sender.skip('вложения', int(bool(issue['attachments'])))
+                continue
+
+            issue['execution_id'] = next(iter(resp.json()))
+
+        issues = [issue for issue in self.issues if issue['execution_id'] is not None]
+        single, groups = [], OrderedDict()
+        for issue in issues:
+            self.last_execution_id = issue['execution_id']
+            self.zephyr_run_results[issue['scenario_name']] = f"{ZEPHYR_RESULTS_URL}{issue['execution_id']}"
+            issue['bulk_step_status'] = self._get_bulk_step_status(issue)
+            if issue['comment']:
+                single.append(issue)
+            else:
+                groups.setdefault((STATUSES.get(issue['status']), issue['bulk_step_status']), []).append(issue)
+
+        statuses = sender.send('статусы', [self._prepare_status(issue) for issue in single])
+        for issue, resp in zip(single, statuses):
+            issue['synced'] = resp is not None
+
+        chunks = [
+            (key, group[start:start + self.EXECUTIONS_PAGE_SIZE])
+            for key, group in groups.items()
+            for start in range(0, len(group), self.EXECUTIONS_PAGE_SIZE)
+        ]
+        statuses = sender.send('статусы', [self._prepare_bulk_status(*key, chunk) for key, chunk in chunks])
+        for (_, chunk), resp in zip(chunks, statuses):
+            for issue in chunk:
+                issue['synced'] = resp is not None
+
+        sender.send('результаты шагов', [
+            data for issue in issues if issue['bulk_step_status'] is None for data in self._prepare_step_results(issue)
+        ])
+        sender.send('вложения', [self._prepare_attachments(issue) for issue in issues if issue['attachments']])
 
     def scenario_parser(self, scenario, feature, tags, scenario_seed):
         self.scenario = scenario
@@ -161,31 +344,64 @@ class ZephyrSyncLite:
         if not self.zephyr_label:
             return
 
+        if scenario.exception is not None:
+            msg = str(scenario.exception)
+            scenario.exception = msg[:100] + (msg[100:] and '...')
+
+        record = dict(
+            record_id=uuid.uuid4().hex,
+            label=self.zephyr_label,
+            story_key=self.story_key,
+            scenario_name=scenario.name,
+            background_steps=self.background_steps,
+            bdd_steps=self.bdd_steps,
+            bdd_results=self.bdd_results,
+            status=scenario.status.name,
+            step_statuses=list(self.step_statuses.get(scenario.name, {}).values()),
+            screenshot_path=screenshot_path,
+            exception=dict(
+                msg=scenario.exception,
+                traceback=''.join(traceback.format_tb(scenario.exc_traceback)),
+                ts=str(duration) if duration is not None else None
+            )
+        )
+
+        if self.journal:
+            self.journal.write(record)
+        if not self.offline:
+            self.add_record(record)
+
+    def add_record(self, record):
+        """
+        Синхронизировать тест Jira по результату сценария (записи журнала) и добавить результат к отправке
+
+        :returns: True, если тест найден или создан в Jira
+        """
+
+        self.scenario = SimpleNamespace(name=record['scenario_name'])
+        self.zephyr_label, self.story_key = record['label'], record['story_key']
+        self.background_steps = record['background_steps']
+        self.bdd_steps, self.bdd_results = list(record['bdd_steps']), list(record['bdd_results'])
+
         issue = JiraIssue(self)
         if not issue.issue:
             self.sync = True
-            return
+            return False
 
         self.issue_id = issue.id_
         self.issue_key = issue.key
 
-        if scenario.exception is not None:
-            msg = str(scenario.exception)
-            scenario.exception = msg[:100] + (msg[100:] and '...')
+        issue.sync(self)
+        issue.link(self)
 
+        self.step_ids[record['scenario_name']] = TestStep.ids(self)
         self.issues.append(dict(
+            record,
             id=issue.id_,
             key=issue.key,
-            scenario_name=scenario.name,
-            status=scenario.status.name,
-            screenshot_path=screenshot_path,
-            exception=dict(msg=scenario.exception, tb=scenario.exc_traceback, ts=duration)
+            step_ids=self.step_ids[record['scenario_name']]
         ))
-
-        issue.sync(self)
-        issue.link(self)
-
-        self.step_ids[scenario.name] = TestStep.ids(self)
+        return True
 
     def every_step(self, step, scenario):
         if self.step_statuses.get(scenario.name) is None:
@@ -206,6 +422,10 @@ class ZephyrSyncLite:
             scenario.exception, scenario.exc_traceback = step.exception, step.exc_traceback
 
     def synchronize(self):
+        if self.journal:
+            self.journal.close()
+            log.info(f'Результаты сценариев записаны в журнал {self.journal.path}')
+
         if not self.issues:
             return {}
 
@@ -213,48 +433,20 @@ class ZephyrSyncLite:
         if self.test_cycle_id is None:
             return {}
 
-        self._add_tests_to_cycle()
-
-        data = []
-
-        for issue in self.issues:
-            issue['execution_id'] = self.last_execution_id = self._create_execution(issue['id'])
-            cmt = f'Запись прохождения: {SELENOID_UI_URL}video/{VIDEO_NAME}\n' if REMOTE_EXECUTOR and VIDEO else ''
-            cmt += f"Время ошибки на видео: ~{issue['exception']['ts']}" if cmt and issue['status'] == 'failed' else ''
-
-            data.append({
-                'req': self.session.put,
-                'url': f'{urljoin(ZEPHYR_EXECUTION, str(self.last_execution_id))}/execute',
-                'json': dict(
-                    status=STATUSES.get(issue['status']),
-                    comment=cmt
-                )
-            })
-
-            if issue['status'] == 'failed':
-                data.append(self._prepare_attachments(issue))
-
-            for step_id, step_status in itertools.zip_longest(
-                self.step_ids[issue['scenario_name']],
-                self.step_statuses[issue['scenario_name']].values(),
-                fillvalue=STATUSES['untested']
-            ):
-                step_status = str(max(step_status))
-                data.append({
-                    'req': self.session.post,
-                    'url': ZEPHYR_STEP_RESULT,
-                    'json': dict(
-                        stepId=step_id,
-                        issueId=issue['id'],
-                        executionId=issue['execution_id'],
-                        status=step_status,
-                        comment=issue['exception']['msg'] if step_status == '2' else ''
-                        )
-                })
-
-            self.zephyr_run_results[issue['scenario_name']] = f"{ZEPHYR_RESULTS_URL}{issue['execution_id']}"
-
-        self._send_to_zephyr(data)
+        sender = ZephyrSender(self.session.auth, ZEPHYR_SEND_WORKERS, ZEPHYR_SEND_ATTEMPTS)
+        try:
+            # Пока Jira добавляет тесты в цикл, готовятся данные результатов
+            job = self._add_tests_to_cycle(sender)
+            for issue in self.issues:
+                self._prepare_results(issue)
+            self._wait_tests_added(job)
+            self._send_results(sender)
+        finally:
+            sender.close()
+
+        self.send_report = sender.report
+        log.info('Отправка результатов в Zephyr:')
+        sender.log_report()
 
         log.info(f'Результаты выполнения сценариев:')
         for scenario_name, zephyr_result_link in self.zephyr_run_results.items():
@@ -0,0 +1,129 @@
+"""Отправка результатов прогона в Zephyr пакетами с ограниченной параллельностью и повторами"""
+
+import time
+import requests
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential
+
+from features.core.api import return_response
+from features.core.utils import log
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REQUEST_TIMEOUT = 60
+# Максимальная пауза между повторами запроса, сек
+MAX_RETRY_WAIT = 30
+# Первая и максимальная пауза между опросами прогресса асинхронной задачи Jira, сек
+JOB_POLL_DELAY = 0.2
+JOB_POLL_MAX_DELAY = 5
+
+get_backoff = wait_exponential(multiplier=0.5, max=MAX_RETRY_WAIT)
+
+
+def is_retryable_response(response) -> bool:
+    return response.status_code in RETRY_STATUSES
+
+
+def get_retry_wait(retry_state):
+    """ Пауза перед повтором: Retry-After из ответа сервера, если он указан, иначе экспоненциальная """
+
+    if not retry_state.outcome.failed:
+        retry_after = retry_state.outcome.result().headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), MAX_RETRY_WAIT)
+    return get_backoff(retry_state)
+
+
+class ZephyrSender:
+    """
+    Отправка запросов в Zephyr по фазам.
+
+    Запросы одной фазы выполняются параллельно в общем пуле потоков (не больше workers одновременно,
+    соединения с Jira переиспользуются), следующая фаза начинается только после завершения текущей.
+    Запросы с ответом 429/5xx и ошибками соединения повторяются с экспоненциальной паузой.
+    По каждой фазе считается количество отправленных, неудачных и пропущенных запросов
+    """
+
+    def __init__(self, auth, workers, attempts):
+        self.attempts = attempts
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zephyr-sender')
+        self.report = OrderedDict()
+
+    def request(self, method, url, **kwargs):
+        """ Выполнить запрос с повторами; ошибка последней попытки пробрасывается """
+
+        retry = Retrying(
+            retry=retry_if_result(is_retryable_response) | retry_if_exception_type(
+                (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+            ),
+            stop=stop_after_attempt(self.attempts),
+            wait=get_retry_wait,
+            retry_error_callback=return_response
+        )
+        response = retry(self.session.request, method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def send(self, phase, requests_data):
+        """
+        Выполнить запросы фазы и дождаться их завершения
+
+        :param requests_data: список словарей с параметрами request (method, url, json, files, ...)
+        :returns: ответы в порядке запросов, None - для неудачных
+        """
+
+        stats = self.report.setdefault(phase, Counter(sent=0, failed=0, skipped=0))
+        futures = [self._executor.submit(self.request, **data) for data in requests_data]
+
+        responses = []
+        for data, future in zip(requests_data, futures):
+            try:
+                responses.append(future.result())
+                stats['sent'] += 1
+            except Exception as e:
+                responses.append(None)
+                stats['failed'] += 1
+                log.error(f'Ошибка при отправке результатов в Zephyr [SL-S1]: {data["method"]} {data["url"]} {e}')
+        return responses
+
+    def wait_job(self, url, timeout):
+        """
+        Ожидать завершения асинхронной задачи Jira (jobProgress) в фоне, не блокируя подготовку следующих фаз
+
+        :returns: Future с признаком завершения задачи до истечения timeout
+        """
+
+        return self._executor.submit(self._poll_job, url, timeout)
+
+    def _poll_job(self, url, timeout):
+        deadline = time.monotonic() + timeout
+        delay = JOB_POLL_DELAY
+        while True:
+            if self.request('GET', url).json().get('progress', 0) >= 1.0:
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, JOB_POLL_MAX_DELAY)
+
+    def skip(self, phase, count=1):
+        """ Учесть запросы, которые не отправлялись из-за ошибки в предыдущей фазе """
+
+        self.report.setdefault(phase, Counter(sent=0, failed=0, skipped=0))['skipped'] += count
+
+    def log_report(self):
+        for phase, stats in self.report.items():
+            log.info(f'\t{phase}: отправлено {stats["sent"]}, ошибок {stats["failed"]}, пропущено {stats["skipped"]}')
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
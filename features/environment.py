@@ -1,4 +1,5 @@
 import base64
+import json
 import os
 import sys
 import tempfile
@@ -11,6 +12,7 @@ from behave.reporter.summary import SummaryReporter
 from requests import RequestException
 
 from features.core.backend import ZappBackend, ZappBackendSessionException
+from features.core.logger import logger
 from features.core.logger.reporter import ZappReporter
 from version import ZAPP_VERSION
 from features.core.settings import (
@@ -18,6 +20,8 @@ from features.core.settings import (
     REMOTE_EXECUTOR,
     ZEPHYR_USE,
     ZEPHYR_LITE,
+    ZEPHYR_JOURNAL,
+    ZEPHYR_OFFLINE,
     BROWSER,
     LOCAL_SCREENSHOTS,
     SMARTWAIT_DELAY,
@@ -36,7 +40,21 @@ from features.core.settings import (
     BACKEND_LOCAL_SESSION_REGISTER,
     TG_NOTIFICATION_MODE,
     RETRY_AFTER_FAIL,
-    MAX_ATTEMPTS
+    MAX_ATTEMPTS,
+    WORKER_ID,
+    REPORTS_DIR,
+    DURATIONS_FILE,
+    BROWSER_POOL_SIZE,
+    BROWSER_POOL_MAX_USES,
+    WEBDRIVER_PROFILE,
+    TRACE,
+    RAW_LOG_SEGMENT_SIZE,
+    RAW_LOG_SEGMENTS,
+    RAW_LOG_DIR,
+    RAW_LOG_STREAM,
+    PROFILE,
+    PROFILE_MEMORY,
+    PROFILE_DIR
 )
 
 from features.core.constants import UPDATE_STEPS_MESSAGE, BACKEND_RUN_TYPES, NON_REGISTRABLE_RUN_TYPES
@@ -56,11 +74,28 @@ from features.core.utils import (
     send_by_mode
 )
 
-from features.core.zephyr import ZephyrSync
+from features.core.zephyr import ZephyrSync, collect_zephyr_labels, zephyr_cache
 from features.core.zephyr_lite import ZephyrSyncLite
-from features.core.metrics import Metrics
+from features.core.zephyr_journal import JOURNAL_FILE, ZephyrJournal
+from features.core.metrics import Metrics, close_influx_writer, write_scenario_point, write_step_point
+from features.core.parallel import (
+    WORKER_METRICS_FILE,
+    WORKER_DURATIONS_FILE,
+    WORKER_SESSION_FILE,
+    DurationStore,
+    get_duration_key
+)
 from features.core.js_scripts import FREEZE_ANIMATIONS
-from features.core.screenshots import RunInfo
+from features.core.webdriver_profile import PROFILE_FILE, WebDriverProfiler
+from features.core.tracing import TRACE_FILE, tracer
+from features.core.profiling import ScenarioProfiler
+from features.core.screenshots import (
+    RunInfo,
+    close_remote_image_store,
+    hash_index,
+    log_ref_cache_stats,
+    shutdown_comparison_pool,
+)
 from features.core.mobiles import (
     Mobile,
     MOBILES,
@@ -68,7 +103,7 @@ from features.core.mobiles import (
     get_android_app_version,
     local_save_android_logs
 )
-from features.core.browsers import BROWSERS, SELENOID_UI_BROWSERS
+from features.core.browsers import BROWSERS, SELENOID_UI_BROWSERS, BrowserPool
 from features.core.browser_errors import print_page_errors
 
 metrics_all_tests_count = 0
@@ -76,6 +111,11 @@ metrics_failed_tests_count = 0
 
 
 def before_all(context):
+    if TRACE:
+        tracer.enable()
+    tracer.begin('run', 'run')
+    context.profiler = ScenarioProfiler(PROFILE_DIR, memory=PROFILE_MEMORY) if PROFILE else None
+
     context.backend = ZappBackend()
     context.config.reporters.append(ZappReporter(context.config, context.backend))
 
@@ -95,9 +135,18 @@ def before_all(context):
             log.warning('Не удалось зарегистрировать сессию в zapp-backend')
             log.debug(ex, exc_info=ex)
 
+    logger.configure(
+        directory=RAW_LOG_DIR or None,
+        segment_size=RAW_LOG_SEGMENT_SIZE,
+        segments=RAW_LOG_SEGMENTS,
+        upload=context.backend.upload_log_segment if RAW_LOG_STREAM and context.backend.session_running else None,
+        name=f'raw_log_worker_{WORKER_ID}' if WORKER_ID else 'raw_log'
+    )
+
     context.metrics_start_date = datetime.now()
     context.metrics_deprecated_steps = {}
     context.metrics_exceptions = []
+    context.scenario_durations = {}
 
     context.seed = Seed()
     context.seed.run = variables['run_seed'] = context.seed.generate_run_seed()
@@ -106,13 +155,17 @@ def before_all(context):
     try:
         auth = (variables.pop('JIRA_USER'), variables.pop('JIRA_PASSWORD'))
         context.sync = ZEPHYR_USE
-        context.sync_lite = ZEPHYR_USE and ZEPHYR_LITE
+        context.sync_lite = ZEPHYR_USE and (ZEPHYR_LITE or ZEPHYR_OFFLINE)
+        zephyr_labels = collect_zephyr_labels(context._runner.features, context.config.tags) if context.sync else []
 
         if context.sync_lite is True:
-            context.zephyr = ZephyrSyncLite(auth)
+            journal = None
+            if ZEPHYR_JOURNAL or ZEPHYR_OFFLINE:
+                journal = ZephyrJournal(os.path.join(REPORTS_DIR, JOURNAL_FILE))
+            context.zephyr = ZephyrSyncLite(auth, zephyr_labels, journal=journal, offline=ZEPHYR_OFFLINE)
 
         elif context.sync is True:
-            ZephyrSync.before_all(context, auth)
+            ZephyrSync.before_all(context, auth, zephyr_labels)
 
     except KeyError:
         context.sync = context.sync_lite = False
@@ -134,6 +187,7 @@ def before_all(context):
     context.tempdir = tempfile.mkdtemp()
 
     context.is_webview = False
+    context.browser_pool = None
 
     if BROWSER.lower() in MOBILES:
         context.browser_ = Mobile()
@@ -141,10 +195,19 @@ def before_all(context):
 
     else:
         browser = BROWSERS.get(BROWSER.lower()) or BROWSERS.get('chrome')
-        context.browser_ = browser.remote(context.tempdir) if REMOTE_EXECUTOR else browser.local(context.tempdir)
+        browser_cls = browser.remote if REMOTE_EXECUTOR else browser.local
+
+        if BROWSER_POOL_SIZE > 0:
+            context.browser_pool = BrowserPool(browser_cls, context.tempdir, BROWSER_POOL_SIZE, BROWSER_POOL_MAX_USES)
+            context.browser_ = context.browser_pool.acquire()
+        else:
+            context.browser_ = browser_cls(context.tempdir)
         context.is_mobile = False
 
     context.browser = context.browser_.get_driver()
+    context.webdriver_profiler = WebDriverProfiler() if WEBDRIVER_PROFILE else None
+    if context.webdriver_profiler:
+        context.webdriver_profiler.attach(context.browser)
 
     if context.is_mobile is True:
         context.mobile_avoids = MobileAvoids(context)
@@ -180,14 +243,28 @@ def before_all(context):
 
 
 def before_feature(context, feature):
+    tracer.begin(feature.name, 'feature', filename=feature.filename)
     if RETRY_AFTER_FAIL is True:
         for scenario in feature.scenarios:
             if scenario.effective_tags:
                 patch_scenario_with_autoretry(scenario, max_attempts=MAX_ATTEMPTS)
 
 
+def after_feature(context, feature):
+    tracer.end(feature.name, 'feature')
+
+
 def before_scenario(context, scenario):
+    tracer.begin(scenario.name, 'scenario')
+    if context.profiler:
+        context.profiler.start()
     log.info(f'Выполнение сценария "{scenario.name}" начато: {datetime.now()}')
+    if context.browser_pool:
+        context.browser_ = context.browser_pool.acquire()
+        context.browser = context.browser_.get_driver()
+        if context.webdriver_profiler:
+            context.webdriver_profiler.attach(context.browser)
+
     global metrics_all_tests_count
     metrics_all_tests_count += 1
 
@@ -208,7 +285,10 @@ def before_scenario(context, scenario):
 
 
 def before_step(context, step):
+    tracer.begin(f'{step.keyword} {step.name}', 'step', location=f'{step.filename}:{step.line}')
     context.current_step = dict(name=step.name, filename=step.filename, line=step.line)
+    if context.webdriver_profiler:
+        context.webdriver_profiler.start_step(context.current_step)
     if context.sync is True and context.sync_lite is False:
         ZephyrSync.before_step(context, step)
 
@@ -217,11 +297,16 @@ def before_step(context, step):
 
 
 def after_step(context, step):
+    if context.webdriver_profiler:
+        context.webdriver_profiler.end_step(step.duration)
+
     if context.sync_lite is True:
         context.zephyr.every_step(step, context.scenario)
     elif context.sync is True:
         ZephyrSync.after_step(context, step)
 
+    write_step_point(context.scenario, step, context.seed.run)
+
     if step.exception:
         exception_type = type(step.exception).__name__
         log.debug(f'EXCEPTION_TYPE: {exception_type}')
@@ -230,6 +315,8 @@ def after_step(context, step):
         if REMOTE_EXECUTOR and VIDEO:
             log.warning(f'Примерное время ошибки на видео: {timedelta(seconds=round(context.feature.duration))}')
 
+    tracer.end(f'{step.keyword} {step.name}', 'step')
+
 
 def after_scenario(context, scenario):
     log.info(f'Выполнение сценария "{scenario.name}" закончено: {datetime.now()}')
@@ -244,18 +331,34 @@ def after_scenario(context, scenario):
     if MOBILE_LOGGING is True:
         local_save_android_logs(context, scenario)
 
-    if context.run_info:
-        context.run_info.print_results()
+    # В режиме SCREENSHOT_MODE print_results падает при найденных различиях: сессия браузера
+    # всё равно должна вернуться в пул, а замеры сценария - завершиться
+    try:
+        if context.run_info:
+            context.run_info.print_results()
+    finally:
+        write_scenario_point(scenario, context.seed.run)
+
+        # В историю попадают только успешные сценарии: упавшие обычно завершаются раньше и искажают оценку
+        if scenario.status.name == 'passed':
+            context.scenario_durations[get_duration_key(scenario.filename, scenario.name)] = round(scenario.duration, 3)
 
-    if scenario.status.name == 'failed':
-        global metrics_failed_tests_count
-        metrics_failed_tests_count += 1
+        if scenario.status.name == 'failed':
+            global metrics_failed_tests_count
+            metrics_failed_tests_count += 1
 
-        if BROWSER_LOGGING and context.is_mobile is False:
-            print_page_errors(context)
+            if BROWSER_LOGGING and context.is_mobile is False:
+                print_page_errors(context)
 
-        if LOCAL_SCREENSHOTS and context.sync_lite is False:
-            save_screenshot(context)
+            if LOCAL_SCREENSHOTS and context.sync_lite is False:
+                save_screenshot(context)
+
+        if context.browser_pool:
+            context.browser_pool.release()
+
+        if context.profiler:
+            context.profiler.stop(scenario.name)
+        tracer.end(scenario.name, 'scenario')
 
 
 def after_all(context):
@@ -279,7 +382,7 @@ def after_all(context):
             except Exception as ex:
                 log.error("Не удалось сохранить запись видео", exc_info=ex)
 
-    if RUN_TYPE in BACKEND_RUN_TYPES:
+    if RUN_TYPE in BACKEND_RUN_TYPES and not WORKER_ID:
         send_by_mode(context, TG_NOTIFICATION_MODE)
 
     if context.sync_lite is True:
@@ -288,16 +391,18 @@ def after_all(context):
         zephyr_sync_results = ZephyrSync.after_all(context)
     else:
         zephyr_sync_results = {}
+    zephyr_cache.save()
 
+    export_variables = {k: v for k, v in variables.items() if k not in {**vault_variables, **os.environ}}
+    summary_reporter = get_reporter(context, SummaryReporter)
     if context.backend.session_running:
         export_data = dict(
             video_url=video_url,
             zephyr_sync_results=zephyr_sync_results,
-            export_variables={k: v for k, v in variables.items() if k not in {**vault_variables, **os.environ}},
+            export_variables=export_variables,
         )
 
         tests_passed = False
-        summary_reporter = get_reporter(context, SummaryReporter)
         if summary_reporter:
             tests_passed = summary_reporter.scenario_summary['passed'] > 0 \
                            and summary_reporter.scenario_summary['failed'] == 0
@@ -316,7 +421,7 @@ def after_all(context):
         log.warning(UPDATE_STEPS_MESSAGE)
 
     log_deprecated_steps(context.metrics_deprecated_steps)
-    Metrics(
+    metrics = Metrics(
         all_tests_count=metrics_all_tests_count,
         failed_tests_count=metrics_failed_tests_count,
         start_date=context.metrics_start_date,
@@ -325,5 +430,49 @@ def after_all(context):
         browser_name=context.browser_.name,
         browser_version=context.browser_.version,
         run_seed=context.seed.run
-    ).send()
-    context.browser.quit()
+    )
+    if WORKER_ID:
+        # Метрики и длительности воркеров объединяются основным процессом
+        metrics.dump(os.path.join(REPORTS_DIR, WORKER_METRICS_FILE))
+        with open(os.path.join(REPORTS_DIR, WORKER_DURATIONS_FILE), 'w') as output:
+            json.dump(context.scenario_durations, output, ensure_ascii=False)
+        # Сессию zapp-backend завершает и уведомления отправляет основной процесс
+        scenario_summary = summary_reporter.scenario_summary if summary_reporter else {}
+        with open(os.path.join(REPORTS_DIR, WORKER_SESSION_FILE), 'w') as output:
+            json.dump(dict(
+                platform=context.browser_.name,
+                video_url=video_url,
+                zephyr_sync_results=zephyr_sync_results,
+                export_variables=export_variables,
+                scenario_summary={status: scenario_summary.get(status, 0) for status in ('passed', 'failed')}
+            ), output, ensure_ascii=False, default=str)
+    else:
+        metrics.send()
+        duration_store = DurationStore(DURATIONS_FILE)
+        duration_store.update(context.scenario_durations)
+        duration_store.save()
+    close_influx_writer()
+
+    if context.webdriver_profiler:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        report = context.webdriver_profiler.save(os.path.join(REPORTS_DIR, PROFILE_FILE))
+        context.webdriver_profiler.log_summary(report)
+
+    if context.browser_pool:
+        context.browser_pool.close()
+    else:
+        context.browser.quit()
+
+    shutdown_comparison_pool()
+    hash_index.save()
+    log_ref_cache_stats()
+    close_remote_image_store()
+
+    if context.profiler:
+        context.profiler.finish()
+
+    tracer.end('run', 'run')
+    if tracer.enabled:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        trace_path = os.path.join(REPORTS_DIR, TRACE_FILE)
+        log.info(f'Временная шкала прогона ({tracer.save(trace_path)} событий) сохранена в {trace_path}')
@@ -66,7 +66,12 @@ from features.core.constants import (
     EM_API_REQUEST_NOT_FOUND,
     EM_INVALID_URL,
 )
-from features.core.screenshots import compare_element_screenshots, get_screenshot_name
+from features.core.screenshots import (
+    compare_element_screenshots,
+    compare_elements_screenshots,
+    get_screenshot_name,
+    log_comparison_result,
+)
 from features.core.settings import SCREENSHOT_MODE, SMARTWAIT_DELAY as DEFAULT_DELAY, REMOTE_EXECUTOR, RETRY_DELAY
 from features.core.smart_wait import SmartWait, LOCATORS
 from features.core.api import Api
@@ -970,15 +975,9 @@ def assert_invisible_in_scope_with_text(context, target, text):
         .my-options с тегом button). Рекомендуется использовать шаг только для прототипирования тестов
         или если невозможно создать css-локатор.
     """
-    try:
-        found = WebDriverWait(context.browser, 2).until(lambda webdriver: get_element_text(
-            context, SmartWait(context).wait_for_elements(
-                target=target, expected=EC.presence_of_all_elements_located), text))
-    except TimeoutException:
-        log.debug(IM_ELEMENT_NOT_VISIBLE.format(f'с текстом "{text}"', target))
-    else:
-        SmartWait(context).wait_for_element(expected=EC.visibility_of(found), wait_method='until_not')
-        assert_that(found.is_displayed(), equal_to(False))
+    invisible = SmartWait(context).wait_for_absence(target=target, text=text)
+    assert_that(invisible, equal_to(True), f'Среди элементов "{target}" отображается элемент с текстом "{text}"')
+    log.debug(IM_ELEMENT_NOT_VISIBLE.format(f'с текстом "{text}"', target))
 
 
 @then('Я убедился что "{target}" отображается')
@@ -1638,12 +1637,7 @@ def compare_screenshots(context, target, **kwargs):
 
         При этом скриншоты сохранятся в двух разных папках: "Кнопка логина" и "Кнопка логина - hover".
     """
-    if not SCREENSHOT_MODE:
-        log.error(
-            'Для корректной работы шага по сравнению отображения элемента нужно запускать ZAPP'
-            ' с параметром SCREENSHOT_MODE=True'
-        )
-        sys.exit(1)
+    check_screenshot_mode()
     element = SmartWait(context).wait_for_element(target=target)
     # Проматываем элемент до середины экрана
     context.browser.execute_script(OUTLINE, element)
@@ -1651,11 +1645,54 @@ def compare_screenshots(context, target, **kwargs):
     element_name = target if not state else f'{target} - {state}'
     screenshot_name = get_screenshot_name(element_name, context)
     diff_pixels_count = compare_element_screenshots(context, element, screenshot_name)
-    if diff_pixels_count == -1:
-        log.info(f'Скриншот элемента "{element_name}" сохранён в качестве эталона')
-    elif diff_pixels_count > 0:
-        diff_count_string = get_units_case(diff_pixels_count, ('пиксель', 'пикселя', 'пикселей'))
-        log.error(f'Скриншот элемента "{element_name}" отличается на {diff_pixels_count} {diff_count_string}')
+    if diff_pixels_count is None:
+        log.debug(f'Скриншот элемента "{element_name}" поставлен в очередь на сравнение')
+    else:
+        log_comparison_result(element_name, diff_pixels_count)
+
+
+@then('Я убедился что отображение элементов "{targets}" не изменилось')
+@then('Я убедился что отображение элементов "{targets}" в состоянии "{state}" не изменилось')
+@retry(retry_on_exception=escaping_exceptions, stop_max_delay=RETRY_DELAY)
+@not_available_on_platform(platforms=('android', 'ios'), fail=True)
+@doc(Section.SCREENSHOT)
+def compare_screenshots_list(context, targets, **kwargs):
+    """
+        Сравнить скриншоты нескольких элементов с эталонными за один снимок страницы, разделитель - символ ";".
+        Элемент проматывается до середины экрана, координаты элементов получаются одним запросом к браузеру,
+        а изображения всех элементов, попавших в видимую область целиком, вырезаются из одного скриншота.
+        Для оставшихся элементов это повторяется. Эталоны те же, что и у шага сравнения отдельного элемента:
+        дробные границы элементов расширяются до целых пикселей так же, как в скриншоте отдельного элемента.
+
+        Пример:
+        Then Я убедился что отображение элементов "Логотип ZAPP;Логин;Чекбокс" не изменилось
+    """
+    check_screenshot_mode()
+    state = kwargs.get('state')
+    window_size = context.browser.get_window_size()
+
+    elements_by_name = []
+    element_names = []
+    for target in targets.split(';'):
+        element = SmartWait(context).wait_for_element(target=target)
+        element_name = target if not state else f'{target} - {state}'
+        element_names.append(element_name)
+        elements_by_name.append((get_screenshot_name(element_name, context, window_size), element))
+
+    for element_name, diff_pixels_count in zip(element_names, compare_elements_screenshots(context, elements_by_name)):
+        if diff_pixels_count is None:
+            log.debug(f'Скриншот элемента "{element_name}" поставлен в очередь на сравнение')
+        else:
+            log_comparison_result(element_name, diff_pixels_count)
+
+
+def check_screenshot_mode():
+    if not SCREENSHOT_MODE:
+        log.error(
+            'Для корректной работы шагов по сравнению отображения элементов нужно запускать ZAPP'
+            ' с параметром SCREENSHOT_MODE=True'
+        )
+        sys.exit(1)
 
 
 @then('Я отвел курсор и убедился что отображение элемента "{target}" не изменилось')
@@ -2,10 +2,12 @@ import os
 import sys
 import argparse
 import json
+from datetime import datetime
 
 from behave.__main__ import main as behave_main
 
 from features.core.logger import logger
+from features.core import parallel
 
 is_windows = sys.platform.startswith('win')
 zapp_path = os.path.dirname(os.path.abspath(__file__))
@@ -35,6 +37,7 @@ def get_cli_args():
     parser.add_argument('--verbose', action='store_true', help=' behave verbose mode')
     parser.add_argument('--junit', action='store_true', default=argparse.SUPPRESS, help=' behave junit mode')
     parser.add_argument('--tags', type=str, action='append', help=' feature tags envolved')
+    parser.add_argument('--workers', type=int, default=argparse.SUPPRESS, help=' number of parallel behave workers')
     first_args, unknown = parser.parse_known_args()
     # Добавляем все кастомные аргументы в парсер
     new_args = {}
@@ -101,7 +104,7 @@ def get_custom_env(params):
     custom_env = {}
     for arg in params:
         # Игнорируем параметры, которые мы обрабатываем по-другому
-        if arg not in ('tags', 'feature', 'config', 'verbose', 'junit'):
+        if arg not in ('tags', 'feature', 'config', 'verbose', 'junit', 'workers'):
             custom_env[arg] = params[arg]
     return custom_env
 
@@ -143,6 +146,151 @@ def print_params(run_params, params):
         print(f'{CBLUE}{param}:{CEND} {value}')
 
 
+def get_workers_count(params):
+    ''' Получить количество параллельных воркеров (1 - обычный запуск в одном процессе) '''
+
+    try:
+        return max(int(params.get('workers', 1)), 1)
+    except (TypeError, ValueError):
+        print(CYELLOW + f'Некорректное количество воркеров: {params["workers"]}' + CEND)
+        return 1
+
+
+def print_makespan(predicted, elapsed, has_history):
+    ''' Вывести прогнозируемое и фактическое время работы воркеров '''
+
+    print(CBLUE + 'Время работы воркеров (прогноз / факт), сек:' + CEND)
+    for worker_id, (worker_predicted, worker_elapsed) in enumerate(zip(predicted, elapsed), start=1):
+        print(f'{CBLUE}worker_{worker_id}:{CEND} {worker_predicted:.1f} / {worker_elapsed:.1f}')
+
+    predicted_makespan = max(predicted)
+    actual_makespan = max(elapsed)
+    note = ' (без истории запусков)' if not has_history else ''
+    print(f'{CBLUE}Общее время (makespan):{CEND} прогноз {predicted_makespan:.1f}, '
+          f'факт {actual_makespan:.1f}{note}')
+
+
+def run_parallel(params, workers_count, env):
+    ''' Запустить сценарии в нескольких процессах behave и объединить их результаты '''
+
+    start_date = datetime.now()
+    # Модули ядра читают настройки при импорте, поэтому импортируются после подготовки окружения
+    from requests import RequestException
+    from features.core import settings
+    from features.core.metrics import Metrics
+    from features.core.backend import ZappBackend, ZappBackendSessionException
+    from features.core.constants import BACKEND_RUN_TYPES, NON_REGISTRABLE_RUN_TYPES
+    from features.core.utils import (
+        clean_xml_reports,
+        get_output_as_json,
+        get_summary_status,
+        send_run_status,
+        variables
+    )
+    from features.core.zephyr import create_shared_test_cycle, zephyr_cache
+
+    # Путь к фиче передаётся воркерам через список сценариев
+    run_params = get_behave_run_params({k: v for k, v in params.items() if k != 'feature'})
+    features_path = 'features/' + params['feature'] if is_param_present(params, 'feature') else 'features'
+    reports_dir = env.get('REPORTS_DIR', 'reports')
+
+    units = parallel.collect_scenarios(features_path, run_params)
+    if not units:
+        print(CYELLOW + 'Не найдено сценариев для запуска' + CEND)
+        return 0
+
+    # Сессией zapp-backend управляет основной процесс, воркерам она не передаётся
+    backend = ZappBackend()
+    if settings.BACKEND_LOCAL_SESSION_REGISTER \
+            and settings.RUN_TYPE not in NON_REGISTRABLE_RUN_TYPES \
+            and not backend.session_running:
+
+        clean_xml_reports(reports_dir)
+
+        try:
+            backend.start_session(settings.ENV, settings.PROJECT, {})
+            print(CBLUE + f'Зарегистрирована сессия в zapp-backend {backend.session_url}' + CEND)
+        except (ZappBackendSessionException, RequestException) as ex:
+            print(CYELLOW + f'Не удалось зарегистрировать сессию в zapp-backend: {ex}' + CEND)
+
+    # Лог основного процесса включает логи воркеров и отправляется в zapp-backend при завершении сессии
+    logger.configure(
+        directory=settings.RAW_LOG_DIR or None,
+        segment_size=settings.RAW_LOG_SEGMENT_SIZE,
+        segments=settings.RAW_LOG_SEGMENTS,
+        upload=backend.upload_log_segment if settings.RAW_LOG_STREAM and backend.session_running else None
+    )
+
+    # Результаты всех воркеров записываются в один тестовый цикл Zephyr, созданный основным процессом
+    if settings.ZEPHYR_USE and not settings.ZEPHYR_OFFLINE and not settings.ZEPHYR_TEST_CYCLE_ID:
+        test_cycle_id = None
+        if 'JIRA_USER' in variables and 'JIRA_PASSWORD' in variables:
+            test_cycle_id = create_shared_test_cycle((variables['JIRA_USER'], variables['JIRA_PASSWORD']))
+            zephyr_cache.save()
+
+        if test_cycle_id:
+            env = {**env, 'ZEPHYR_TEST_CYCLE_ID': str(test_cycle_id)}
+            print(CBLUE + f'Создан тестовый цикл Zephyr для воркеров: {test_cycle_id}' + CEND)
+        else:
+            env = {**env, 'USE_ZEPHYR': 'False'}
+            print(CYELLOW + 'Не удалось создать тестовый цикл Zephyr, синхронизация в воркерах отключена' + CEND)
+
+    durations_file = env.get('DURATIONS_FILE', '.zapp_durations.json')
+    duration_store = parallel.DurationStore(durations_file)
+    estimates, has_history = parallel.estimate_durations(units, duration_store)
+    shards, predicted = parallel.split_by_duration(units, estimates, workers_count)
+    print(CBLUE + f'Параллельный запуск: {len(units)} сценариев в {len(shards)} воркерах' + CEND)
+    if not has_history:
+        print(CYELLOW + 'История длительностей сценариев не найдена, распределение выполнено по размеру feature файлов'
+              + CEND)
+    sys.stdout.flush()
+
+    parallel.clean_worker_reports(reports_dir)
+    workers = [
+        parallel.start_worker(worker_id, shard, run_params, env, reports_dir)
+        for worker_id, shard in enumerate(shards, start=1)
+    ]
+    return_code, elapsed = parallel.wait_workers(workers)
+
+    parallel.merge_junit_reports(workers, reports_dir)
+
+    duration_store.update(parallel.load_worker_durations(workers))
+    duration_store.save()
+    print_makespan(predicted, elapsed, has_history)
+
+    dumps = parallel.load_worker_metrics(workers)
+    if dumps:
+        Metrics.merge(dumps, start_date).send()
+
+    session = parallel.load_worker_sessions(workers)
+    run_status = get_summary_status(session['scenario_summary'])
+    if settings.RUN_TYPE in BACKEND_RUN_TYPES:
+        send_run_status(run_status, backend, settings.TG_NOTIFICATION_MODE)
+
+    if backend.session_running:
+        # Воркеры не обновляют сессию сами: платформа передаётся основному процессу через данные сессии воркера
+        if session['platform']:
+            try:
+                backend.update_session(platform=session['platform'])
+            except (ZappBackendSessionException, RequestException) as ex:
+                print(CYELLOW + f'Не удалось обновить сессию в zapp-backend: {ex}' + CEND)
+
+        export_data = dict(
+            video_url=session['video_url'],
+            zephyr_sync_results=session['zephyr_sync_results'],
+            export_variables=session['export_variables'],
+        )
+        if settings.RUN_TYPE not in BACKEND_RUN_TYPES:
+            export_data.update(
+                tests_passed=run_status is True,
+                output_json=get_output_as_json(reports_dir),
+                zapp_raw_logs=logger.get_log(),
+            )
+        backend.stop_session(**export_data)
+
+    return return_code
+
+
 def run_behave():
     logger.start_intercept()
 
@@ -160,8 +308,13 @@ def run_behave():
     # Выводим stdout чтобы не мешать лог с логом процесса behave
     sys.stdout.flush()
 
-    return_code = behave_main(run_params)
+    workers_count = get_workers_count(params)
+    if workers_count > 1:
+        return_code = run_parallel(params, workers_count, env)
+    else:
+        return_code = behave_main(run_params)
     logger.stop_intercept()
+    logger.close()
 
     return return_code
 
@@ -0,0 +1,5 @@
+import os
+
+# Модули ядра читают обязательные настройки при импорте
+os.environ.setdefault('TEST_STAND', 'http://localhost')
+os.environ.setdefault('PROJECT', 'ABC')
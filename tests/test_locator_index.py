@@ -0,0 +1,108 @@
+import os
+import json
+
+import pytest
+from selenium.webdriver.common.by import By
+
+from features.core.locator_index import CACHE_VERSION, LocatorIndex
+
+
+def write_locators(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def make_index(tmp_path):
+    return LocatorIndex(path=str(tmp_path / 'steps'), cache_path=str(tmp_path / 'cache.json'))
+
+
+def forbid_parse(monkeypatch):
+    def fail(self, file):
+        raise AssertionError(f'Файл {file} разобран повторно')
+
+    monkeypatch.setattr(LocatorIndex, '_parse_file', fail)
+
+
+@pytest.fixture
+def steps(tmp_path):
+    directory = tmp_path / 'steps'
+    directory.mkdir()
+    return directory
+
+
+def test_index_is_built_from_locator_files(tmp_path, steps):
+    file = write_locators(steps / 'main_locators.py',
+                          "locators = {\n    'кнопка': '//button',\n    'поле': 'input#name',\n}\n")
+
+    index = make_index(tmp_path)
+
+    assert dict(index) == {'кнопка': '//button', 'поле': 'input#name'}
+    assert index.compiled('кнопка') == (By.XPATH, '//button')
+    assert index.compiled('поле') == (By.CSS_SELECTOR, 'input#name')
+    assert index.source('поле') == (file, 3)
+
+
+def test_unchanged_files_are_taken_from_cache(tmp_path, steps, monkeypatch):
+    write_locators(steps / 'main_locators.py', "locators = {'кнопка': '//button'}\n")
+    make_index(tmp_path).index
+
+    forbid_parse(monkeypatch)
+
+    assert dict(make_index(tmp_path)) == {'кнопка': '//button'}
+
+
+def test_touched_file_with_same_content_is_not_parsed(tmp_path, steps, monkeypatch):
+    file = write_locators(steps / 'main_locators.py', "locators = {'кнопка': '//button'}\n")
+    make_index(tmp_path).index
+
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    forbid_parse(monkeypatch)
+
+    assert dict(make_index(tmp_path)) == {'кнопка': '//button'}
+    with open(tmp_path / 'cache.json') as cache_file:
+        assert json.load(cache_file)['files'][file]['mtime'] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_changed_file_is_parsed_again(tmp_path, steps):
+    file = write_locators(steps / 'main_locators.py', "locators = {'кнопка': '//button'}\n")
+    make_index(tmp_path).index
+
+    write_locators(steps / 'main_locators.py', "locators = {'кнопка': '//button[2]', 'ссылка': 'a'}\n")
+    stat = os.stat(file)
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert dict(make_index(tmp_path)) == {'кнопка': '//button[2]', 'ссылка': 'a'}
+
+
+def test_removed_and_added_files_rebuild_index(tmp_path, steps):
+    write_locators(steps / 'a_locators.py', "locators = {'кнопка': '//button'}\n")
+    make_index(tmp_path).index
+
+    os.remove(steps / 'a_locators.py')
+    write_locators(steps / 'b_locators.py', "locators = {'ссылка': 'a'}\n")
+
+    assert dict(make_index(tmp_path)) == {'ссылка': 'a'}
+
+
+def test_cache_of_other_version_is_ignored(tmp_path, steps):
+    write_locators(steps / 'main_locators.py', "locators = {'кнопка': '//button'}\n")
+    (tmp_path / 'cache.json').write_text(json.dumps({'version': CACHE_VERSION + 1, 'files': {}, 'index': {}}))
+
+    assert dict(make_index(tmp_path)) == {'кнопка': '//button'}
+    with open(tmp_path / 'cache.json') as cache_file:
+        assert json.load(cache_file)['version'] == CACHE_VERSION
+
+
+def test_duplicates_are_reported_from_cache(tmp_path, steps, monkeypatch):
+    write_locators(steps / 'a_locators.py', "locators = {'кнопка': '//button'}\n")
+    write_locators(steps / 'b_locators.py', "locators = {'кнопка': '//a'}\n")
+    make_index(tmp_path).index
+
+    warnings = []
+    monkeypatch.setattr('features.core.locator_index.log.warning', lambda *args: warnings.append(args))
+
+    index = make_index(tmp_path)
+    assert len(index) == 1
+    assert len(warnings) == 1
+    assert warnings[0][1] == {'кнопка'}
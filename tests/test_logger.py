@@ -0,0 +1,125 @@
+import os
+import sys
+import gzip
+import threading
+from io import StringIO
+
+import pytest
+
+from features.core.logger.logger import StdoutLogger
+
+# features.core.logger.logger - экземпляр логгера, модуль доступен только через sys.modules
+logger_module = sys.modules['features.core.logger.logger']
+
+
+@pytest.fixture
+def errors():
+    return StringIO()
+
+
+@pytest.fixture
+def buffer(errors):
+    buffer = StdoutLogger.SegmentBuffer(errors)
+    yield buffer
+    buffer.close()
+
+
+def write_segments(buffer, *texts):
+    for text in texts:
+        buffer.write(text)
+
+
+def read_segment(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return file.read()
+
+
+def test_full_segments_are_rotated(buffer):
+    buffer.configure(None, segment_size=4, segments=3, upload=None, name='raw_log')
+    write_segments(buffer, 'aaaa', 'bb', 'bb', 'c')
+
+    assert list(buffer.segments) == [(1, 'aaaa'), (2, 'bbbb')]
+    assert buffer.get_log() == 'aaaabbbbc'
+
+
+def test_evicted_segments_are_counted_as_skipped(buffer):
+    buffer.configure(None, segment_size=4, segments=2, upload=None, name='raw_log')
+    write_segments(buffer, 'aaaa', 'bbbb', 'cccc', 'dddd', 'e')
+
+    assert buffer.get_log() == '[Пропущено начальных сегментов лога: 2]\nccccdddde'
+
+
+def test_skipped_note_points_to_spilled_segments(tmp_path, buffer):
+    directory = str(tmp_path / 'logs')
+    buffer.configure(directory, segment_size=4, segments=1, upload=None, name='raw_log')
+    write_segments(buffer, 'aaaa', 'bbbb')
+
+    assert buffer.get_log() == f'[Пропущено начальных сегментов лога: 1, полный лог: {directory}]\nbbbb'
+    assert read_segment(os.path.join(directory, 'raw_log_00001.log.gz')) == 'aaaa'
+
+
+def test_uploaded_segments_are_not_in_log(buffer):
+    uploaded = []
+    buffer.configure(None, segment_size=4, segments=1, upload=lambda index, text: uploaded.append((index, text)),
+                     name='raw_log')
+    for text in ('aaaa', 'bbbb', 'cccc'):
+        buffer.write(text)
+        # get_log дожидается отправки, иначе следующий сегмент не попадёт в очередь
+        buffer.get_log()
+    buffer.write('d')
+
+    # Отправленные сегменты не считаются пропущенными, даже если вытеснены из памяти
+    assert buffer.get_log() == 'd'
+    assert sorted(uploaded) == [(1, 'aaaa'), (2, 'bbbb'), (3, 'cccc')]
+
+
+def test_failed_and_dropped_uploads_stay_in_log(buffer, errors):
+    release = threading.Event()
+    uploaded = []
+
+    def upload(index, text):
+        release.wait(5)
+        if index == 1:
+            raise OSError('нет соединения')
+        uploaded.append(index)
+
+    buffer.configure(None, segment_size=4, segments=2, upload=upload, name='raw_log')
+    # Третий сегмент не ставится в очередь: в ней уже segments сегментов
+    write_segments(buffer, 'aaaa', 'bbbb', 'cccc')
+    release.set()
+
+    assert buffer.get_log() == '[Пропущено начальных сегментов лога: 1]\ncccc'
+    assert uploaded == [2]
+    assert 'Не удалось отправить сегмент лога 1' in errors.getvalue()
+
+
+def test_upload_wait_is_bounded(buffer, errors, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(logger_module, 'UPLOAD_WAIT_TIMEOUT', 0.2)
+    buffer.configure(None, segment_size=4, segments=2, upload=lambda index, text: release.wait(5), name='raw_log')
+    write_segments(buffer, 'aaaa', 'b')
+
+    assert buffer.get_log() == 'aaaab'
+    assert 'Не дождались отправки сегментов лога: 1' in errors.getvalue()
+    release.set()
+
+
+def test_configure_removes_only_own_segments(tmp_path, buffer):
+    directory = tmp_path / 'logs'
+    directory.mkdir()
+    for name in ('raw_log_00001.log.gz', 'raw_log_worker_1_00001.log.gz', 'raw_log_notes.log.gz'):
+        (directory / name).write_bytes(b'')
+
+    buffer.configure(str(directory), segment_size=4, segments=2, upload=None, name='raw_log')
+
+    assert sorted(os.listdir(directory)) == ['raw_log_notes.log.gz', 'raw_log_worker_1_00001.log.gz']
+
+
+def test_close_spills_current_segment_with_prefix(tmp_path, buffer):
+    directory = str(tmp_path / 'logs')
+    buffer.configure(directory, segment_size=4, segments=2, upload=None, name='raw_log_worker_2')
+    write_segments(buffer, 'aaaa', 'bb')
+    buffer.close()
+
+    assert sorted(os.listdir(directory)) == ['raw_log_worker_2_00001.log.gz', 'raw_log_worker_2_00002.log.gz']
+    assert read_segment(os.path.join(directory, 'raw_log_worker_2_00002.log.gz')) == 'bb'
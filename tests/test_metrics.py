@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from features.core import metrics
+from features.core.metrics import build_data_string, escape_key, escape_measurement, format_field_value
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('plain', 'plain'),
+    ('with space', 'with\\ space'),
+    ('a,b=c', 'a\\,b\\=c'),
+    ('back\\slash', 'back\\\\slash'),
+    ('two\nlines', 'two\\nlines'),
+    ('кнопка "Войти"', 'кнопка\\ "Войти"'),
+])
+def test_escape_key(value, expected):
+    assert escape_key(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    (True, 'true'),
+    (False, 'false'),
+    (3, '3'),
+    (1.5, '1.5'),
+    ('text', '"text"'),
+    ('a "quoted" b', '"a \\"quoted\\" b"'),
+    ('back\\slash', '"back\\\\slash"'),
+    ('with space, comma=', '"with space, comma="'),
+])
+def test_format_field_value(value, expected):
+    assert format_field_value(value) == expected
+
+
+def test_escape_measurement():
+    assert escape_measurement('zapp step,x=1') == 'zapp\\ step\\,x=1'
+
+
+def test_build_data_string_skips_empty_tags_and_none_fields():
+    data = build_data_string(
+        dict(PROJECT_KEY='ABC', ENV='', STAND='http://host a'),
+        dict(duration=12.5, step='Я нажимаю "Войти"', line=None),
+        measurement='zapp_step',
+        timestamp='1700000000000000000'
+    )
+
+    assert data == 'zapp_step,PROJECT_KEY=ABC,STAND=http://host\\ a duration=12.5,step="Я нажимаю \\"Войти\\"" ' \
+                   '1700000000000000000'
+
+
+def test_build_data_string_without_tags():
+    assert build_data_string({}, dict(count=1)) == 'zapp_test_run count=1'
+
+
+class FakeWriter:
+    def __init__(self):
+        self.points = []
+
+    def write(self, measurement, tags, fields):
+        self.points.append((measurement, tags, fields))
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(metrics, 'influx_writer', writer)
+    return writer
+
+
+def make_scenario():
+    step = SimpleNamespace(name='я нажимаю "Войти"', step_type='when', status=SimpleNamespace(name='passed'),
+                           duration=0.25, line=7)
+    return SimpleNamespace(name='Вход, пользователь 42', filename='features/login/login.feature',
+                           status=SimpleNamespace(name='failed'), duration=1.5, steps=[step])
+
+
+def test_step_point_keeps_names_in_fields(writer):
+    scenario = make_scenario()
+    metrics.write_step_point(scenario, scenario.steps[0], 1234)
+
+    measurement, tags, fields = writer.points[0]
+    assert measurement == 'zapp_step'
+    assert tags['FEATURE'] == 'login.feature'
+    assert tags['STEP_TYPE'] == 'when'
+    assert tags['STATUS'] == 'passed'
+    assert not {'SCENARIO', 'STEP', 'RUN_SEED'} & set(tags)
+    assert fields == dict(duration=250.0, line=7, scenario=scenario.name, step=scenario.steps[0].name,
+                          run_seed='1234')
+
+
+def test_scenario_point_keeps_names_in_fields(writer):
+    scenario = make_scenario()
+    metrics.write_scenario_point(scenario, 1234)
+
+    measurement, tags, fields = writer.points[0]
+    assert measurement == 'zapp_scenario'
+    assert tags['STATUS'] == 'failed'
+    assert not {'SCENARIO', 'RUN_SEED'} & set(tags)
+    assert fields == dict(duration=1500.0, steps=1, scenario=scenario.name, run_seed='1234')
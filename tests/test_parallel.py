@@ -0,0 +1,109 @@
+import json
+
+from features.core.parallel import (
+    DEFAULT_SECONDS_PER_BYTE,
+    WORKER_SESSION_FILE,
+    DurationStore,
+    ScenarioUnit,
+    Worker,
+    estimate_durations,
+    get_duration_key,
+    load_worker_sessions,
+    split_by_duration,
+)
+
+
+def make_unit(name, size=100, scenario_names=None, filename='features/a.feature'):
+    return ScenarioUnit(f'{filename}:{name}', filename, name, scenario_names or (name,), size)
+
+
+class FakeStore:
+    def __init__(self, durations):
+        self.durations = durations
+
+    def get(self, key):
+        return self.durations.get(key)
+
+
+def test_split_by_duration_assigns_longest_first_to_least_loaded_worker():
+    units = [make_unit(name) for name in 'abcde']
+    shards, loads = split_by_duration(units, [2, 3, 2, 3, 2], 2)
+
+    assert [[unit.name for unit in shard] for shard in shards] == [['b', 'a', 'e'], ['d', 'c']]
+    assert loads == [7, 5]
+
+
+def test_split_by_duration_keeps_every_unit_once():
+    units = [make_unit(str(index)) for index in range(20)]
+    estimates = [(index * 7) % 11 + 1 for index in range(20)]
+    shards, loads = split_by_duration(units, estimates, 3)
+
+    assert sorted(unit.name for shard in shards for unit in shard) == sorted(unit.name for unit in units)
+    assert sum(loads) == sum(estimates)
+    # Гарантия LPT: makespan не больше 4/3 нижней оценки оптимума
+    assert max(loads) <= 4 / 3 * max(sum(estimates) / 3, max(estimates))
+
+
+def test_split_by_duration_drops_empty_workers():
+    shards, loads = split_by_duration([make_unit('a'), make_unit('b')], [1, 2], 4)
+
+    assert len(shards) == 2
+    assert loads == [2, 1]
+
+
+def test_estimate_durations_uses_history_and_scales_unknown_by_size():
+    known, unknown = make_unit('known', size=100), make_unit('unknown', size=50)
+    store = FakeStore({get_duration_key(known.filename, 'known'): 20})
+
+    estimates, has_history = estimate_durations([known, unknown], store)
+
+    assert has_history
+    assert estimates == [20, 10]
+
+
+def test_estimate_durations_without_history_uses_default_rate():
+    estimates, has_history = estimate_durations([make_unit('a', size=300)], FakeStore({}))
+
+    assert not has_history
+    assert estimates == [300 * DEFAULT_SECONDS_PER_BYTE]
+
+
+def test_estimate_durations_requires_history_for_every_outline_row():
+    outline = make_unit('outline', size=100, scenario_names=('row 1', 'row 2'))
+    partial = FakeStore({get_duration_key(outline.filename, 'row 1'): 5})
+    full = FakeStore({get_duration_key(outline.filename, 'row 1'): 5, get_duration_key(outline.filename, 'row 2'): 7})
+
+    assert estimate_durations([outline], partial) == ([100 * DEFAULT_SECONDS_PER_BYTE], False)
+    assert estimate_durations([outline], full) == ([12], True)
+
+
+def test_duration_store_smooths_history(tmp_path):
+    store = DurationStore(str(tmp_path / 'durations.json'))
+    store.update({'a': 10})
+    store.update({'a': 20, 'b': 4})
+    store.save()
+
+    assert DurationStore(str(tmp_path / 'durations.json')).durations == {'a': 15, 'b': 4}
+
+
+def test_load_worker_sessions_merges_worker_data(tmp_path):
+    workers = []
+    for worker_id, data in enumerate([
+        dict(platform='chrome', zephyr_sync_results={'a': 'link a'}, scenario_summary=dict(passed=2, failed=1)),
+        dict(platform='chrome', video_url='video', zephyr_sync_results={'b': 'link b'},
+             export_variables={'order': '1'}, scenario_summary=dict(passed=3, failed=0)),
+        None,
+    ], start=1):
+        reports_dir = tmp_path / f'worker_{worker_id}'
+        reports_dir.mkdir()
+        if data is not None:
+            (reports_dir / WORKER_SESSION_FILE).write_text(json.dumps(data))
+        workers.append(Worker(worker_id, str(reports_dir), None, None, 0))
+
+    assert load_worker_sessions(workers) == dict(
+        platform='chrome',
+        video_url='video',
+        zephyr_sync_results={'a': 'link a', 'b': 'link b'},
+        export_variables={'order': '1'},
+        scenario_summary=dict(passed=5, failed=1)
+    )
@@ -0,0 +1,91 @@
+import math
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy
+import pytest
+from PIL import Image
+
+from features.core.screenshots import get_element_box, get_elements_screenshots
+
+VIEWPORT_WIDTH = 400
+VIEWPORT_HEIGHT = 300
+
+
+def to_png(image):
+    output = BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def to_array(screenshot):
+    if isinstance(screenshot, bytes):
+        screenshot = Image.open(BytesIO(screenshot))
+    return numpy.asarray(screenshot.convert('RGB'))
+
+
+class FakeElement:
+    """ Элемент, скриншот которого драйвер вырезает по охватывающему прямоугольнику в пикселях устройства """
+
+    def __init__(self, browser, rect):
+        self.browser = browser
+        self.rect = rect
+
+    @property
+    def screenshot_as_png(self):
+        ratio = self.browser.ratio
+        box = (
+            math.floor(self.rect['x'] * ratio),
+            math.floor(self.rect['y'] * ratio),
+            math.ceil((self.rect['x'] + self.rect['width']) * ratio),
+            math.ceil((self.rect['y'] + self.rect['height']) * ratio),
+        )
+        return to_png(self.browser.viewport.crop(box))
+
+
+class FakeBrowser:
+    def __init__(self, ratio):
+        self.ratio = ratio
+        width, height = round(VIEWPORT_WIDTH * ratio), round(VIEWPORT_HEIGHT * ratio)
+        # У каждого пикселя свой цвет: сдвиг области на пиксель меняет изображение
+        pixels = numpy.arange(width * height * 3, dtype=numpy.uint32).reshape((height, width, 3)) * 7919
+        self.viewport = Image.fromarray((pixels % 251).astype(numpy.uint8), 'RGB')
+        self.screenshots = 0
+
+    def execute_script(self, script, elements, first):
+        return dict(
+            rects=[element.rect for element in elements],
+            ratio=self.ratio,
+            width=VIEWPORT_WIDTH,
+            height=VIEWPORT_HEIGHT
+        )
+
+    def get_screenshot_as_png(self):
+        self.screenshots += 1
+        return to_png(self.viewport)
+
+
+@pytest.mark.parametrize('rect, ratio, expected', [
+    (dict(x=10, y=20, width=30, height=40), 1, (10, 20, 40, 60)),
+    (dict(x=10.4, y=20.6, width=30.2, height=40.1), 1, (10, 20, 41, 61)),
+    (dict(x=10.4, y=20.6, width=30.2, height=40.1), 1.25, (13, 25, 51, 76)),
+    (dict(x=0.1 + 0.2, y=8, width=0.7, height=2), 10, (3, 80, 10, 100)),
+])
+def test_get_element_box_encloses_fractional_rect(rect, ratio, expected):
+    assert get_element_box(rect, ratio) == expected
+
+
+@pytest.mark.parametrize('ratio', [1, 1.25, 2])
+def test_batch_crops_match_element_screenshots(ratio):
+    browser = FakeBrowser(ratio)
+    elements = [
+        FakeElement(browser, dict(x=10.4, y=20.6, width=30.2, height=40.1)),
+        FakeElement(browser, dict(x=100.5, y=50.25, width=80.75, height=20.5)),
+        FakeElement(browser, dict(x=200, y=150, width=64, height=32)),
+    ]
+
+    screenshots = get_elements_screenshots(SimpleNamespace(browser=browser), elements)
+
+    assert browser.screenshots == 1
+    for element, screenshot in zip(elements, screenshots):
+        assert numpy.array_equal(to_array(screenshot), to_array(element.screenshot_as_png))
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from features.core import zephyr_journal
+from features.core.zephyr_journal import ZephyrJournal, load_synced_ids, replay
+
+
+def make_record(record_id, label=None):
+    return dict(record_id=record_id, label=label or f'label_{record_id}', scenario_name=f'Сценарий {record_id}')
+
+
+class FakeZephyrSync:
+    """ ZephyrSyncLite без обращений к Jira: не отправляются записи из failed_ids """
+
+    instances = []
+    failed_ids = set()
+
+    def __init__(self, auth, labels):
+        self.labels = labels
+        self.records = []
+        self.issues = []
+        self.instances.append(self)
+
+    def add_record(self, record):
+        self.records.append(record)
+        self.issues.append(dict(record))
+        return True
+
+    def synchronize(self):
+        for issue in self.issues:
+            issue['synced'] = issue['record_id'] not in self.failed_ids
+        return {issue['record_id']: 'link' for issue in self.issues if issue['synced']}
+
+
+@pytest.fixture
+def zephyr(monkeypatch):
+    FakeZephyrSync.instances = []
+    FakeZephyrSync.failed_ids = set()
+    monkeypatch.setattr(zephyr_journal, 'ZephyrSyncLite', FakeZephyrSync)
+    monkeypatch.setattr(zephyr_journal.zephyr_cache, 'save', lambda: None)
+    return FakeZephyrSync
+
+
+def write_journal(path, records):
+    journal = ZephyrJournal(str(path))
+    for record in records:
+        journal.write(record)
+    journal.close()
+    return str(path)
+
+
+def test_read_skips_empty_and_corrupted_lines(tmp_path):
+    path = write_journal(tmp_path / 'journal.jsonl', [make_record('a')])
+    with open(path, 'a', encoding='utf-8') as journal_file:
+        journal_file.write('\n{"record_id": "b", "lab\n')
+    write_journal(path, [make_record('c')])
+
+    assert [record['record_id'] for record in ZephyrJournal.read(path)] == ['a', 'c']
+
+
+def test_replay_sends_records_from_all_journals_once(tmp_path, zephyr):
+    state = str(tmp_path / 'state.json')
+    first = write_journal(tmp_path / 'journal.jsonl', [make_record('a'), make_record('b')])
+    second = write_journal(tmp_path / 'worker_1' / 'journal.jsonl', [make_record('c'), make_record('a')])
+
+    assert replay([first, second], state, auth=None) == dict(a='link', b='link', c='link')
+    assert [record['record_id'] for record in zephyr.instances[0].records] == ['a', 'b', 'c']
+    assert zephyr.instances[0].labels == {'label_a', 'label_b', 'label_c'}
+    assert load_synced_ids(state) == {'a', 'b', 'c'}
+
+
+def test_replay_skips_already_synced_records(tmp_path, zephyr):
+    state = str(tmp_path / 'state.json')
+    journal = write_journal(tmp_path / 'journal.jsonl', [make_record('a'), make_record('b')])
+    zephyr.failed_ids = {'b'}
+
+    replay([journal], state, auth=None)
+    assert load_synced_ids(state) == {'a'}
+
+    zephyr.failed_ids = set()
+    write_journal(journal, [make_record('c')])
+    replay([journal], state, auth=None)
+
+    assert [record['record_id'] for record in zephyr.instances[1].records] == ['b', 'c']
+    assert load_synced_ids(state) == {'a', 'b', 'c'}
+
+
+def test_replay_without_new_records_does_not_sync(tmp_path, zephyr):
+    state = tmp_path / 'state.json'
+    state.write_text(json.dumps(['a']))
+    journal = write_journal(tmp_path / 'journal.jsonl', [make_record('a')])
+
+    assert replay([journal], str(state), auth=None) == {}
+    assert zephyr.instances == []
+
+
+def test_corrupted_state_file_is_ignored(tmp_path):
+    state = tmp_path / 'state.json'
+    state.write_text('["a", ')
+
+    assert load_synced_ids(str(state)) == set()
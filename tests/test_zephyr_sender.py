@@ -0,0 +1,117 @@
+import time
+
+import pytest
+import requests
+
+from features.core.zephyr_sender import MAX_RETRY_WAIT, ZephyrSender
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.url = 'http://jira/rest/zapi'
+    return response
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(time, 'sleep', waits.append)
+    return waits
+
+
+@pytest.fixture
+def sender():
+    sender = ZephyrSender(auth=None, workers=1, attempts=4)
+    yield sender
+    sender.close()
+
+
+def test_request_returns_first_successful_response(sender, sleeps):
+    sender.session = FakeSession([make_response(200)])
+
+    assert sender.request('GET', 'http://jira').status_code == 200
+    assert len(sender.session.calls) == 1
+    assert sleeps == []
+
+
+def test_request_retries_retryable_statuses_and_connection_errors(sender, sleeps):
+    sender.session = FakeSession([
+        make_response(503),
+        requests.exceptions.ConnectionError(),
+        make_response(429),
+        make_response(200),
+    ])
+
+    assert sender.request('POST', 'http://jira', json={}).status_code == 200
+    assert len(sender.session.calls) == 4
+    # Экспоненциальная пауза без Retry-After
+    assert sleeps == [0.5, 1, 2]
+
+
+def test_request_does_not_retry_client_errors(sender, sleeps):
+    sender.session = FakeSession([make_response(400)])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        sender.request('GET', 'http://jira')
+    assert len(sender.session.calls) == 1
+
+
+def test_request_raises_last_response_after_all_attempts(sender, sleeps):
+    sender.session = FakeSession([make_response(502)] * 4)
+
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        sender.request('GET', 'http://jira')
+    assert error.value.response.status_code == 502
+    assert len(sender.session.calls) == 4
+    assert len(sleeps) == 3
+
+
+def test_request_raises_last_connection_error_after_all_attempts(sender, sleeps):
+    sender.session = FakeSession([requests.exceptions.Timeout()] * 4)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        sender.request('GET', 'http://jira')
+    assert len(sender.session.calls) == 4
+
+
+def test_request_waits_retry_after_capped_by_max_wait(sender, sleeps):
+    sender.session = FakeSession([
+        make_response(429, {'Retry-After': '3'}),
+        make_response(429, {'Retry-After': str(MAX_RETRY_WAIT * 10)}),
+        make_response(503, {'Retry-After': 'Wed, 21 Oct 2026 07:28:00 GMT'}),
+        make_response(200),
+    ])
+
+    assert sender.request('GET', 'http://jira').status_code == 200
+    # Retry-After в виде даты не поддерживается: используется экспоненциальная пауза
+    assert sleeps == [3, MAX_RETRY_WAIT, 2]
+
+
+def test_send_counts_sent_failed_and_skipped_requests(sender, sleeps):
+    sender.session = FakeSession([make_response(200), make_response(404)])
+
+    requests_data = [dict(method='PUT', url='http://jira/1'), dict(method='PUT', url='http://jira/2')]
+    responses = sender.send('steps', requests_data)
+    sender.skip('steps', 2)
+
+    assert responses[0].status_code == 200
+    assert responses[1] is None
+    assert sender.report['steps'] == dict(sent=1, failed=1, skipped=2)